@@ -0,0 +1,5 @@
+import os
+import sys
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
@@ -0,0 +1,77 @@
+from lib.cache_calc import CacheCalc
+from util.cron import cron
+import db.sqldb as db
+from lib.dex_api import DexAPI, orderbook_extras
+from lib.pair import Pair
+import util.memcache as memcache
+
+
+def bench_pairs_last_traded(bench_env, benchmark):
+    data = benchmark(lambda: CacheCalc().pairs_last_traded())
+    assert len(data) > 0
+
+
+def bench_pair_prices_24hr(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().pair_prices_24hr())
+    assert len(data) > 0
+
+
+def bench_pair_volumes_24hr(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().pair_volumes_24hr())
+    assert len(data["volumes"]) > 0
+
+
+def bench_coin_volumes_24hr(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().coin_volumes_24hr())
+    assert len(data["volumes"]) > 0
+
+
+def bench_swap_durations(bench_env, benchmark):
+    data = benchmark(lambda: CacheCalc().swap_durations(refresh=True))
+    assert data["all"]["swaps"] > 0
+
+
+def bench_orderbook_rpc(bench_cache, benchmark):
+    # Uncached orderbook for one variant, from the mock mm2
+    def orderbook():
+        data = DexAPI().orderbook_rpc("KMD", "LTC")
+        return orderbook_extras(
+            "KMD_LTC",
+            data,
+            memcache.get_gecko_source(),
+            memcache.get_pair_prices_24hr(),
+        )
+
+    data = benchmark(orderbook)
+    assert len(data["bids"]) > 0
+
+
+def bench_pair_orderbook(bench_cache, benchmark):
+    # One pair of the orderbook batch loop, merging cached variant books
+    data = benchmark(lambda: Pair(pair_str="KMD_LTC").orderbook("KMD_LTC"))
+    assert data["ALL"]["pair"] == "KMD_LTC"
+    assert len(data["ALL"]["bids"]) > 0
+
+
+def bench_tickers(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().tickers(refresh=True))
+    assert len(data["data"]) > 0
+
+
+def bench_markets_summary(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().markets_summary())
+    assert len(data) > 0
+
+
+def bench_stats_api_summary(bench_cache, benchmark):
+    data = benchmark(lambda: CacheCalc().stats_api_summary(refresh=True))
+    assert len(data) > 0
+
+
+def bench_pair_candles_30d(bench_env, benchmark):
+    # From the candle store, without scanning the swaps table
+    end_time = int(cron.now_utc())
+    data = benchmark(
+        lambda: db.SqlQuery().pair_candles("KMD_LTC", "1h", end_time - 86400 * 30, end_time)
+    )
+    assert len(data["candles"]) > 0
@@ -0,0 +1,49 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def client(bench_cache):
+    from main import app
+
+    # No context manager, so the cache loop startup hooks don't run
+    return TestClient(app)
+
+
+def get(client, url):
+    r = client.get(url)
+    assert r.status_code == 200, r.text
+    assert '"error"' not in r.text[:100], r.text[:300]
+    return r
+
+
+def bench_gecko_tickers(client, benchmark):
+    benchmark(get, client, "/api/v3/gecko/tickers")
+
+
+def bench_gecko_pairs(client, benchmark):
+    benchmark(get, client, "/api/v3/gecko/pairs")
+
+
+def bench_gecko_orderbook(client, benchmark):
+    benchmark(get, client, "/api/v3/gecko/orderbook/KMD_LTC")
+
+
+def bench_gecko_historical_trades(client, benchmark):
+    benchmark(get, client, "/api/v3/gecko/historical_trades/KMD_LTC")
+
+
+def bench_pair_orderbook_extended(client, benchmark):
+    benchmark(get, client, "/api/v3/pairs/orderbook_extended/KMD_LTC")
+
+
+def bench_markets_summary(client, benchmark):
+    benchmark(get, client, "/api/v3/markets/summary")
+
+
+def bench_markets_trades(client, benchmark):
+    benchmark(get, client, "/api/v3/markets/trades/KMD_LTC/7")
+
+
+def bench_stats_xyz_summary(client, benchmark):
+    benchmark(get, client, "/api/v3/stats_xyz/summary")
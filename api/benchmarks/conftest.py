@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import statistics
+import pytest
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+
+BASELINE_PATH = f"{API_ROOT_PATH}/benchmarks/baseline.json"
+# Differences smaller than this are timer noise, not regressions
+MIN_REGRESSION_MS = 5
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption(
+        "--bench-swaps", type=int, default=5000, help="Synthetic swaps to seed"
+    )
+    group.addoption(
+        "--bench-rounds", type=int, default=5, help="Timed rounds per benchmark"
+    )
+    group.addoption(
+        "--bench-tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown of the median vs the baseline, as a fraction",
+    )
+    group.addoption(
+        "--bench-db",
+        choices=["auto", "sqlite"],
+        default="auto",
+        help="Database stand in, auto uses pgserver if installed",
+    )
+    group.addoption("--bench-baseline", default=BASELINE_PATH)
+    group.addoption(
+        "--bench-save",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing",
+    )
+
+
+class BenchmarkSession:
+    def __init__(self, config):
+        self.config = config
+        self.scale = {
+            "swaps": config.getoption("--bench-swaps"),
+            "rounds": config.getoption("--bench-rounds"),
+            "db": config.getoption("--bench-db"),
+        }
+        self.path = config.getoption("--bench-baseline")
+        self.save = config.getoption("--bench-save")
+        self.tolerance = config.getoption("--bench-tolerance")
+        self.results = {}
+        self.baseline = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                baseline = json.load(f)
+            # Timings at another scale are not comparable
+            if baseline.get("scale") == self.scale:
+                self.baseline = baseline["benchmarks"]
+
+    def regression(self, name):
+        if self.save or name not in self.baseline:
+            return None
+        median = self.results[name]["median_ms"]
+        limit = self.baseline[name]["median_ms"] * (1 + self.tolerance)
+        if median > limit and median - self.baseline[name]["median_ms"] > MIN_REGRESSION_MS:
+            return (
+                f"{name} median {median:.2f}ms exceeds baseline "
+                f"{self.baseline[name]['median_ms']:.2f}ms by more than "
+                f"{self.tolerance:.0%}"
+            )
+        return None
+
+    def write(self):
+        if not self.save or len(self.results) == 0:
+            return
+        with open(self.path, "w") as f:
+            json.dump(
+                {"scale": self.scale, "benchmarks": self.results},
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+
+
+class Benchmark:
+    """Times a callable over a warmup and timed rounds"""
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def __call__(self, fn, *args, **kwargs):
+        result = fn(*args, **kwargs)
+        timings = []
+        for _ in range(self.session.scale["rounds"]):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.session.results[self.name] = {
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+        }
+        msg = self.session.regression(self.name)
+        if msg is not None:
+            pytest.fail(msg)
+        return result
+
+
+def pytest_configure(config):
+    config._bench_session = BenchmarkSession(config)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    session.config._bench_session.write()
+
+
+def pytest_terminal_summary(terminalreporter):
+    results = terminalreporter.config._bench_session.results
+    if len(results) == 0:
+        return
+    terminalreporter.section("benchmarks (ms)")
+    terminalreporter.write_line(f"{'name':<64} {'min':>10} {'median':>10} {'max':>10}")
+    for name, i in sorted(results.items()):
+        terminalreporter.write_line(
+            f"{name:<64} {i['min_ms']:>10.3f} {i['median_ms']:>10.3f} {i['max_ms']:>10.3f}"
+        )
+
+
+@pytest.fixture
+def benchmark(request):
+    # Keyed by module too, as the same data is timed as a calc and as an
+    # endpoint
+    name = f"{request.module.__name__.split('.')[-1]}::{request.node.name}"
+    return Benchmark(request.config._bench_session, name)
+
+
+@pytest.fixture(scope="session")
+def bench_env(request, tmp_path_factory):
+    """Offline stand ins for memcached, mm2 and postgres, with swaps"""
+    from benchmarks.fakes import OfflineStack
+
+    stack = OfflineStack(
+        tmp_path_factory.mktemp("bench"),
+        swaps=request.config.getoption("--bench-swaps"),
+        db=request.config.getoption("--bench-db"),
+    ).start()
+    yield stack
+    stack.stop()
+
+
+@pytest.fixture(scope="session")
+def bench_cache(bench_env):
+    """Foundational cache items, built over the stand ins"""
+    return bench_env.populate()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import random
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+from sqlmodel import create_engine
+from const import API_ROOT_PATH
+from db.schema import DefiSwapTest, PairCandleTest, PubkeySketchTest
+from util.enums import TradeType
+from util.memcache import JsonSerde
+from util.transform import deplatform, invert
+
+ORDERBOOK_FIXTURES_PATH = f"{API_ROOT_PATH}/tests/fixtures/orderbook"
+
+# Priced coins (and one unpriced) from the coins_config and gecko fixtures
+SEED_COINS = [
+    "KMD",
+    "KMD-BEP20",
+    "DGB",
+    "DGB-segwit",
+    "BTC",
+    "BTC-BEP20",
+    "LTC",
+    "LTC-segwit",
+    "DOGE",
+    "MATIC",
+    "USDC-PLG20",
+    "DOC",
+]
+SEED_GUIS = ["AtomicDEX Desktop", "Komodo Wallet", "pytomicDEX", "mm2-cli"]
+
+
+class FakeMemcache:
+    """
+    In memory stand in for the pymemcache client used by util.memcache.
+    Values go through the same JsonSerde, so (de)serialization costs and
+    failures match a real memcached.
+    """
+
+    def __init__(self):
+        self.serde = JsonSerde()
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        item = self.store.get(key)
+        if item is not None and item[2] and item[2] < time.time():
+            del self.store[key]
+            return None
+        return item
+
+    def _expires(self, expire):
+        return time.time() + expire if expire else 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self._alive(key)
+        if item is None:
+            return default
+        return self.serde.deserialize(key, item[1], item[0])
+
+    def set(self, key, value, expire=0, noreply=None, flags=None):
+        data, flags = self.serde.serialize(key, value)
+        with self.lock:
+            self.store[key] = (flags, data, self._expires(expire))
+        return True
+
+    def set_many(self, values, expire=0, noreply=None, flags=None):
+        for k, v in values.items():
+            self.set(k, v, expire)
+        return []
+
+    def add(self, key, value, expire=0, noreply=None, flags=None):
+        with self.lock:
+            if self._alive(key) is not None:
+                return False
+        return self.set(key, value, expire)
+
+    def touch(self, key, expire=0, noreply=None):
+        with self.lock:
+            item = self._alive(key)
+            if item is None:
+                return False
+            self.store[key] = (item[0], item[1], self._expires(expire))
+        return True
+
+    def delete(self, key, noreply=None):
+        with self.lock:
+            return self.store.pop(key, None) is not None
+
+    def delete_many(self, keys, noreply=None):
+        for key in keys:
+            self.delete(key)
+        return True
+
+    def flush_all(self, delay=0, noreply=None):
+        with self.lock:
+            self.store.clear()
+        return True
+
+    def stats(self, *args):
+        with self.lock:
+            return {
+                b"curr_items": len(self.store),
+                b"bytes": sum([len(i[1]) for i in self.store.values()]),
+            }
+
+
+def load_orderbook_fixtures():
+    books = {}
+    for fn in sorted(os.listdir(ORDERBOOK_FIXTURES_PATH)):
+        if fn.endswith(".json"):
+            with open(f"{ORDERBOOK_FIXTURES_PATH}/{fn}", "r") as f:
+                books[fn.replace(".json", "")] = json.load(f)
+    return books
+
+
+class Mm2RequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        resp = self.server.mm2.respond(params)
+        body = json.dumps(resp).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Mm2Server(ThreadingHTTPServer):
+    # The orderbook threads open many connections at once
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class MockMm2:
+    """
+    Local mm2 RPC server which replays the orderbook fixtures. Pairs
+    without a fixture get the first fixture relabelled, so every pair
+    has a book to process.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.books = load_orderbook_fixtures()
+        self.template = self.books[sorted(self.books.keys())[0]]
+        self.requests = 0
+        self.server = Mm2Server((host, port), Mm2RequestHandler)
+        self.server.mm2 = self
+        self.host = f"http://{host}"
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def orderbook(self, base, rel):
+        book = self.books.get(f"{base}_{rel}")
+        if book is not None:
+            return book
+        book = json.loads(json.dumps(self.template))
+        book.update({"base": base, "rel": rel})
+        for i in book["asks"]:
+            i["coin"] = base
+        for i in book["bids"]:
+            i["coin"] = rel
+        return book
+
+    def respond(self, params):
+        self.requests += 1
+        method = params.get("method")
+        if method == "orderbook":
+            result = self.orderbook(params["params"]["base"], params["params"]["rel"])
+            return {"mmrpc": "2.0", "result": result, "id": params.get("id")}
+        if method == "version":
+            return {"result": "mock-mm2"}
+        return {"error": f"{method} not supported by mock mm2"}
+
+
+def sqlite_engine(path):
+    """SQLite engine with the postgres functions the queries rely on"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "concat", -1, lambda *args: "".join([str(i) for i in args if i is not None])
+        )
+
+    DefiSwapTest.__table__.create(engine, checkfirst=True)
+    PubkeySketchTest.__table__.create(engine, checkfirst=True)
+    PairCandleTest.__table__.create(engine, checkfirst=True)
+    return engine
+
+
+def database_engine(path, db: str = "auto"):
+    """
+    Postgres in process via pgserver if it is installed, as the queries
+    are written for postgres (e.g. DISTINCT ON). Otherwise SQLite.
+    """
+    try:
+        if db == "sqlite":
+            raise ImportError
+        import pgserver
+    except ImportError:
+        return sqlite_engine(f"{path}/swaps.db"), None
+    server = pgserver.get_server(path, cleanup_mode="delete")
+    engine = create_engine(server.get_uri())
+    DefiSwapTest.__table__.create(engine, checkfirst=True)
+    PubkeySketchTest.__table__.create(engine, checkfirst=True)
+    PairCandleTest.__table__.create(engine, checkfirst=True)
+    return engine, server
+
+
+def synthetic_swaps(count: int, now: int, days: int = 30, seed: int = 7):
+    """
+    Successful and failed swaps over the last `days`, a third in the last
+    24hrs
+    """
+    rng = random.Random(seed)
+    pubkeys = [f"{i:066x}" for i in range(max(count // 20, 2))]
+    swaps = []
+    for i in range(count):
+        base, quote = rng.sample(SEED_COINS, 2)
+        trade_type = rng.choice([TradeType.BUY, TradeType.SELL])
+        base_amount = Decimal(rng.randint(1, 100000)) / 100
+        quote_amount = Decimal(rng.randint(1, 100000)) / 100
+        if trade_type == TradeType.BUY:
+            maker_coin, taker_coin = base, quote
+            maker_amount, taker_amount = base_amount, quote_amount
+        else:
+            maker_coin, taker_coin = quote, base
+            maker_amount, taker_amount = quote_amount, base_amount
+        if i % 3 == 0:
+            finished_at = now - rng.randint(60, 86000)
+        else:
+            finished_at = now - rng.randint(86400, 86400 * days)
+        # Spread over the duration buckets, keeping the rng sequence
+        duration = 60 + (i * 37) % 3600
+        pair = f"{base}_{quote}"
+        depair = deplatform.pair(pair)
+        swaps.append(
+            {
+                "uuid": f"{i:08d}-bench-4000-8000-{rng.getrandbits(48):012x}",
+                "pair": pair,
+                "pair_std": depair,
+                "pair_reverse": invert.pair(pair),
+                "pair_std_reverse": invert.pair(depair),
+                "trade_type": trade_type,
+                "is_success": 0 if i % 10 == 0 else 1,
+                "maker_coin": maker_coin,
+                "maker_coin_ticker": deplatform.coin(maker_coin),
+                "maker_coin_platform": maker_coin.split("-")[1] if "-" in maker_coin else "",
+                "maker_amount": maker_amount,
+                "maker_gui": rng.choice(SEED_GUIS),
+                "maker_pubkey": rng.choice(pubkeys),
+                "maker_version": "2.0.0",
+                "maker_coin_usd_price": Decimal(1),
+                "taker_coin": taker_coin,
+                "taker_coin_ticker": deplatform.coin(taker_coin),
+                "taker_coin_platform": taker_coin.split("-")[1] if "-" in taker_coin else "",
+                "taker_amount": taker_amount,
+                "taker_gui": rng.choice(SEED_GUIS),
+                "taker_pubkey": rng.choice(pubkeys),
+                "taker_version": "2.0.0",
+                "taker_coin_usd_price": Decimal(1),
+                "price": quote_amount / base_amount,
+                "reverse_price": base_amount / quote_amount,
+                "started_at": finished_at - duration,
+                "finished_at": finished_at,
+                "duration": duration,
+                "validated": True,
+                "last_updated": now,
+            }
+        )
+    return swaps
+
+
+def seed_swaps(engine, swaps, chunk_size=5000):
+    with engine.begin() as conn:
+        for i in range(0, len(swaps), chunk_size):
+            conn.execute(DefiSwapTest.__table__.insert(), swaps[i:i + chunk_size])
+
+
+class OfflineStack:
+    """
+    Swaps memcached, mm2 and postgres for the stand ins above, seeds
+    synthetic swaps and (with `populate`) builds the foundational cache
+    items, so the app can be timed or load tested without services.
+    """
+
+    def __init__(self, path, swaps: int = 5000, db: str = "auto"):
+        self.path = path
+        self.swaps = swaps
+        self.db = db
+        self.mm2 = None
+        self.engine = None
+        self.server = None
+
+    def start(self):
+        from const import MM2_RPC_HOSTS, MM2_RPC_PORTS
+        from lib.cache import CacheItem
+        from util.cron import cron
+        import db.sqldb as db
+        import util.memcache as memcache
+        import util.transform as transform
+
+        self.real_memcache = memcache.MEMCACHE
+        memcache.MEMCACHE = FakeMemcache()
+
+        self.mm2 = MockMm2().start()
+        self.real_hosts, self.real_ports = dict(MM2_RPC_HOSTS), dict(MM2_RPC_PORTS)
+        for i in MM2_RPC_HOSTS:
+            MM2_RPC_HOSTS[i] = self.mm2.host
+            MM2_RPC_PORTS[i] = self.mm2.port
+
+        self.engine, self.server = database_engine(self.path, db=self.db)
+        seed_swaps(self.engine, synthetic_swaps(self.swaps, int(cron.now_utc())))
+        self.real_init = db.SqlDB.__init__
+        engine, real_init = self.engine, self.real_init
+
+        def sqldb_init(self, db_type="pgsql", db_path=None, external=False, table=None):
+            real_init(self, db_type=db_type, db_path=db_path, external=external, table=table)
+            if db_type == "pgsql":
+                self.engine = engine
+
+        db.SqlDB.__init__ = sqldb_init
+        # As if the candles were maintained while the swaps were imported
+        db.SqlUpdate().build_pair_candles(int(cron.now_utc()) - 86400 * 31)
+
+        for i in ["coins_config", "coins", "gecko_source"]:
+            getattr(memcache, f"set_{i}")(CacheItem(name=i).data)
+        # Module level helpers memoize what they read from memcache, which
+        # may have been read from the real memcache at import time
+        for i in vars(transform).values():
+            for attr in ["_coins_config", "_gecko_source"]:
+                if hasattr(i, attr) and not isinstance(i, type):
+                    setattr(i, attr, None)
+        return self
+
+    def populate(self):
+        """Foundational cache items, in the order the cache loops build"""
+        from lib.cache import CacheItem
+        from lib.cache_calc import CacheCalc, CMC
+        import util.memcache as memcache
+
+        memcache.set_pairs_last_traded(CacheCalc().pairs_last_traded())
+        memcache.set_pair_volumes_24hr(CacheCalc().pair_volumes_24hr())
+        memcache.set_pair_prices_24hr(CacheCalc().pair_prices_24hr())
+        memcache.set_coin_volumes_24hr(CacheCalc().coin_volumes_24hr())
+        # Without refresh, variant books are fetched from mm2 inline
+        book = CacheCalc().pairs_orderbook_extended()
+        memcache.set_pairs_orderbook_extended(book)
+        CacheItem(name="pairs_orderbook_extended").save_responses(book)
+        tickers = CacheCalc().tickers(refresh=True)
+        memcache.set_tickers(tickers)
+        gecko_tickers = CacheItem(name="tickers").save_gecko_tickers(tickers)
+        CacheItem(name="tickers").save_responses(tickers, gecko_tickers=gecko_tickers)
+        summary = CacheCalc().markets_summary()
+        memcache.set_markets_summary(summary)
+        CacheItem(name="markets_summary").save_responses(summary)
+        # As CacheItem.save, without writing the cache files
+        pairs = CacheCalc().gecko_pairs(refresh=True)
+        memcache.set_gecko_pairs(pairs)
+        CacheItem(name="gecko_pairs").save_responses(pairs)
+        stats = CacheCalc().stats_api_summary(refresh=True)
+        memcache.set_stats_api_summary(stats)
+        CacheItem(name="stats_api_summary").save_responses(stats)
+        cmc = CMC().summary(refresh=True)
+        memcache.set_cmc_summary(cmc)
+        CacheItem(name="cmc_summary").save_responses(cmc)
+        return self
+
+    def stop(self):
+        from const import MM2_RPC_HOSTS, MM2_RPC_PORTS
+        import db.sqldb as db
+        import util.memcache as memcache
+
+        db.SqlDB.__init__ = self.real_init
+        self.engine.dispose()
+        if self.server is not None:
+            self.server.cleanup()
+        MM2_RPC_HOSTS.update(self.real_hosts)
+        MM2_RPC_PORTS.update(self.real_ports)
+        self.mm2.stop()
+        memcache.MEMCACHE = self.real_memcache
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Load and latency harness. Replays a weighted mix of routes, pairs and
+tickers at one or more target request rates, against a running API or
+an in process copy of the app over the offline stand ins, and reports
+p50/p95/p99 latency, error rate and throughput per route.
+
+From the `api` folder:
+    python benchmarks/load.py --offline --rps 10 50 100 --duration 15
+    python benchmarks/load.py --url http://127.0.0.1:7068 --rps 50
+    python benchmarks/load.py --url http://127.0.0.1:7068 --smoke
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import configparser
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+
+PYTEST_INI_PATH = f"{API_ROOT_PATH}/benchmarks/pytest.ini"
+
+
+def offline_env(path: str = PYTEST_INI_PATH):
+    """
+    Returns the env of benchmarks/pytest.ini as {name: (value, default)},
+    so the offline stack is configured the same as the benchmarks. As
+    with pytest-env, "D:" values are only defaults.
+    """
+    config = configparser.ConfigParser()
+    config.read(path)
+    env = {}
+    for line in config["pytest"]["env"].splitlines():
+        line = line.strip()
+        if line == "":
+            continue
+        is_default = line.startswith("D:")
+        k, v = line.removeprefix("D:").split("=", 1)
+        env[k] = (v, is_default)
+    return env
+
+
+# (weight, route). Weights roughly follow production traffic, where the
+# legacy desktop price and aggregator polling dominate.
+ROUTE_MIX = [
+    (20, "/api/v3/prices/tickers_v2"),
+    (10, "/api/v3/gecko/tickers"),
+    (4, "/api/v3/gecko/pairs"),
+    (10, "/api/v3/gecko/orderbook/{pair_str}"),
+    (4, "/api/v3/gecko/historical_trades/{pair_str}"),
+    (8, "/api/v3/markets/summary"),
+    (4, "/api/v3/markets/ticker"),
+    (6, "/api/v3/markets/orderbook/{pair_str}"),
+    (4, "/api/v3/markets/trades/{pair_str}/1"),
+    (4, "/api/v3/markets/summary_for_ticker/{coin}"),
+    (6, "/api/v3/pairs/orderbook_extended/{pair_str}"),
+    (4, "/api/v3/stats_xyz/summary"),
+    (4, "/api/v3/cmc/summary"),
+    (2, "/api/v3/coins/volumes_24hr"),
+]
+
+# Parameter values for --smoke, as used by the old scan_endpoints.py
+SMOKE_PARAMS = {
+    "ticker_id": "KMD_LTC",
+    "pair_str": "KMD_LTC",
+    "market_pair": "KMD_LTC",
+    "days_in_past": "3",
+    "uuid": "82df2fc6-df0f-439a-a4d3-efb42a3c1db8",
+    "coin": "KMD",
+    "coin_str": "KMD",
+    "ticker": "KMD",
+    "pubkey": "0" * 66,
+    "year": "2024",
+    "category": "version",
+}
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class OfflineApp:
+    """The app served by uvicorn in a thread, over offline stand ins"""
+
+    def __init__(self, swaps: int = 5000, db: str = "auto"):
+        # Set before the app modules are imported
+        for k, (v, is_default) in offline_env().items():
+            if not is_default or k not in os.environ:
+                os.environ[k] = v
+        from benchmarks.fakes import OfflineStack
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.stack = OfflineStack(self.tmpdir.name, swaps=swaps, db=db)
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        import uvicorn
+        from main import app
+
+        self.stack.start().populate()
+        # No lifespan, so the cache loop startup hooks don't run
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, lifespan="off", log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+        self.stack.stop()
+        self.tmpdir.cleanup()
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a sorted list"""
+    if len(values) == 0:
+        return None
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+def is_error(r):
+    """Failed status, or an error in the body as the routes return them"""
+    if r.status_code >= 400:
+        return True
+    head = r.text[:100]
+    return '"error":"' in head or '"result":"error"' in head
+
+
+def sample_params(url: str):
+    """Pairs and tickers for the route templates, from the target"""
+    try:
+        pairs = [i["ticker_id"] for i in requests.get(f"{url}/api/v3/gecko/pairs").json()]
+    except Exception as e:  # pragma: no cover
+        print(f"Failed to get pairs from {url}, using KMD_LTC: {e}")
+        pairs = []
+    if len(pairs) == 0:
+        pairs = ["KMD_LTC"]
+    coins = sorted(set([c for i in pairs for c in i.split("_")]))
+    return {"{pair_str}": pairs, "{coin}": coins}
+
+
+class LoadGenerator:
+    """
+    Open loop: requests are sent on a fixed schedule whether or not
+    earlier ones have returned. Latency is measured from the scheduled
+    send time, so queueing once the target or the workers saturate shows
+    up in the percentiles instead of silently lowering the request rate.
+    """
+
+    def __init__(self, url, mix, params, workers: int = 64, timeout: float = 30, seed=7):
+        self.url = url
+        self.mix = mix
+        self.params = params
+        self.workers = workers
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=self.workers)
+            self.local.session.mount("http://", adapter)
+            self.local.session.mount("https://", adapter)
+        return self.local.session
+
+    def next_request(self):
+        route = self.rng.choices([i[1] for i in self.mix], [i[0] for i in self.mix])[0]
+        path = route
+        for k, v in self.params.items():
+            if k in path:
+                path = path.replace(k, self.rng.choice(v))
+        return route, f"{self.url}{path}"
+
+    def send(self, route, url, scheduled):
+        error = None
+        try:
+            r = self.session().get(url, timeout=self.timeout)
+            if is_error(r):
+                error = f"HTTP {r.status_code}: {r.text[:80]}"
+        except Exception as e:
+            error = f"{type(e).__name__}"
+        return route, time.perf_counter() - scheduled, error
+
+    def run(self, rps: float, duration: float):
+        count = max(int(rps * duration), 1)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            start = time.perf_counter()
+            futures = []
+            for i in range(count):
+                scheduled = start + i / rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                route, url = self.next_request()
+                futures.append(executor.submit(self.send, route, url, scheduled))
+            results = [i.result() for i in futures]
+            elapsed = time.perf_counter() - start
+        return Stage(rps, elapsed, results)
+
+
+class Stage:
+    """Per route latency, error rate and throughput for one target rate"""
+
+    def __init__(self, rps, elapsed, results):
+        self.rps = rps
+        self.elapsed = elapsed
+        routes = {}
+        for route, latency, error in results:
+            routes.setdefault(route, []).append((latency, error))
+        self.routes = {k: self.summarise(v) for k, v in sorted(routes.items())}
+        self.total = self.summarise([(i[1], i[2]) for i in results])
+        self.errors = {}
+        for _, _, error in results:
+            if error is not None:
+                self.errors.update({error: self.errors.get(error, 0) + 1})
+
+    def summarise(self, results):
+        latencies = sorted([i[0] * 1000 for i in results])
+        errors = len([i for i in results if i[1] is not None])
+        return {
+            "requests": len(results),
+            "errors": errors,
+            "error_rate": errors / len(results),
+            "throughput": (len(results) - errors) / self.elapsed,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+
+    def saturated(self, max_error_rate: float, slo_ms=None):
+        """Reasons the target could not keep up at this rate, if any"""
+        reasons = []
+        achieved = self.total["requests"] / self.elapsed
+        if achieved < self.rps * 0.9:
+            reasons.append(f"achieved {achieved:.1f} of {self.rps} rps")
+        if self.total["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {self.total['error_rate']:.1%}")
+        if slo_ms is not None and self.total["p99_ms"] > slo_ms:
+            reasons.append(f"p99 {self.total['p99_ms']:.0f}ms over {slo_ms}ms")
+        return reasons
+
+    def report(self):
+        print(f"\n=== {self.rps} rps target, {self.elapsed:.1f}s ===")
+        header = f"{'route':<48} {'reqs':>6} {'err%':>6} {'ok/s':>8}"
+        print(f"{header} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for route, i in list(self.routes.items()) + [("ALL", self.total)]:
+            print(
+                f"{route:<48} {i['requests']:>6} {i['error_rate']:>6.1%}"
+                f" {i['throughput']:>8.1f} {i['p50_ms']:>9.1f}"
+                f" {i['p95_ms']:>9.1f} {i['p99_ms']:>9.1f}"
+            )
+        for error, count in sorted(self.errors.items(), key=lambda x: -x[1])[:5]:
+            print(f"  {count} x {error}")
+
+    def as_dict(self):
+        return {
+            "rps": self.rps,
+            "elapsed": self.elapsed,
+            "routes": self.routes,
+            "total": self.total,
+            "errors": self.errors,
+        }
+
+
+def smoke(url: str, path_filter=None):
+    """Each GET route in the openapi spec, as scan_endpoints.py did"""
+    failed = 0
+    for path, methods in requests.get(f"{url}/openapi.json").json()["paths"].items():
+        if "get" not in methods or (path_filter is not None and path_filter not in path):
+            continue
+        query = {}
+        for i in methods["get"].get("parameters", []):
+            value = SMOKE_PARAMS.get(i["name"], "")
+            if i["in"] == "path":
+                path = path.replace(f"{{{i['name']}}}", value)
+            elif i["in"] == "query" and i.get("required"):
+                query[i["name"]] = value
+        start = time.perf_counter()
+        r = requests.get(f"{url}{path}", params=query)
+        ms = (time.perf_counter() - start) * 1000
+        ok = not is_error(r)
+        failed += 0 if ok else 1
+        print(f"{'ok' if ok else 'FAIL':<5} {r.status_code} {ms:>9.1f}ms {path}")
+        if not ok:
+            print(f"      {r.text[:100]}")
+    return failed
+
+
+def main():
+    desc = "Replays a weighted route mix at target request rates and reports latency."
+    parser = argparse.ArgumentParser(description=desc)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base url of a running API")
+    target.add_argument(
+        "--offline", action="store_true", help="Serve the app over the offline stand ins"
+    )
+    parser.add_argument(
+        "--rps", type=float, nargs="+", default=[10, 25, 50], help="Target rate per stage"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per stage")
+    parser.add_argument("--workers", type=int, default=64, help="Concurrent requests")
+    parser.add_argument("--routes", help="Only routes containing this string")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-ms", type=float, help="p99 latency above this saturates")
+    parser.add_argument("--swaps", type=int, default=5000, help="Synthetic swaps, offline")
+    parser.add_argument("--db", choices=["auto", "sqlite"], default="auto")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--smoke", action="store_true", help="Check every route once")
+    args = parser.parse_args()
+
+    offline = None
+    url = args.url
+    if args.offline:
+        offline = OfflineApp(swaps=args.swaps, db=args.db).start()
+        url = offline.url
+    try:
+        if args.smoke:
+            sys.exit(1 if smoke(url, args.routes) > 0 else 0)
+        mix = [i for i in ROUTE_MIX if args.routes is None or args.routes in i[1]]
+        if len(mix) == 0:
+            parser.error(f"No routes in the mix contain '{args.routes}'")
+        generator = LoadGenerator(
+            url, mix, sample_params(url), workers=args.workers, timeout=args.timeout
+        )
+        stages = []
+        saturation = None
+        for rps in args.rps:
+            stage = generator.run(rps, args.duration)
+            stage.report()
+            stages.append(stage)
+            reasons = stage.saturated(args.max_error_rate, args.slo_ms)
+            if len(reasons) > 0 and saturation is None:
+                saturation = (rps, reasons)
+        if saturation is None:
+            print(f"\nNot saturated up to {max(args.rps)} rps")
+        else:
+            print(f"\nSaturated at {saturation[0]} rps: {', '.join(saturation[1])}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump([i.as_dict() for i in stages], f, indent=4)
+    finally:
+        if offline is not None:
+            offline.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -58,6 +58,8 @@ DEXAPI_8762_PORT = os.getenv("DEXAPI_8762_PORT")
 # Project path URLs
 API_ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cache files are read from and saved to here when IS_TESTING
+FIXTURES_PATH = os.getenv("FIXTURES_PATH") or f"{API_ROOT_PATH}/tests/fixtures"
 
 # FastAPI configuration
 API_HOST = os.getenv("API_HOST") or "0.0.0.0"
@@ -72,6 +74,22 @@ if not FIXER_API_KEY:
         "FIXER_API_KEY is not set in .env file. Without this, '/api/v3/rates/fixer_io' will fail."
     )
 
+# Upstream APIs (CoinGecko, CMC, coins repo) fetching
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL") or "https://api.coingecko.com/api/v3"
+CMC_API_URL = os.getenv("CMC_API_URL") or "https://pro-api.coinmarketcap.com"
+# Concurrent requests per batch, e.g. CoinGecko price chunks
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "4"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+# Seconds before the first retry, doubled for each one after
+FETCH_BACKOFF = float(os.getenv("FETCH_BACKOFF", "0.5"))
+FETCH_TIMEOUT = int(os.getenv("FETCH_TIMEOUT", "15"))
+# Longest Retry-After / rate limit reset (seconds) waited for in a fetch
+FETCH_MAX_WAIT = int(os.getenv("FETCH_MAX_WAIT", "60"))
+# Upstream responses with their ETag / Last-Modified, for revalidation
+FETCH_CACHE_PATH = os.getenv("FETCH_CACHE_PATH") or f"{API_ROOT_PATH}/cache/http"
+# The CMC id map changes rarely, it is revalidated at most daily
+CMC_ASSETS_MAX_AGE = 86400
+
 # Path of active MM2.db database for NetId 7777 running
 # in this repos docker container [if NODE_TYPE is not 'process']
 LOCAL_MM2_DB_PATH_7777 = os.getenv("LOCAL_MM2_DB_PATH_7777")
@@ -144,6 +162,9 @@ MARKETS_PAIRS_DAYS = 30
 GENERIC_PAIRS_DAYS = 30
 
 MEMCACHE_LIMIT = 500 * 1024 * 1024  # 500 MB
+# Defaults to the docker container, then localhost
+MEMCACHE_HOST = os.getenv("MEMCACHE_HOST")
+MEMCACHE_PORT = int(os.getenv("MEMCACHE_PORT", "11211"))
 DEXAPI_USERPASS = os.getenv("DEXAPI_USERPASS")
 
 ORDERBOOK_CACHE_MIN_TRADES = int(os.getenv("ORDERBOOK_CACHE_MIN_TRADES", "1"))
@@ -153,3 +174,61 @@ ORDERBOOK_CACHE_WAIT_INTERVAL = float(os.getenv("ORDERBOOK_CACHE_WAIT_INTERVAL",
 
 ORDERBOOK_FETCH_BATCH_SIZE = int(os.getenv("ORDERBOOK_FETCH_BATCH_SIZE", "100"))
 ORDERBOOK_FETCH_LOOP_SLEEP = float(os.getenv("ORDERBOOK_FETCH_LOOP_SLEEP", "0.5"))
+
+# Adaptive orderbook refresh. Every cycle, pairs past their interval are
+# refreshed, using at most ORDERBOOK_RPC_BUDGET orderbook RPC calls. The
+# interval runs from MIN (hot pairs) to MAX (idle pairs) seconds, and MAX
+# should stay below the 900s expiry of the variant orderbook caches.
+ORDERBOOK_REFRESH_CYCLE = int(os.getenv("ORDERBOOK_REFRESH_CYCLE", "15"))
+ORDERBOOK_RPC_BUDGET = int(os.getenv("ORDERBOOK_RPC_BUDGET", "40"))
+# Pairs are requested ORDERBOOK_FETCH_LOOP_SLEEP seconds apart, so at most
+# this many are refreshed each cycle, or a batch would outlast the cycle
+ORDERBOOK_REFRESH_PAIRS = (
+    max(int(ORDERBOOK_REFRESH_CYCLE / ORDERBOOK_FETCH_LOOP_SLEEP), 1)
+    if ORDERBOOK_FETCH_LOOP_SLEEP > 0
+    else ORDERBOOK_RPC_BUDGET
+)
+ORDERBOOK_REFRESH_MIN = int(os.getenv("ORDERBOOK_REFRESH_MIN", "15"))
+ORDERBOOK_REFRESH_MAX = int(os.getenv("ORDERBOOK_REFRESH_MAX", "600"))
+# A pair is fully hot at this 24hr volume or request rate
+ORDERBOOK_HOT_VOLUME_USD = 100000
+ORDERBOOK_HOT_REQUESTS_PER_MIN = 6
+# Share of a pair's heat from how often its book changes between refreshes
+ORDERBOOK_CHURN_WEIGHT = 0.25
+# Request rates are averaged over about this many seconds
+ORDERBOOK_ACTIVITY_HALF_LIFE = 600
+
+# Short lived cache for parameterised DB backed routes. Concurrent
+# identical requests wait up to ATTEMPTS * INTERVAL seconds for the first
+# to finish.
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", "60"))
+ROUTE_CACHE_LOCK_TTL = int(os.getenv("ROUTE_CACHE_LOCK_TTL", "30"))
+ROUTE_CACHE_WAIT_ATTEMPTS = int(os.getenv("ROUTE_CACHE_WAIT_ATTEMPTS", "50"))
+ROUTE_CACHE_WAIT_INTERVAL = float(os.getenv("ROUTE_CACHE_WAIT_INTERVAL", "0.1"))
+
+# Serve pre-validated cached payloads as raw JSON, skipping per-request
+# response_model validation. Set to "False" to fall back to FastAPI
+# validation.
+TRUSTED_CACHE_RESPONSES = os.getenv("TRUSTED_CACHE_RESPONSES", "True") == "True"
+
+# Unique pubkeys are counted in SQL by default. Once the daily pubkey
+# sketches are backfilled (`scripts/import_swaps.py
+# --build_pubkey_sketches`), set to "False" to merge the sketches
+# instead (~1.6% standard error, at a fixed cost per day).
+DISTINCT_PUBKEYS_EXACT = os.getenv("DISTINCT_PUBKEYS_EXACT", "True") == "True"
+
+# OHLCV candle intervals (seconds) kept in the candle store. Each divides
+# a day, so candles for a pair can be rebuilt a UTC day at a time.
+CANDLE_INTERVALS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+# Most candles (buckets in the requested range) returned by one request
+CANDLES_MAX_COUNT = int(os.getenv("CANDLES_MAX_COUNT", "10000"))
+
+# Swap duration stats are histograms over this many days back, so refresh
+# cost is bounded by the window rather than the size of swap history.
+DURATION_STATS_DAYS = int(os.getenv("DURATION_STATS_DAYS", "30"))
+# Upper edges (seconds) of the swap duration histogram buckets
+DURATION_BUCKETS = [
+    30, 60, 90, 120, 180, 240, 300, 420, 600, 900, 1200, 1800, 2700, 3600, 7200, 14400,
+    43200, 86400,
+]
+DURATION_PERCENTILES = [50, 75, 90, 95, 99]
@@ -3,12 +3,26 @@ import sys
 import sqlite3
 import argparse
 
+try:
+    from util.logger import logger
+except ImportError:  # pragma: no cover
+    # Run standalone on a source server, without the api package
+    import logging
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("backup_db")
+
 """
 Used to backup MM2.db files on source servers
 prior to exfiltration with rsync.
 """
 
 
+# Swaps finished within this many seconds of the latest exported swap
+# are checked again, to pick up rows updated after they were exported.
+UPDATE_LOOKBACK = 86400
+
+
 def progress(status, remaining, total):
     print(f"Copied {total-remaining} of {total} pages...")
 
@@ -23,6 +37,60 @@ def backup_db(src_db_path, dest_db_path):
     src.close()
 
 
+def export_swaps(src_db_path, dest_db_path, lookback=UPDATE_LOOKBACK):
+    """
+    Copies stats_swaps rows added since the last export, and recent rows
+    which have changed, instead of every page of the source database.
+    Falls back to a full backup if the source ids no longer line up.
+    Returns the number of rows added or updated.
+    """
+    rows = None
+    dest = sqlite3.connect(dest_db_path)
+    with dest:
+        create_swap_stats_table(dest.cursor())
+    last_id, last_finished_at = dest.execute(
+        "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(finished_at), 0) FROM stats_swaps;"
+    ).fetchone()
+    dest.execute("ATTACH DATABASE ? AS src;", (src_db_path,))
+    try:
+        src_last_id = dest.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM src.stats_swaps;"
+        ).fetchone()[0]
+        # A source with fewer rows than exported has been replaced
+        if src_last_id >= last_id:
+            dest_columns = [
+                i[1] for i in dest.execute("PRAGMA main.table_info(stats_swaps);")
+            ]
+            columns = [
+                i[1]
+                for i in dest.execute("PRAGMA src.table_info(stats_swaps);")
+                if i[1] in dest_columns
+            ]
+            updates = [i for i in columns if i != "id"]
+            sql = f"INSERT INTO main.stats_swaps ({','.join(columns)})"
+            sql += f" SELECT {','.join(columns)} FROM src.stats_swaps"
+            sql += " WHERE id > ? OR finished_at > ?"
+            sql += " ON CONFLICT(id) DO UPDATE SET "
+            sql += ", ".join([f"{i} = excluded.{i}" for i in updates])
+            sql += " WHERE "
+            sql += " OR ".join([f"stats_swaps.{i} IS NOT excluded.{i}" for i in updates])
+            sql += ";"
+            with dest:
+                rows = dest.execute(sql, (last_id, last_finished_at - lookback)).rowcount
+    except sqlite3.IntegrityError as e:
+        # Same uuid under a different id, e.g. after a vacuum
+        logger.warning(f"Incremental export of {src_db_path} failed: {e}")
+    finally:
+        dest.execute("DETACH DATABASE src;")
+        dest.close()
+    if rows is None:
+        backup_db(src_db_path, dest_db_path)
+        dest = sqlite3.connect(dest_db_path)
+        rows = dest.execute("SELECT COUNT(*) FROM stats_swaps;").fetchone()[0]
+        dest.close()
+    return rows
+
+
 def create_swap_stats_table(cursor):
     cursor.execute(
         """
@@ -71,9 +139,16 @@ if __name__ == "__main__":
     parser.add_argument(
         "--dest", type=str, required=True, help="Path to destination MM2.db file"
     )
+    parser.add_argument(
+        "--full", action="store_true", help="Copy every page instead of new swaps"
+    )
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
         sys.exit(1)
 
     args = parser.parse_args()
-    backup_db(args.src, args.dest)
+    if args.full:
+        backup_db(args.src, args.dest)
+    else:
+        rows = export_swaps(args.src, args.dest)
+        logger.info(f"Exported {rows} swaps...")
@@ -3,7 +3,7 @@ from datetime import datetime
 from decimal import Decimal
 from sqlmodel import SQLModel, Field
 from util.enums import TradeType
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 from enum import Enum
 
 
@@ -14,6 +14,13 @@ class CoinPlatform(str, Enum):
 
 class DefiSwap(SQLModel, table=True):
     __tablename__ = "defi_swaps"
+    # Pubkey trade history is a union of a scan on each of these
+    __table_args__ = (
+        Index("ix_defi_swaps_maker_pubkey", "maker_pubkey", "finished_at", "uuid"),
+        Index("ix_defi_swaps_taker_pubkey", "taker_pubkey", "finished_at", "uuid"),
+        # For windowed aggregates (e.g. swap durations) over finished_at
+        Index("ix_defi_swaps_finished_at", "finished_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: str = Field(
         default="77777777-7777-7777-7777-777777777777", unique=True, nullable=False
@@ -52,6 +59,13 @@ class DefiSwap(SQLModel, table=True):
 
 class DefiSwapTest(SQLModel, table=True):
     __tablename__ = "defi_swaps_test"
+    # Pubkey trade history is a union of a scan on each of these
+    __table_args__ = (
+        Index("ix_defi_swaps_test_maker_pubkey", "maker_pubkey", "finished_at", "uuid"),
+        Index("ix_defi_swaps_test_taker_pubkey", "taker_pubkey", "finished_at", "uuid"),
+        # For windowed aggregates (e.g. swap durations) over finished_at
+        Index("ix_defi_swaps_test_finished_at", "finished_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     uuid: str = Field(
         default="77777777-7777-7777-7777-777777777777", unique=True, nullable=False
@@ -91,6 +105,78 @@ class DefiSwapTest(SQLModel, table=True):
         use_slots = True
 
 
+class PubkeySketch(SQLModel, table=True):
+    __tablename__ = "pubkey_sketches"
+    __table_args__ = (UniqueConstraint("day", "dimension"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: int = 0
+    dimension: str = "all"
+    sketch: str = ""
+
+
+class PubkeySketchTest(SQLModel, table=True):
+    __tablename__ = "pubkey_sketches_test"
+    __table_args__ = (UniqueConstraint("day", "dimension"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: int = 0
+    dimension: str = "all"
+    sketch: str = ""
+
+    class Config:
+        use_slots = True
+
+
+class PairCandle(SQLModel, table=True):
+    __tablename__ = "pair_candles"
+    # pair is a variant (e.g. KMD_LTC-segwit), pair_std is its depair
+    # (KMD_LTC)
+    __table_args__ = (
+        UniqueConstraint("pair", "interval", "start"),
+        Index("ix_pair_candles_pair_std", "pair_std", "interval", "start"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pair: str = "XXX-PROTO_YYY-PROTO"
+    pair_std: str = "XXX_YYY"
+    interval: str = "1h"
+    start: int = 0
+    open: Decimal = 0
+    high: Decimal = 0
+    low: Decimal = 0
+    close: Decimal = 0
+    open_time: int = 0
+    close_time: int = 0
+    base_volume: Decimal = 0
+    quote_volume: Decimal = 0
+    volume_usd: Decimal = 0
+    trades: int = 0
+
+
+class PairCandleTest(SQLModel, table=True):
+    __tablename__ = "pair_candles_test"
+    __table_args__ = (
+        UniqueConstraint("pair", "interval", "start"),
+        Index("ix_pair_candles_test_pair_std", "pair_std", "interval", "start"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pair: str = "XXX-PROTO_YYY-PROTO"
+    pair_std: str = "XXX_YYY"
+    interval: str = "1h"
+    start: int = 0
+    open: Decimal = 0
+    high: Decimal = 0
+    low: Decimal = 0
+    close: Decimal = 0
+    open_time: int = 0
+    close_time: int = 0
+    base_volume: Decimal = 0
+    quote_volume: Decimal = 0
+    volume_usd: Decimal = 0
+    trades: int = 0
+
+    class Config:
+        use_slots = True
+
+
 class CipiSwap(SQLModel, table=True):
     __tablename__ = "swaps"
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -6,7 +6,9 @@ from datetime import date, datetime, timezone
 from datetime import time as dt_time
 from dotenv import load_dotenv
 from itertools import chain
-from sqlalchemy import Numeric, func, text
+from sqlalchemy import Numeric, case, func, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.sql.expression import bindparam
 from sqlmodel import Session, SQLModel, create_engine, text, update, select, or_, and_
 from typing import Dict
@@ -22,18 +24,27 @@ from const import (
     POSTGRES_PORT,
     POSTGRES_DATABASE,
     MM2_DB_PATH_ALL,
+    DISTINCT_PUBKEYS_EXACT,
+    CANDLE_INTERVALS,
+    DURATION_BUCKETS,
 )
 from db.schema import (
     DefiSwap,
     DefiSwapTest,
+    PairCandle,
+    PairCandleTest,
+    PubkeySketch,
+    PubkeySketchTest,
     StatsSwap,
     CipiSwap,
     CipiSwapFailed,
     Mm2StatsNodes,
 )
+from util.enums import TradeType
 from util.exceptions import InvalidParamCombination
 from util.logger import logger, timed
-from util.transform import merge, sortdata, deplatform, invert, derive, template
+from util.sketch import HyperLogLog
+from util.transform import merge, sortdata, deplatform, invert, derive, template, clean
 from util.cron import cron
 from lib.external import gecko_api
 import util.defaults as default
@@ -42,6 +53,21 @@ import util.validate as validate
 
 load_dotenv()
 
+# Pair candle columns returned by SqlQuery.pair_candles
+CANDLE_FIELDS = [
+    "start",
+    "open",
+    "high",
+    "low",
+    "close",
+    "open_time",
+    "close_time",
+    "base_volume",
+    "quote_volume",
+    "volume_usd",
+    "trades",
+]
+
 
 class SqlDB:
     def __init__(
@@ -63,6 +89,12 @@ class SqlDB:
                     self.table = DefiSwapTest
                 else:
                     self.table = DefiSwap
+            if os.getenv("IS_TESTING") == "True":
+                self.sketch_table = PubkeySketchTest
+                self.candle_table = PairCandleTest
+            else:
+                self.sketch_table = PubkeySketch
+                self.candle_table = PairCandle
             self.db_url = (
                 f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}"
             )
@@ -134,8 +166,8 @@ class SqlFilter:
         if pubkey is not None:
             q = q.filter(
                 or_(
-                    pubkey == self.table.pubkey_gui,
-                    pubkey == self.table.pubkey_gui,
+                    pubkey == self.table.maker_pubkey,
+                    pubkey == self.table.taker_pubkey,
                 )
             )
         return q
@@ -189,8 +221,8 @@ class SqlFilter:
         if version is not None:
             q = q.filter(
                 or_(
-                    version == self.table.version_gui,
-                    version == self.table.version_gui,
+                    version == self.table.maker_version,
+                    version == self.table.taker_version,
                 )
             )
         return q
@@ -230,6 +262,207 @@ class SqlUpdate(SqlDB):
         except Exception as e:  # pragma: no cover
             logger.warning(e)
 
+    @timed
+    def create_tables(self):
+        """
+        Creates the tables derived from swaps, which imports keep up to
+        date. Existing tables are left as they are.
+        """
+        self.sketch_table.__table__.create(self.engine, checkfirst=True)
+        self.candle_table.__table__.create(self.engine, checkfirst=True)
+
+    @timed
+    def create_indexes(self):
+        """
+        Creates indexes added to the schema after the table was created.
+        On postgres they are built CONCURRENTLY, so the live table stays
+        writable while they build.
+        """
+        if self.db_type != "pgsql":
+            for index in self.table.__table__.indexes:
+                index.create(self.engine, checkfirst=True)
+            return
+        # CONCURRENTLY can't run inside a transaction block
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        with conn:
+            for index in self.table.__table__.indexes:
+                valid = conn.execute(
+                    text(
+                        "SELECT i.indisvalid FROM pg_index i"
+                        " JOIN pg_class c ON c.oid = i.indexrelid"
+                        " WHERE c.relname = :name"
+                    ),
+                    {"name": index.name},
+                ).scalar()
+                if valid:
+                    continue
+                if valid is not None:
+                    # Left invalid by an interrupted concurrent build
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY {index.name}"))
+                ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+                ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                conn.execute(text(ddl))
+                logger.info(f"Created index {index.name}")
+
+    @timed
+    def update_pubkey_sketches(self, swaps):
+        """
+        Adds the pubkeys of successful swaps to the daily HyperLogLog
+        sketches for all swaps, each gui and each pair_std. Adding a
+        pubkey twice has no effect, so swaps can be re-imported safely.
+        """
+        try:
+            sketches = {}
+            for i in swaps:
+                if i["is_success"] != 1 or not i["finished_at"]:
+                    continue
+                day = int(i["finished_at"]) // 86400 * 86400
+                for side in ["maker", "taker"]:
+                    pubkey = i[f"{side}_pubkey"]
+                    if pubkey in [None, "", "unknown"]:
+                        continue
+                    dimensions = ["all", f"pair:{deplatform.pair(i['pair_std'])}"]
+                    if i[f"{side}_gui"] not in [None, "", "unknown"]:
+                        dimensions.append(f"gui:{i[f'{side}_gui']}")
+                    for dimension in dimensions:
+                        if (day, dimension) not in sketches:
+                            sketches[(day, dimension)] = HyperLogLog()
+                        sketches[(day, dimension)].add(pubkey)
+            if len(sketches) == 0:
+                return default.result(msg="No pubkey sketches to update", loglevel="muted")
+
+            t = self.sketch_table
+            days = {i[0] for i in sketches}
+            if self.engine.dialect.name == "postgresql":
+                insert = postgresql.insert
+            else:
+                insert = sqlite.insert
+            with Session(self.engine) as session:
+                # Concurrent imports merge into the same rows, so each
+                # row is inserted if missing, then locked until merged
+                rows = [{"day": k[0], "dimension": k[1], "sketch": ""} for k in sorted(sketches)]
+                stmt = insert(t.__table__).values(rows).on_conflict_do_nothing()
+                session.connection().execute(stmt)
+                q = session.query(t).filter(
+                    t.day.in_(days), t.dimension.in_({i[1] for i in sketches})
+                )
+                q = q.order_by(t.day, t.dimension).with_for_update()
+                for row in q.all():
+                    if (row.day, row.dimension) not in sketches:
+                        continue
+                    hll = sketches[(row.day, row.dimension)]
+                    if row.sketch:
+                        hll.merge(HyperLogLog.deserialize(row.sketch))
+                    row.sketch = hll.serialize()
+                session.commit()
+            msg = f"{len(sketches)} pubkey sketches updated for {len(days)} days"
+            return default.result(msg=msg, loglevel="updated", ignore_until=5)
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    @timed
+    def build_pubkey_sketches(self, start_time: int, end_time: int = 0):
+        """Backfills pubkey sketches from imported swaps, by day"""
+        if end_time == 0:
+            end_time = int(cron.now_utc())
+        t = self.table
+        cols = [
+            t.is_success,
+            t.finished_at,
+            t.pair_std,
+            t.maker_pubkey,
+            t.maker_gui,
+            t.taker_pubkey,
+            t.taker_gui,
+        ]
+        day = start_time // 86400 * 86400
+        while day < end_time:
+            with Session(self.engine) as session:
+                q = session.query(*cols).filter(
+                    t.finished_at >= day, t.finished_at < day + 86400
+                )
+                swaps = [dict(zip([c.key for c in cols], r)) for r in q.all()]
+            self.update_pubkey_sketches(swaps)
+            day += 86400
+
+    @timed
+    def update_pair_candles(self, swaps):
+        """
+        Rebuilds the OHLCV candles of each pair variant and UTC day that
+        the given (imported or updated) swaps fall in, from the successful
+        swaps in the table. Only touched days are rebuilt, and rebuilding
+        replaces them, so swaps can be re-imported or flip status safely.
+        """
+        try:
+            touched = {
+                (i["pair"], int(i["finished_at"]) // 86400 * 86400)
+                for i in swaps
+                if i["finished_at"] and i["pair"]
+            }
+            if len(touched) == 0:
+                return default.result(msg="No pair candles to update", loglevel="muted")
+            t = self.table
+            cols = [
+                t.pair,
+                t.pair_std,
+                t.trade_type,
+                t.price,
+                t.finished_at,
+                t.maker_amount,
+                t.taker_amount,
+                t.maker_coin_usd_price,
+                t.taker_coin_usd_price,
+            ]
+            days = {i[1] for i in touched}
+            with Session(self.engine) as session:
+                q = session.query(*cols).filter(
+                    t.is_success == 1,
+                    t.pair.in_({i[0] for i in touched}),
+                    t.finished_at >= min(days),
+                    t.finished_at < max(days) + 86400,
+                )
+                q = q.order_by(t.finished_at, t.id)
+                candles = {}
+                for r in q.all():
+                    i = dict(zip([c.key for c in cols], r))
+                    if (i["pair"], i["finished_at"] // 86400 * 86400) not in touched:
+                        continue
+                    for interval, seconds in CANDLE_INTERVALS.items():
+                        candle = derive.swap_candle(i, interval, seconds)
+                        key = (i["pair"], interval, candle["start"])
+                        if key in candles:
+                            merge.candles(candles[key], candle)
+                        else:
+                            candles[key] = candle
+
+                c = self.candle_table
+                for pair, day in touched:
+                    session.query(c).filter(
+                        c.pair == pair, c.start >= day, c.start < day + 86400
+                    ).delete(synchronize_session=False)
+                session.add_all([c(**i) for i in candles.values()])
+                session.commit()
+            msg = f"{len(candles)} pair candles rebuilt for {len(touched)} pair days"
+            return default.result(msg=msg, loglevel="updated", ignore_until=5)
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    @timed
+    def build_pair_candles(self, start_time: int, end_time: int = 0):
+        """Backfills pair candles from existing swaps, a day at a time"""
+        if end_time == 0:
+            end_time = int(cron.now_utc())
+        t = self.table
+        day = start_time // 86400 * 86400
+        while day < end_time:
+            with Session(self.engine) as session:
+                q = session.query(t.pair, t.finished_at).filter(
+                    t.finished_at >= day, t.finished_at < day + 86400
+                )
+                swaps = [{"pair": r[0], "finished_at": r[1]} for r in q.distinct()]
+            self.update_pair_candles(swaps)
+            day += 86400
+
     @timed
     def fix_swap_pairs(self, start_time=1, end_time=0, trigger=None):
         pgdb_query = SqlQuery(db_type="pgsql", gecko_source=self.gecko_source)
@@ -629,9 +862,9 @@ class SqlQuery(SqlDB):
                 for variant in volumes["volumes"][depair]:
                     base_vol = volumes["volumes"][depair][variant]["base_volume"]
                     quote_vol = volumes["volumes"][depair][variant]["quote_volume"]
-                    base_vol_usd = Decimal(base_vol * base_price_usd)
-                    quote_vol_usd = Decimal(quote_vol * quote_price_usd)
-                    trade_vol_usd = Decimal(base_vol_usd + quote_vol_usd)
+                    base_vol_usd = base_vol * base_price_usd
+                    quote_vol_usd = quote_vol * quote_price_usd
+                    trade_vol_usd = base_vol_usd + quote_vol_usd
                     volumes["volumes"][depair][variant].update(
                         {
                             "base_volume": base_vol,
@@ -664,8 +897,78 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
-    # TODO: Pair swap duration stats.
-    # Fastest, slowest, average, [x,y] for graph
+    @timed
+    def swap_durations(self, start_time: int = 0, end_time: int = 0):
+        """
+        Returns swap duration histograms per coin, pair and gui between
+        two timestamps, with failed swap counts. Each is a grouped query
+        over the time range, returning a row per group and bucket.
+        If no timestamp is given, returns data for last 24 hrs.
+        """
+        try:
+            if start_time == 0:
+                start_time = int(cron.now_utc()) - 86400
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            bucket = case(
+                *[
+                    (self.table.duration <= edge, idx)
+                    for idx, edge in enumerate(DURATION_BUCKETS)
+                ],
+                else_=len(DURATION_BUCKETS),
+            )
+            # A swap counts once for each distinct coin / gui it involves
+            columns = {
+                "coins": [self.table.maker_coin_ticker, self.table.taker_coin_ticker],
+                "pairs": [self.table.pair_std],
+                "guis": [self.table.maker_gui, self.table.taker_gui],
+            }
+            resp = {"start_time": start_time, "end_time": end_time}
+            with Session(self.engine) as session:
+                for group, cols in columns.items():
+                    resp[group] = {}
+                    for idx, col in enumerate(cols):
+                        q = session.query(
+                            col.label("key"),
+                            self.table.is_success,
+                            bucket.label("bucket"),
+                            func.count(self.table.id).label("num_swaps"),
+                            func.sum(self.table.duration).label("total"),
+                            func.min(self.table.duration).label("min"),
+                            func.max(self.table.duration).label("max"),
+                        )
+                        q = self.sqlfilter.timestamps(q, start_time, end_time)
+                        q = q.filter(self.table.duration >= 0)
+                        if idx > 0:
+                            q = q.filter(col != cols[0])
+                        q = q.group_by(col, self.table.is_success, bucket)
+                        for i in q.all():
+                            i = dict(i)
+                            item = resp[group].setdefault(
+                                i["key"], template.duration_histogram()
+                            )
+                            num_swaps = int(i["num_swaps"])
+                            if i["is_success"] == 0:
+                                item["failed"] += num_swaps
+                                continue
+                            if i["is_success"] != 1:
+                                continue
+                            item["successful"] += num_swaps
+                            item["total_duration"] += int(i["total"])
+                            item["buckets"][int(i["bucket"])] += num_swaps
+                            if item["min"] is None or i["min"] < item["min"]:
+                                item["min"] = int(i["min"])
+                            if item["max"] is None or i["max"] > item["max"]:
+                                item["max"] = int(i["max"])
+            return default.result(
+                data=resp,
+                msg="swap_durations complete",
+                loglevel="query",
+                ignore_until=5,
+            )
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
     # TODO: Subclass 'last trade'
     @timed
     def last_trade(
@@ -966,12 +1269,21 @@ class SqlQuery(SqlDB):
                     q = self.sqlfilter.gui(q, gui)
                 if uuid is not None:
                     q = self.sqlfilter.uuid(q, uuid)
-                if gui is not None:
-                    q = self.sqlfilter.version(q, version)
                 if version is not None:
+                    q = self.sqlfilter.version(q, version)
+                if pubkey is not None:
                     q = self.sqlfilter.pubkey(q, pubkey)
                 if end_time != 1741176652:
                     q = self.sqlfilter.success(q, success_only, failed_only)
+                if coin is not None:
+                    # Only swaps for one of the coin's variants
+                    variants = derive.coin_variants(coin)
+                    q = q.filter(
+                        or_(
+                            self.table.maker_coin.in_(variants),
+                            self.table.taker_coin.in_(variants),
+                        )
+                    )
                 if self.table in [CipiSwap, CipiSwapFailed]:
                     q = q.order_by(self.table.started_at)
                 else:
@@ -982,7 +1294,6 @@ class SqlQuery(SqlDB):
                 if end_time == 1741176652:
                     logger.info(f"Got {len(data)} swaps for {start_time} to {end_time} | {coin} | {pair_str} |")
                 if coin is not None:
-                    variants = derive.coin_variants(coin)
                     resp = {
                         i: [j for j in data if i in [j["taker_coin"], j["maker_coin"]]]
                         for i in variants
@@ -1015,6 +1326,146 @@ class SqlQuery(SqlDB):
         msg += f" between {start_time} and {end_time}"
         return default.result(data=resp, msg=msg, loglevel="muted")
 
+    @timed
+    def pair_trades(
+        self,
+        pairs: list,
+        start_time: int,
+        end_time: int,
+        trade_type: str = "all",
+        limit: int = 100,
+    ):
+        """
+        Returns successful swaps for a list of pair variants (as stored
+        in the `pair` column), with the latest `limit` per stored pair (0
+        for no limit), and totals for all swaps in the timespan grouped by
+        pair and trade_type. `trade_type` is as stored, i.e. for the mcap
+        sorted pair.
+        """
+        t = self.table
+        filters = [
+            t.pair.in_(pairs),
+            t.finished_at > start_time,
+            t.finished_at < end_time,
+            t.is_success == 1,
+        ]
+        if trade_type != "all":
+            filters.append(t.trade_type == TradeType(trade_type))
+        cols = [
+            t.uuid,
+            t.pair,
+            t.trade_type,
+            t.finished_at,
+            t.price,
+            t.reverse_price,
+            t.maker_amount,
+            t.taker_amount,
+        ]
+        with Session(self.engine) as session:
+            q = session.query(
+                t.pair,
+                t.trade_type,
+                func.count(),
+                func.sum(t.maker_amount),
+                func.sum(t.taker_amount),
+                func.sum(t.price),
+                func.sum(t.reverse_price),
+            )
+            q = q.filter(*filters).group_by(t.pair, t.trade_type)
+            totals = [
+                dict(zip(
+                    ["pair", "trade_type", "count", "maker_amount",
+                     "taker_amount", "price", "reverse_price"],
+                    i,
+                ))
+                for i in q.all()
+            ]
+
+            if limit > 0:
+                rank = func.row_number().over(
+                    partition_by=t.pair,
+                    order_by=(t.finished_at.desc(), t.uuid.desc()),
+                )
+                ranked = session.query(*cols, rank.label("rank"))
+                ranked = ranked.filter(*filters).subquery()
+                q = session.query(*[ranked.c[c.key] for c in cols])
+                q = q.filter(ranked.c.rank <= limit)
+                q = q.order_by(ranked.c.finished_at.desc(), ranked.c.uuid.desc())
+            else:
+                q = session.query(*cols).filter(*filters)
+                q = q.order_by(t.finished_at.desc(), t.uuid.desc())
+            trades = [dict(zip([c.key for c in cols], i)) for i in q.all()]
+        return {"trades": trades, "totals": totals}
+
+    @timed
+    def pubkey_trades(
+        self,
+        pubkey: str,
+        start_time: int = 1,
+        end_time: int = 0,
+        coin: str | None = None,
+        pair: str | None = None,
+        success_only: bool = False,
+        limit: int = 100,
+        before_time: int | None = None,
+        before_uuid: str | None = None,
+    ):
+        """
+        Returns a page of swaps where `pubkey` was the maker or taker,
+        newest first. Each side is a scan of its (pubkey, finished_at,
+        uuid) index, and the two are combined with a UNION. For the next
+        page, pass the `finished_at` and `uuid` of the last swap returned
+        as `before_time` and `before_uuid`.
+        """
+        try:
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            t = self.table
+            filters = [t.finished_at > start_time, t.finished_at < end_time]
+            if before_time is not None:
+                if before_uuid is not None:
+                    filters.append(
+                        tuple_(t.finished_at, t.uuid) < tuple_(before_time, before_uuid)
+                    )
+                else:
+                    filters.append(t.finished_at < before_time)
+            if coin is not None:
+                variants = derive.coin_variants(coin)
+                filters.append(or_(t.maker_coin.in_(variants), t.taker_coin.in_(variants)))
+            if pair is not None:
+                pair = deplatform.pair(pair)
+                filters.append(or_(t.pair_std == pair, t.pair_std_reverse == pair))
+            if success_only:
+                filters.append(t.is_success == 1)
+
+            sides = []
+            for side_pubkey in [t.maker_pubkey, t.taker_pubkey]:
+                side = (
+                    select(t)
+                    .where(side_pubkey == pubkey, *filters)
+                    .order_by(t.finished_at.desc(), t.uuid.desc())
+                    .limit(limit)
+                    .subquery()
+                )
+                sides.append(select(side))
+            trades = sides[0].union(sides[1]).subquery()
+            q = (
+                select(trades)
+                .order_by(trades.c.finished_at.desc(), trades.c.uuid.desc())
+                .limit(limit)
+            )
+            with Session(self.engine) as session:
+                data = [dict(i._mapping) for i in session.execute(q)]
+            next_page = None
+            if len(data) == limit:
+                next_page = {
+                    "before_time": data[-1]["finished_at"],
+                    "before_uuid": data[-1]["uuid"],
+                }
+            return {"trades": data, "next_page": next_page}
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
     @timed
     def get_swap(self, uuid: str = ""):
         try:
@@ -1028,6 +1479,24 @@ class SqlQuery(SqlDB):
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
+    @timed
+    def get_swaps_after_id(
+        self, last_id: int = 0, success_only: bool = True, limit: int = 5000
+    ) -> list:
+        """
+        Returns swaps with a row id above `last_id`, in id order. Source
+        tables are append only, so the id is used as a high-water mark
+        for incremental imports.
+        """
+        try:
+            with Session(self.engine) as session:
+                q = select(self.table).where(self.table.id > last_id)
+                q = self.sqlfilter.success(q, success_only)
+                q = q.order_by(self.table.id).limit(limit)
+                return [dict(i) for i in session.exec(q)]
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
     @timed
     def get_timespan_swaps(self, start_time: int = 0, end_time: int = 0) -> list:
         """
@@ -1303,6 +1772,25 @@ class SqlQuery(SqlDB):
             r = q.all()
             return r[0][0]
 
+    @timed
+    def swaps_fingerprint(self, start_time: int = 1, end_time: int = 0):
+        """
+        Returns the count and latest timestamps of successful swaps in
+        a timespan, so cache items can tell if their inputs changed.
+        """
+        if end_time == 0:
+            end_time = int(cron.now_utc())
+        with Session(self.engine) as session:
+            q = session.query(
+                func.count(self.table.uuid),
+                func.max(self.table.finished_at),
+                func.max(self.table.last_updated),
+            )
+            q = self.sqlfilter.timestamps(q, start_time=start_time, end_time=end_time)
+            q = self.sqlfilter.success(q, success_only=True)
+            r = q.one()
+            return {"count": r[0], "finished_at": r[1], "last_updated": r[2]}
+
     @timed
     def get_last(self, table: str, limit: int = 3):
         try:
@@ -1341,6 +1829,189 @@ class SqlQuery(SqlDB):
             for i in r:
                 logger.merge(i)
 
+    @timed
+    def distinct_pubkeys(
+        self,
+        start_time: int,
+        end_time: int = 0,
+        gui: str | None = None,
+        pair: str | None = None,
+        exact: bool | None = None,
+    ):
+        """
+        Counts unique pubkeys in successful swaps, optionally for a gui or
+        pair. Unless `exact` (defaulting to DISTINCT_PUBKEYS_EXACT) is
+        set, the daily pubkey sketches for the range (rounded out to
+        whole UTC days) are merged instead of counting distinct pubkeys
+        in SQL, giving a count within ~1.6% (one standard error) at a
+        fixed cost per day.
+        """
+        if gui is not None and pair is not None:
+            raise InvalidParamCombination("Use one of 'gui' or 'pair', not both")
+        try:
+            if end_time == 0:
+                end_time = int(cron.now_utc())
+            if exact is None:
+                exact = DISTINCT_PUBKEYS_EXACT
+            if exact:
+                t = self.table
+                with Session(self.engine) as session:
+                    sides = []
+                    for side_pubkey, side_gui in [
+                        (t.maker_pubkey, t.maker_gui),
+                        (t.taker_pubkey, t.taker_gui),
+                    ]:
+                        q = session.query(side_pubkey.label("pubkey"))
+                        q = q.filter(
+                            t.finished_at >= start_time,
+                            t.finished_at < end_time,
+                            t.is_success == 1,
+                            side_pubkey.notin_(["", "unknown"]),
+                        )
+                        if gui is not None:
+                            q = q.filter(side_gui == gui)
+                        q = self.sqlfilter.pair(q, pair)
+                        sides.append(q)
+                    pubkeys = sides[0].union(sides[1]).subquery()
+                    count = session.query(func.count()).select_from(pubkeys).scalar()
+                return {"unique_pubkeys": count, "exact": True, "error": 0}
+
+            if gui is not None:
+                dimensions = [f"gui:{gui}"]
+            elif pair is not None:
+                pair = deplatform.pair(pair)
+                dimensions = [f"pair:{pair}", f"pair:{invert.pair(pair)}"]
+            else:
+                dimensions = ["all"]
+            t = self.sketch_table
+            hll = HyperLogLog()
+            with Session(self.engine) as session:
+                q = session.query(t.sketch).filter(
+                    t.day >= start_time // 86400 * 86400,
+                    t.day < end_time,
+                    t.dimension.in_(dimensions),
+                )
+                for (sketch,) in q.all():
+                    hll.merge(HyperLogLog.deserialize(sketch))
+            return {"unique_pubkeys": hll.count(), "exact": False, "error": hll.error}
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    @timed
+    def pair_candles(
+        self,
+        pair_str: str,
+        interval: str = "1h",
+        start_time: int = 0,
+        end_time: int = 0,
+    ):
+        """
+        OHLCV candles for a pair from the candle store, oldest first. For
+        a depair (e.g. `KMD_LTC`) the candles of all its variants are
+        merged, for a variant (e.g. `KMD_LTC-segwit`) only its own are
+        returned. Inverted pairs are inverted. Defaults to the last 1000
+        intervals, and only intervals with trades are returned.
+        """
+        start_time, end_time = validate.candles_request(interval, start_time, end_time)
+        seconds = CANDLE_INTERVALS[interval]
+        try:
+            c = self.candle_table
+            col = c.pair if deplatform.pair(pair_str) != pair_str else c.pair_std
+            candles = {}
+            with Session(self.engine) as session:
+                q = session.query(c).filter(
+                    col.in_([pair_str, invert.pair(pair_str)]),
+                    c.interval == interval,
+                    c.start >= start_time // seconds * seconds,
+                    c.start < end_time,
+                )
+                for r in q.order_by(c.start).all():
+                    candle = {k: getattr(r, k) for k in CANDLE_FIELDS}
+                    if getattr(r, col.key) != pair_str:
+                        candle = invert.candle(candle)
+                    if r.start in candles:
+                        merge.candles(candles[r.start], candle)
+                    else:
+                        candles[r.start] = candle
+            resp = [clean.decimal_dicts(i) for i in candles.values()]
+            return {
+                "pair": pair_str,
+                "interval": interval,
+                "start_time": start_time,
+                "end_time": end_time,
+                "candles": resp,
+            }
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
+    @timed
+    def monthly_stats_cube(
+        self,
+        start_time: int,
+        end_time: int,
+        pubkey: str | None = None,
+        gui: str | None = None,
+    ):
+        """
+        Aggregates swaps finished between two timestamps by pair_std,
+        and by pubkey/gui for each side of a swap, for the monthly stats
+        store. Pubkey and gui side totals are grouped in SQL, so only the
+        distinct pubkey/gui combinations are returned instead of every
+        swap.
+        """
+        try:
+            t = self.table
+            filters = [t.finished_at >= start_time, t.finished_at < end_time]
+            if pubkey is not None:
+                filters.append(or_(t.maker_pubkey == pubkey, t.taker_pubkey == pubkey))
+            if gui is not None:
+                filters.append(or_(t.maker_gui == gui, t.taker_gui == gui))
+            volume = func.sum(t.maker_amount + t.taker_amount)
+            cube = {"swaps": 0, "pairs": {}, "pubkeys": {}, "guis": {}}
+            with Session(self.engine) as session:
+                q = session.query(t.pair_std, func.count(), volume)
+                q = q.filter(*filters).group_by(t.pair_std)
+                for pair_std, swap_count, vol in q.all():
+                    cube["swaps"] += swap_count
+                    cube["pairs"][pair_std] = {
+                        "swap_count": swap_count,
+                        "volume": float(vol or 0),
+                    }
+                sides = []
+                for side_pubkey, side_gui in [
+                    (t.maker_pubkey, t.maker_gui),
+                    (t.taker_pubkey, t.taker_gui),
+                ]:
+                    q = session.query(side_pubkey, side_gui, func.count(), volume)
+                    q = q.filter(*filters).group_by(side_pubkey, side_gui)
+                    sides += q.all()
+            pubkey_guis = {}
+            gui_pubkeys = {}
+            for side_pubkey, side_gui, swap_count, vol in sides:
+                if side_pubkey not in [None, "unknown"]:
+                    if side_pubkey not in cube["pubkeys"]:
+                        cube["pubkeys"][side_pubkey] = {"swap_count": 0, "volume": 0}
+                        pubkey_guis[side_pubkey] = set()
+                    cube["pubkeys"][side_pubkey]["swap_count"] += swap_count
+                    cube["pubkeys"][side_pubkey]["volume"] += float(vol or 0)
+                    if side_gui not in [None, "unknown"]:
+                        pubkey_guis[side_pubkey].add(side_gui)
+                if side_gui not in [None, "unknown"]:
+                    if side_gui not in cube["guis"]:
+                        cube["guis"][side_gui] = {"swap_count": 0}
+                        gui_pubkeys[side_gui] = set()
+                    cube["guis"][side_gui]["swap_count"] += swap_count
+                    if side_pubkey is not None:
+                        gui_pubkeys[side_gui].add(side_pubkey)
+            for i in cube["pubkeys"]:
+                cube["pubkeys"][i]["gui_count"] = len(pubkey_guis[i])
+            for i in cube["guis"]:
+                cube["guis"][i]["pubkey_count"] = len(gui_pubkeys[i])
+            msg = f"monthly_stats_cube for {start_time} - {end_time} complete"
+            return default.result(data=cube, msg=msg, loglevel="query", ignore_until=5)
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+
     @timed
     def swap_counts(self):  # pragma: no cover
         month_ago = int(cron.now_utc()) - 86400 * 30
@@ -1379,16 +2050,19 @@ class SqlSource:
         pgdb_query: SqlQuery,
         start_time=0,
         end_time=0,
+        cipi_swaps=None,
     ):
         try:
             if start_time == 0:
                 start_time = int(cron.now_utc() - 86400)
             if end_time == 0:
                 end_time = int(cron.now_utc())
-            # import Cipi's swap data
-            ext_mysql = SqlQuery(db_type="mysql", gecko_source=self.gecko_source)
-            cipi_swaps = ext_mysql.get_swaps(start_time=start_time, end_time=end_time)
+            if cipi_swaps is None:
+                # import Cipi's swap data
+                ext_mysql = SqlQuery(db_type="mysql", gecko_source=self.gecko_source)
+                cipi_swaps = ext_mysql.get_swaps(start_time=start_time, end_time=end_time)
             cipi_swaps = self.normalise_swap_data(cipi_swaps)
+            uuids = [i["uuid"] for i in cipi_swaps]
             if len(cipi_swaps) > 0:
                 with Session(pgdb.engine) as session:
                     # check_column_types(session, DefiSwap)
@@ -1404,13 +2078,19 @@ class SqlSource:
                     )
 
                     updates = []
+                    unchanged = 0
                     for each in overlapping_swaps:
-                        # logger.info(each.__dict__)
-                        
                         # Get dict row for existing swaps
+                        existing = dict(each.__dict__)
                         cipi_data = self.cipi_to_defi_swap(
-                            cipi_swaps_data[each.uuid], each.__dict__
+                            cipi_swaps_data.pop(each.uuid), dict(existing)
                         ).__dict__
+                        cipi_data = validate.ensure_valid_pair(
+                            cipi_data, gecko_source=self.gecko_source
+                        )
+                        if not self.swap_changed(cipi_data, existing):
+                            unchanged += 1
+                            continue
                         # create bindparam
                         cipi_data.update({"_id": each.id})
                         # remove id field to avoid contraint errors
@@ -1420,19 +2100,13 @@ class SqlSource:
                             del cipi_data["id"]
                         # all to bulk update list
                         updates.append(cipi_data)
-                        # remove from processing queue
-                        cipi_swaps_data.pop(each.uuid)
-                        # logger.calc(cipi_data)
 
                     valid_updates = [d for d in updates if "_id" in d and d["_id"]]
                     invalid_updates = [d for d in updates if "_id" not in d or not d["_id"]]
- 
 
+                    if len(invalid_updates) > 0:
+                        logger.warning(f"{len(invalid_updates)} cipi updates missing primary key")
                     if len(valid_updates) > 0:
-                        for d in valid_updates:
-                            if "_id" not in d or not d["_id"]:
-                                logger.warning("Missing primary key in update data:", d)
-                            d = validate.ensure_valid_pair(d, gecko_source=self.gecko_source)
                         # Update existing records
                         bind_values = {
                             i: bindparam(i)
@@ -1458,14 +2132,20 @@ class SqlSource:
                         if uuid not in valid_updates:
                             session.add(swap)
                     session.commit()
+                    t = pgdb.table
+                    imported = session.query(t).filter(t.uuid.in_(uuids))
+                    imported = [dict(i.__dict__) for i in imported.all()]
+                    pgdb.update_pubkey_sketches(imported)
+                    pgdb.update_pair_candles(imported)
                     count_after = pgdb_query.get_count(start_time=1)
                     msg = f"{count_after - count} records added, "
-                    msg += f"{len(valid_updates)} updated from Cipi database"
+                    msg += f"{len(valid_updates)} updated, {unchanged} unchanged"
+                    msg += " from Cipi database"
             else:
                 msg = "Zero Cipi swaps returned!"
 
         except Exception as e:  # pragma: no cover
-            return default.result(msg=e, loglevel="warning")
+            return default.error(e, loglevel="warning")
         return default.result(msg=msg, loglevel="sourced")
 
     @timed
@@ -1475,16 +2155,19 @@ class SqlSource:
         pgdb_query: SqlQuery,
         start_time=int(cron.now_utc() - 86400),
         end_time=int(cron.now_utc()),
+        mm2_swaps=None,
     ):
         try:
-            # Import in Sqlite (all) database
-            mm2_sqlite = SqlQuery(
-                db_type="sqlite",
-                db_path=MM2_DB_PATH_ALL,
-                gecko_source=self.gecko_source,
-            )
-            mm2_swaps = mm2_sqlite.get_swaps(start_time=start_time, end_time=end_time)
+            if mm2_swaps is None:
+                # Import in Sqlite (all) database
+                mm2_sqlite = SqlQuery(
+                    db_type="sqlite",
+                    db_path=MM2_DB_PATH_ALL,
+                    gecko_source=self.gecko_source,
+                )
+                mm2_swaps = mm2_sqlite.get_swaps(start_time=start_time, end_time=end_time)
             mm2_swaps = self.normalise_swap_data(mm2_swaps)
+            uuids = [i["uuid"] for i in mm2_swaps]
             if len(mm2_swaps) > 0:
                 with Session(pgdb.engine) as session:
                     count = pgdb_query.get_count(start_time=1)
@@ -1499,12 +2182,20 @@ class SqlSource:
                     )
 
                     updates = []
+                    unchanged = 0
                     overlapping_uuids = {each.uuid for each in overlapping_swaps}
                     for each in overlapping_swaps:
                         # Get dict row for existing swaps
+                        existing = dict(each.__dict__)
                         mm2_data = self.mm2_to_defi_swap(
-                            mm2_swaps_data[each.uuid], each.__dict__
+                            mm2_swaps_data.pop(each.uuid), dict(existing)
                         ).__dict__
+                        mm2_data = validate.ensure_valid_pair(
+                            mm2_data, gecko_source=self.gecko_source
+                        )
+                        if not self.swap_changed(mm2_data, existing):
+                            unchanged += 1
+                            continue
                         # create bindparam
                         mm2_data.update({"_id": each.id})
                         # remove id field to avoid contraint errors
@@ -1514,14 +2205,8 @@ class SqlSource:
                             del mm2_data["_sa_instance_state"]
                         # all to bulk update list
                         updates.append(mm2_data)
-                        # remove from processing queue
-                        mm2_swaps_data.pop(each.uuid)
 
                     if len(updates) > 0:
-                        for d in updates:
-                            if "_id" not in d or not d["_id"]:
-                                logger.warning("Missing primary key in update data:", d)
-                            d = validate.ensure_valid_pair(d, gecko_source=self.gecko_source)
                         # Update existing records
                         bind_values = {
                             i: bindparam(i)
@@ -1546,13 +2231,18 @@ class SqlSource:
                         if uuid not in overlapping_uuids:
                             session.add(swap)
                     session.commit()
+                    t = pgdb.table
+                    imported = session.query(t).filter(t.uuid.in_(uuids))
+                    imported = [dict(i.__dict__) for i in imported.all()]
+                    pgdb.update_pubkey_sketches(imported)
+                    pgdb.update_pair_candles(imported)
                     count_after = pgdb_query.get_count(start_time=1)
                     msg = f"{count_after - count} records added, "
-                    msg += f"{len(updates)} updated from MM2.db"
+                    msg += f"{len(updates)} updated, {unchanged} unchanged from MM2.db"
             else:
                 msg = "Zero MM2 swaps returned!"
         except Exception as e:  # pragma: no cover
-            return default.result(msg=e, loglevel="warning")
+            return default.error(e, loglevel="warning")
         return default.result(msg=msg, loglevel="sourced")
 
         
@@ -1944,6 +2634,66 @@ class SqlSource:
         msg = "mm2 to defi conversion complete"
         return default.result(msg=msg, data=data, loglevel="muted")
 
+    @timed
+    def populate_pgsqldb_incremental(self):
+        """
+        Imports only source rows added since the last run, tracked by a
+        row id high-water mark per source. Rows updated in place are left
+        for the lower frequency `import_swaps_for_day` reconcile.
+        """
+        try:
+            pgdb = SqlUpdate(db_type="pgsql")
+            pgdb_query = SqlQuery(db_type="pgsql", gecko_source=self.gecko_source)
+            hwm = memcache.get_swap_ingest_hwm()
+            if hwm is None:
+                hwm = {}
+            start_time = int(datetime.combine(date.today(), dt_time()).timestamp())
+            end_time = int(cron.now_utc())
+            sources = {
+                "cipi": SqlQuery(db_type="mysql", gecko_source=self.gecko_source),
+                "mm2": SqlQuery(
+                    db_type="sqlite",
+                    db_path=MM2_DB_PATH_ALL,
+                    gecko_source=self.gecko_source,
+                ),
+            }
+            msg = []
+            for source, query in sources.items():
+                if source in hwm:
+                    swaps = query.get_swaps_after_id(last_id=hwm[source])
+                else:
+                    # No mark yet, so start from today's swaps
+                    swaps = query.get_swaps(start_time=start_time, end_time=end_time)
+                if not isinstance(swaps, list):
+                    continue
+                if len(swaps) > 0:
+                    if source == "cipi":
+                        r = self.import_cipi_swaps(
+                            pgdb=pgdb, pgdb_query=pgdb_query, cipi_swaps=swaps
+                        )
+                    else:
+                        r = self.import_mm2_swaps(
+                            pgdb=pgdb, pgdb_query=pgdb_query, mm2_swaps=swaps
+                        )
+                    if r["result"] == "error":
+                        # The mark stays put, so these swaps are retried
+                        msg.append(f"{source} import failed: {r['message']}")
+                        continue
+                    hwm[source] = max([i["id"] for i in swaps] + [hwm.get(source, 0)])
+                    memcache.set_swap_ingest_hwm(hwm)
+                msg.append(f"{len(swaps)} new {source} swaps")
+        except Exception as e:  # pragma: no cover
+            return default.result(msg=e, loglevel="warning")
+        return default.result(msg=", ".join(msg), loglevel="merge", ignore_until=0)
+
+    def swap_changed(self, new, existing):
+        """Returns True if a merged swap differs from the existing row"""
+        ignore = ["_sa_instance_state", "_id", "id", "last_updated"]
+        for k, v in new.items():
+            if k not in ignore and existing.get(k) != v:
+                return True
+        return False
+
     @timed
     def import_swaps_for_day(self, day):
         msg = f"Importing swaps from {day.strftime('%Y-%m-%d')} {day}"
@@ -2010,8 +2760,6 @@ if __name__ == "__main__":
 # version pubkeys
 # gui pubkeys
 
-# swap durations per pair
-
 # fails: find patterns
 # - same coin? [maker/taker]
 # - same pair? [maker/taker]
@@ -79,9 +79,8 @@ class SqliteQuery:  # pragma: no cover
     @timed
     def get_swap(self, uuid):
         try:
-            sql = "SELECT * FROM stats_swaps WHERE"
-            sql += f" uuid='{uuid}';"
-            self.db.sql_cursor.execute(sql)
+            sql = "SELECT * FROM stats_swaps WHERE uuid = ?;"
+            self.db.sql_cursor.execute(sql, (uuid,))
             data = self.db.sql_cursor.fetchall()
             data = [dict(row) for row in data]
             if len(data) == 0:
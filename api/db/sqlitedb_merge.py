@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import os
+import time
 from decimal import Decimal
+from os.path import basename
 
 import sqlite3
 from typing import List
@@ -11,15 +13,11 @@ from const import (
     LOCAL_MM2_DB_BACKUP_8762,
     MM2_DB_PATHS,
     DB_SOURCE_PATH,
-    DB_CLEAN_PATH,
     DB_MASTER_PATH,
     compare_fields,
 )
-from db.sqlitedb import (
-    get_sqlite_db,
-    SqliteDB,
-)
-from util.cron import cron
+from db.backup_db import export_swaps
+from db.sqlitedb import get_sqlite_db
 from util.enums import NetId
 from util.logger import logger, timed
 import util.defaults as default
@@ -33,39 +31,38 @@ class SqliteMerge:
 
     @timed
     def import_source_databases(self):  # pragma: no cover
-        self.backup_local_dbs()
-        self.clean_source_dbs()
-        self.compare_dbs()
-        self.update_temp_dbs()
-        self.get_db_row_counts(temp=True)
-        self.update_master_dbs()
-        self.get_db_row_counts()
-        msg = "Souce database import completed!"
+        stats = {}
+        self.run_stage(stats, "backup", self.backup_local_dbs)
+        source_dbs = [
+            f"{DB_SOURCE_PATH}/{fn}"
+            for fn in list_sqlite_dbs(DB_SOURCE_PATH)
+            if validate.is_source_db(fn)
+        ]
+        self.run_stage(stats, "denullify", self.denullify_source_dbs, source_dbs)
+        self.run_stage(stats, "compare", self.compare_dbs, source_dbs)
+        self.run_stage(stats, "merge", self.update_master_dbs, source_dbs)
+        self.run_stage(stats, "row_counts", self.get_db_row_counts)
+        msg = "Source database import completed! "
+        msg += " | ".join(
+            [f"{k}: {v['rows']} rows in {v['duration']}s" for k, v in stats.items()]
+        )
         return default.result(msg=msg, loglevel="merge", ignore_until=10)
 
-    def clean_source_dbs(self):  # pragma: no cover
-        # Denullify source databases, move to 'clean' folder
+    def run_stage(self, stats, stage, func, *args):  # pragma: no cover
+        start = time.perf_counter()
+        rows = func(*args)
+        stats[stage] = {
+            "rows": rows if isinstance(rows, int) else 0,
+            "duration": round(time.perf_counter() - start, 3),
+        }
+
+    @timed
+    def denullify_source_dbs(self, source_dbs: List[str]):  # pragma: no cover
         try:
-            source_dbs = list_sqlite_dbs(DB_SOURCE_PATH)
-            for fn in source_dbs:
-                if validate.is_source_db(fn):
-                    src_db_path = f"{DB_SOURCE_PATH}/{fn}"
-                    src_db = get_sqlite_db(db_path=src_db_path)
-                    src_db.update.denullify_stats_swaps()
-
-                    dest_db_path = f"{DB_CLEAN_PATH}/{fn}"
-                    dest_db = get_sqlite_db(db_path=dest_db_path)
-                    dest_db.update.create_swap_stats_table()
-                    self.merge_db_tables(
-                        src_db=src_db,
-                        dest_db=dest_db,
-                        table="stats_swaps",
-                        column="uuid",
-                        since=0,
-                    )
-
-                    for i in [src_db, dest_db]:
-                        i.close()
+            for db_path in source_dbs:
+                src_db = get_sqlite_db(db_path=db_path)
+                src_db.update.denullify_stats_swaps()
+                src_db.close()
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
         msg = f"{len(source_dbs)} source databases cleaned."
@@ -81,198 +78,74 @@ class SqliteMerge:
         db_all = get_sqlite_db(db_path=path)
 
         db_8762.update.remove_overlaps(db_7777)
-        rows = db_7777.query.get_row_count("stats_swaps")
-        msg_7777 = f"7777: {rows}"
-        rows = db_8762.query.get_row_count("stats_swaps")
-        msg_8762 = f"8762: {rows}"
-        rows = db_all.query.get_row_count("stats_swaps")
-        msg_ALL = f"ALL: {rows}"
+        rows_7777 = db_7777.query.get_row_count("stats_swaps")
+        msg_7777 = f"7777: {rows_7777}"
+        rows_8762 = db_8762.query.get_row_count("stats_swaps")
+        msg_8762 = f"8762: {rows_8762}"
+        rows_all = db_all.query.get_row_count("stats_swaps")
+        msg_ALL = f"ALL: {rows_all}"
         msg = f"Master DB rows: [{msg_7777}] [{msg_8762}] [{msg_ALL}]"
 
         for i in [db_all, db_8762, db_7777]:
             i.close()
         if temp:
             msg = f"Temp DB rows: [{msg_7777}] [{msg_8762}] [{msg_ALL}]"
-        return default.result(msg=msg, loglevel="merge")
-
-    @timed
-    def update_master_dbs(self):  # pragma: no cover
-        # Merge temp databases into master
-        try:
-            for i in NetId:
-                i = i.value
-                src_db = get_sqlite_db(db_path=MM2_DB_PATHS[f"temp_{i}"])
-                dest_db = get_sqlite_db(db_path=MM2_DB_PATHS[f"{i}"])
-                self.merge_db_tables(
-                    src_db=src_db,
-                    dest_db=dest_db,
-                    table="stats_swaps",
-                    column="uuid",
-                    since=0,
-                )
-                for i in [src_db, dest_db]:
-                    i.close()
-        except Exception as e:  # pragma: no cover
-            return default.result(msg=e, loglevel="warning")
-        msg = "Merge of source data into master databases complete!"
-        return default.result(msg=msg, loglevel="merge")
+        return default.result(data=rows_all, msg=msg, loglevel="merge")
 
     @timed
-    def update_temp_dbs(self):  # pragma: no cover
-        # Merge clean source databases into temp
+    def update_master_dbs(self, source_dbs: List[str]):  # pragma: no cover
+        # Merge source databases straight into master, one transaction
+        # each
         try:
-            source_dbs = list_sqlite_dbs(DB_CLEAN_PATH)
-            for fn in source_dbs:
-                if not fn.startswith("temp"):
-                    if validate.is_source_db(fn):
-                        src_db_path = f"{DB_CLEAN_PATH}/{fn}"
-                        src_db = get_sqlite_db(db_path=src_db_path)
-                        netid = helper.get_netid(fn)
-                        dest_db_path = f"{DB_CLEAN_PATH}/temp_MM2_{netid}.db"
-                        dest_db = get_sqlite_db(db_path=dest_db_path)
-                        self.merge_db_tables(
-                            src_db=src_db,
-                            dest_db=dest_db,
-                            table="stats_swaps",
-                            column="uuid",
-                            since=0,
-                        )
-                        for i in [src_db, dest_db]:
-                            i.close()
-
-            # Merge both netids into 'ALL'
-
+            rows = 0
             for i in NetId:
                 i = i.value
-                if i != "ALL":
-                    dest_db = get_sqlite_db(db_path=f"{DB_CLEAN_PATH}/temp_MM2_ALL.db")
-                    src_db = get_sqlite_db(db_path=f"{DB_CLEAN_PATH}/temp_MM2_{i}.db")
-                    self.merge_db_tables(
-                        src_db=src_db,
-                        dest_db=dest_db,
-                        table="stats_swaps",
-                        column="uuid",
-                        since=0,
-                    )
-                    src_db.close()
-                    dest_db.close()
+                src_paths = [
+                    db_path
+                    for db_path in source_dbs
+                    if i == "ALL" or helper.get_netid(basename(db_path)) == i
+                ]
+                rows += merge_source_dbs(MM2_DB_PATHS[i], src_paths)
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
-        msg = "Merge of source data into temp master databases complete!"
-        return default.result(msg=msg, loglevel="merge")
+        msg = f"Merge of source data into master databases complete! {rows} rows added"
+        return default.result(data=rows, msg=msg, loglevel="merge")
 
     @timed
-    def merge_db_tables(
-        self, src_db, dest_db, table, column, since=None
-    ):  # pragma: no cover
-        if since is None:
-            since = int(cron.now_utc()) - 86400 * 7
-        sql = ""
+    def compare_dbs(self, db_paths: List[str]):  # pragma: no cover
+        # Reconcile success/fail mismatches across source DBs
         try:
-            src_columns = src_db.query.get_table_columns(table)
-            src_columns.pop(src_columns.index("id"))
-            sql = f"ATTACH DATABASE '{src_db.db_path}' AS src_db;"
-            sql += f" INSERT INTO {table} ({','.join(src_columns)})"
-            sql += f" SELECT {','.join(src_columns)}"
-            sql += f" FROM src_db.{table}"
-            sql += " WHERE NOT EXISTS ("
-            sql += f"SELECT * FROM {table}"
-            sql += f" WHERE {table}.{column} = src_db.{table}.{column})"
-            sql += f" AND src_db.{table}.finished_at > {since};"
-            sql += " DETACH DATABASE 'src_db';"
-            dest_db.sql_cursor.executescript(sql)
-        except sqlite3.OperationalError as e:
-            msg = f"OpErr {src_db.db_path} ==> {dest_db.db_path}"
-            return default.error(e, msg=msg)
-        except Exception as e:  # pragma: no cover
-            msg = f"{type(e)} {src_db.db_path} ==> {dest_db.db_path} {e}"
-            return default.error(e, msg=msg)
-        msg = f"Importing {src_db.db_path} ==> {dest_db.db_path} complete"
-        return default.result(msg=msg, loglevel="updated", ignore_until=10)
-
-    @timed
-    def compare_dbs(self):  # pragma: no cover
-        # Compare clean DBs to repair mismatches
-        try:
-            comparisons = 0
-            clean_dbs = list_sqlite_dbs(DB_CLEAN_PATH)
-            for fna in clean_dbs:
-                for fnb in clean_dbs:
-                    if fna != fnb:
-                        db1 = get_sqlite_db(db_path=f"{DB_CLEAN_PATH}/{fna}")
-                        db2 = get_sqlite_db(db_path=f"{DB_CLEAN_PATH}/{fnb}")
-                        uuids = self.get_mismatched_uuids(db1, db2)
-                        self.repair_swaps(uuids, db1, db2)
-                        comparisons += 1
-                        db1.close()
-                        db2.close()
+            conn = get_swap_conflicts(db_paths)
+            conflicts = conn.execute("SELECT COUNT(*) FROM swap_conflicts").fetchone()[0]
+            repaired = 0
+            if conflicts > 0:
+                for db_path in db_paths:
+                    repaired += repair_swap_conflicts(conn, db_path)
+            conn.close()
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
-        msg = f"Comparison of {len(clean_dbs)} databases in {comparisons} combinations complete!"
-        return default.result(msg=msg, loglevel="merge", ignore_until=10)
+        msg = f"Comparison of {len(db_paths)} databases complete!"
+        msg += f" {conflicts} mismatched swaps, {repaired} rows repaired."
+        return default.result(data=repaired, msg=msg, loglevel="merge", ignore_until=10)
 
     @timed
-    def backup_local_dbs(self):  # pragma: no cover
+    def backup_local_dbs(self, full: bool = False):  # pragma: no cover
         # Backup the local active mm2 instance DBs
         try:
-            self.backup_db(
-                src_db_path=LOCAL_MM2_DB_PATH_7777,
-                dest_db_path=LOCAL_MM2_DB_BACKUP_7777,
-            )
-            self.backup_db(
-                src_db_path=LOCAL_MM2_DB_PATH_8762,
-                dest_db_path=LOCAL_MM2_DB_BACKUP_8762,
-            )
+            rows = 0
+            for src_db_path, dest_db_path in [
+                (LOCAL_MM2_DB_PATH_7777, LOCAL_MM2_DB_BACKUP_7777),
+                (LOCAL_MM2_DB_PATH_8762, LOCAL_MM2_DB_BACKUP_8762),
+            ]:
+                r = self.backup_db(
+                    src_db_path=src_db_path, dest_db_path=dest_db_path, full=full
+                )
+                if isinstance(r, int):
+                    rows += r
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
         msg = "Merge of local source data into backup databases complete!"
-        return default.result(msg=msg, loglevel="merge")
-
-    # @timed
-    def get_mismatched_uuids(self, db1: SqliteDB, db2: SqliteDB):  # pragma: no cover
-        try:
-            uuids_a = db1.query.get_uuids(success_only=True)
-            uuids_b = db2.query.get_uuids(fail_only=True)
-            mismatch_uuids = list(set(uuids_a).intersection(set(uuids_b)))
-            return list(set(mismatch_uuids))
-        except sqlite3.OperationalError as e:
-            logger.error(e)
-        except Exception as e:  # pragma: no cover
-            logger.error(e)
-
-    @timed
-    def repair_swaps(
-        self, uuids: List, db1: SqliteDB, db2: SqliteDB
-    ) -> None:  # pragma: no cover
-        try:
-            db_list = [db1, db2]
-            loglevel = "merged"
-            if len(uuids) == 0:
-                msg = "UUID list is empty, no swaps to repair!"
-                loglevel = "muted"
-            else:
-                uuids.sort()
-                for uuid in list(uuids):
-                    swaps = []
-                    for db in db_list:
-                        swap_info = db.query.get_swap(uuid)
-                        if "error" in swap_info:
-                            continue
-                        swaps.append(swap_info)
-                    for swap1 in swaps:
-                        for swap2 in swaps:
-                            fixed = compare_uuid_fields(swap1, swap2)
-                            if (
-                                len(set(compare_fields).intersection(set(fixed.keys())))
-                                > 0
-                            ):
-                                db1.update.update_stats_swap_row(uuid, fixed)
-                                db2.update.update_stats_swap_row(uuid, fixed)
-                                logger.updated(f"{uuid} repaired")
-        except Exception as e:  # pragma: no cover
-            return default.result(msg=e, loglevel="warning")
-        msg = f"{len(uuids)} repaired in {db1.db_file},  {db2.db_file}"
-        return default.result(msg=msg, loglevel=loglevel)
+        return default.result(data=rows, msg=msg, loglevel="merge")
 
     @timed
     def init_dbs(self):  # pragma: no cover
@@ -315,18 +188,23 @@ class SqliteMerge:
 
     @timed
     def backup_db(
-        self, src_db_path: str, dest_db_path: str
+        self, src_db_path: str, dest_db_path: str, full: bool = False
     ) -> None:  # pragma: no cover
         try:
-            src = get_sqlite_db(db_path=src_db_path)
-            dest = get_sqlite_db(db_path=dest_db_path)
-            src.conn.backup(dest.conn, pages=1, progress=self.progress)
-            src.close()
-            dest.close()
+            if full:
+                src = get_sqlite_db(db_path=src_db_path)
+                dest = get_sqlite_db(db_path=dest_db_path)
+                src.conn.backup(dest.conn, pages=1, progress=self.progress)
+                src.close()
+                dest.close()
+                rows = None
+            else:
+                # Only swaps added or changed since the last backup
+                rows = export_swaps(src_db_path, dest_db_path)
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
-        msg = f"Backup of {src.db_path} complete..."
-        return default.result(msg=msg, loglevel="muted")
+        msg = f"Backup of {src_db_path} complete..."
+        return default.result(data=rows, msg=msg, loglevel="muted")
 
     def progress(status, remaining, total, show=False):  # pragma: no cover
         if show:
@@ -390,6 +268,144 @@ def compare_uuid_fields(swap1, swap2):
         return default.result(msg=e, loglevel="warning")
 
 
+# Applied to master databases while merging. With WAL, synchronous=NORMAL
+# only syncs on checkpoint, and a 64MB page cache keeps the uuid index
+# hot.
+MERGE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-65536;",
+]
+# SQLite allows 10 attached databases by default
+MERGE_ATTACH_LIMIT = 8
+
+
+def merge_source_dbs(dest_path: str, src_paths: List[str], since: int = 0) -> int:
+    """
+    Inserts swaps from the source databases into the destination, using
+    the unique uuid index to skip swaps it already has. Sources are all
+    attached first, so the inserts run in a single transaction. Returns
+    the number of rows added.
+    """
+    conn = sqlite3.connect(dest_path, isolation_level=None)
+    for i in MERGE_PRAGMAS:
+        conn.execute(i)
+    dest_columns = [i[1] for i in conn.execute("PRAGMA table_info(stats_swaps);")]
+    rows = 0
+    for n in range(0, len(src_paths), MERGE_ATTACH_LIMIT):
+        batch = src_paths[n: n + MERGE_ATTACH_LIMIT]
+        for i, src_path in enumerate(batch):
+            conn.execute(f"ATTACH DATABASE ? AS src_{i};", (src_path,))
+        try:
+            conn.execute("BEGIN;")
+            for i, src_path in enumerate(batch):
+                columns = [
+                    j[1]
+                    for j in conn.execute(f"PRAGMA src_{i}.table_info(stats_swaps);")
+                    if j[1] != "id" and j[1] in dest_columns
+                ]
+                if len(columns) == 0:
+                    logger.warning(f"No stats_swaps table in {src_path}")
+                    continue
+                sql = f"INSERT OR IGNORE INTO main.stats_swaps ({','.join(columns)})"
+                sql += f" SELECT {','.join(columns)} FROM src_{i}.stats_swaps"
+                sql += " WHERE finished_at > ?;"
+                rows += conn.execute(sql, (since,)).rowcount
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+        finally:
+            for i in range(len(batch)):
+                conn.execute(f"DETACH DATABASE src_{i};")
+    conn.close()
+    return rows
+
+
+def get_swap_conflicts(db_paths: List[str]) -> sqlite3.Connection:
+    """
+    Aggregates `compare_fields` for every uuid across the databases, one
+    ATTACH per database, and returns a connection to a temporary db where
+    the `swap_conflicts` table holds the "max value wins" row for each
+    uuid which is successful in one database and failed in another.
+    """
+    # An empty path is a private temp db which can spill to disk
+    conn = sqlite3.connect("")
+    conn.execute(
+        """
+        CREATE TABLE swap_conflicts (
+            uuid VARCHAR(255) NOT NULL PRIMARY KEY,
+            min_success INTEGER,
+            is_success INTEGER,
+            started_at INTEGER,
+            finished_at INTEGER,
+            maker_coin_usd_price DECIMAL,
+            taker_coin_usd_price DECIMAL
+        );
+        """
+    )
+    for db_path in db_paths:
+        conn.execute("ATTACH DATABASE ? AS src_db;", (db_path,))
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO swap_conflicts
+                    SELECT uuid, is_success, is_success, started_at, finished_at,
+                        maker_coin_usd_price, taker_coin_usd_price
+                    FROM src_db.stats_swaps WHERE true
+                    ON CONFLICT(uuid) DO UPDATE SET
+                        min_success = MIN(min_success, excluded.min_success),
+                        is_success = MAX(is_success, excluded.is_success),
+                        started_at = MAX(started_at, excluded.started_at),
+                        finished_at = MAX(finished_at, excluded.finished_at),
+                        maker_coin_usd_price = MAX(
+                            maker_coin_usd_price, excluded.maker_coin_usd_price
+                        ),
+                        taker_coin_usd_price = MAX(
+                            taker_coin_usd_price, excluded.taker_coin_usd_price
+                        );
+                    """
+                )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Skipping {db_path} in swap comparison: {e}")
+        finally:
+            conn.execute("DETACH DATABASE src_db;")
+    with conn:
+        conn.execute("DELETE FROM swap_conflicts WHERE min_success = is_success;")
+    return conn
+
+
+def repair_swap_conflicts(conn: sqlite3.Connection, db_path: str) -> int:
+    """
+    Applies the rows in `swap_conflicts` to a database in one
+    transaction, returning the number of rows changed.
+    """
+    sql = "UPDATE dest_db.stats_swaps SET "
+    sql += ", ".join(
+        [
+            f"{i} = (SELECT c.{i} FROM swap_conflicts c"
+            f" WHERE c.uuid = stats_swaps.uuid)"
+            for i in compare_fields
+        ]
+    )
+    # Only rows with a value to fix
+    sql += " WHERE EXISTS (SELECT 1 FROM swap_conflicts c"
+    sql += " WHERE c.uuid = stats_swaps.uuid AND ("
+    sql += " OR ".join([f"c.{i} IS NOT stats_swaps.{i}" for i in compare_fields])
+    sql += "));"
+    repaired = 0
+    conn.execute("ATTACH DATABASE ? AS dest_db;", (db_path,))
+    try:
+        with conn:
+            repaired = conn.execute(sql).rowcount
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Failed to repair swaps in {db_path}: {e}")
+    finally:
+        conn.execute("DETACH DATABASE dest_db;")
+    return repaired
+
+
 def list_sqlite_dbs(folder):
     db_list = [i for i in os.listdir(folder) if i.endswith(".db")]
     db_list.sort()
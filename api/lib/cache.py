@@ -2,6 +2,10 @@
 import os
 import time
 from datetime import datetime 
+from typing import List
+from fastapi import Response
+from const import DURATION_STATS_DAYS, TRUSTED_CACHE_RESPONSES
+import db.sqldb as db
 from lib.dex_api import DexAPI
 from util.exceptions import CacheFilenameNotFound, CacheItemNotFound
 from util.files import Files
@@ -15,6 +19,33 @@ import lib.cache_calc as cache_calc
 import lib.external as external
 import lib.cmc as cmc
 from lib.external import gecko_api
+from models.gecko import GeckoTickers
+from models.markets import MarketsSummaryItem
+from models.stats_xyz import StatsXyzSummary
+from util.transform import convert
+import util.transform as transform
+
+
+# Route payloads built from cache items, validated against
+# the route's response_model when saved instead of per request.
+RESPONSE_MODELS = {
+    "markets_summary": List[MarketsSummaryItem],
+    "stats_xyz_summary": List[StatsXyzSummary],
+    "gecko_tickers": GeckoTickers,
+}
+
+# Cache items built only from pgsql swaps and other cache items. Their
+# fingerprint is a summary of swaps in the window (seconds back, or None
+# for all time) plus the saved version of each input cache item.
+FINGERPRINT_INPUTS = {
+    "coin_volumes_24hr": (86400, ["gecko_source"]),
+    "coin_volumes_alltime": (None, ["gecko_source"]),
+    "pair_volumes_24hr": (86400, ["gecko_source"]),
+    "pair_volumes_14d": (86400 * 14, ["gecko_source"]),
+    "pair_volumes_alltime": (None, ["gecko_source"]),
+    "pairs_last_traded": (None, ["gecko_source"]),
+    "swap_durations": (86400 * DURATION_STATS_DAYS, []),
+}
 
 
 class Cache:  # pragma: no cover
@@ -67,6 +98,7 @@ class Cache:  # pragma: no cover
                 "cmc_assets",
                 "cmc_assets_source",
                 "cmc_summary",
+                "swap_durations",
             ]:
                 item = self.get_item(i)
                 since_updated = item.since_updated_min()
@@ -156,6 +188,11 @@ class CacheItem:
         return data
 
     def since_updated_min(self):  # pragma: no cover
+        if self.name in FINGERPRINT_INPUTS:
+            # Skipped rebuilds leave the file as is
+            record = memcache.get_fingerprint(self.name)
+            if record is not None:
+                return int((int(cron.now_utc()) - record["checked_at"]) / 60)
         if self.filename is not None:
             data = self.files.load_jsonfile(self.filename)
             if data is not None:
@@ -188,16 +225,59 @@ class CacheItem:
             "pairs_orderbook_extended": 15,
             "gecko_pairs": 5,
             "tickers": 5,
+            "swap_durations": 15,
         }
         if self.name in expiry_limits:
             return expiry_limits[self.name]
         return 5
 
+    def fingerprint(self):
+        """
+        Returns a cheap summary of this item's inputs, or None
+        if the item is not fingerprinted and is always rebuilt.
+        """
+        if self.name not in FINGERPRINT_INPUTS:
+            return None
+        try:
+            window, inputs = FINGERPRINT_INPUTS[self.name]
+            start_time = 1 if window is None else int(cron.now_utc()) - window
+            pg_query = db.SqlQuery(db_type="pgsql")
+            fingerprint = pg_query.swaps_fingerprint(start_time=start_time)
+            for i in inputs:
+                record = memcache.get_fingerprint(i)
+                fingerprint[i] = None if record is None else record["version"]
+            return fingerprint
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"{type(e)} Error getting fingerprint for {self.name}: {e}")
+            return None
+
+    def skip_unchanged(self, fingerprint):
+        """
+        Returns True if the inputs match the last saved build and the
+        cached value is still in memcache, extending its expiry.
+        """
+        if fingerprint is None:
+            return False
+        record = memcache.get_fingerprint(self.name)
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        if not memcache.touch(self.name, 3600):
+            return False
+        record["skipped"] += 1
+        record["checked_at"] = int(cron.now_utc())
+        memcache.set_fingerprint(self.name, record)
+        return True
+
     # TODO: Cache orderbooks to file? Volumes / prices? Liquidity? Swaps?
     # The reason to do this is to reduce population times on restarts.
     @timed
     def save(self, data=None):  # pragma: no cover
         try:
+            fingerprint = self.fingerprint()
+            if self.skip_unchanged(fingerprint):
+                msg = f"{self.name} inputs unchanged, skipped rebuild"
+                return default.result(msg=msg, loglevel="cached", ignore_until=5)
+            gecko_tickers = None
             # EXTERNAL SOURCE CACHE
             if self.source_url is not None:
                 data = self.files.download_json(self.source_url)
@@ -312,6 +392,7 @@ class CacheItem:
                         refresh=True
                     )
                     memcache.set_tickers(data)
+                    gecko_tickers = self.save_gecko_tickers(data)
 
                 if self.name == "gecko_pairs":
                     data = cache_calc.CacheCalc(
@@ -326,6 +407,12 @@ class CacheItem:
                     ).stats_api_summary(refresh=True)
                     memcache.set_stats_api_summary(data)
 
+                if self.name == "swap_durations":
+                    data = cache_calc.CacheCalc(
+                        coins_config=self.coins_config
+                    ).swap_durations(refresh=True)
+                    memcache.set_swap_durations(data)
+
                 # CMC
                 if self.name == "cmc_summary":
                     data = cache_calc.CMC().summary(refresh=True)
@@ -333,12 +420,22 @@ class CacheItem:
 
             if data is not None:
                 if validate.loop_data(data, self):
+                    self.save_responses(data, gecko_tickers=gecko_tickers)
                     # Save without extra fields for upstream cache
                     if self.name in ["prices_tickers_v2", "fixer_rates", "tickers"]:
                         fn = self.filename.replace(".json", "_cache.json")
                         self.files.save_json(fn, data, indent=0)
                     data = {"last_updated": int(cron.now_utc()), "data": data}
                     r = self.files.save_json(self.filename, data)
+                    memcache.set_fingerprint(
+                        self.name,
+                        {
+                            "fingerprint": fingerprint,
+                            "version": data["last_updated"],
+                            "checked_at": data["last_updated"],
+                            "skipped": 0,
+                        },
+                    )
                     msg = f"Saved {self.filename}"
                     return default.result(
                         data=data,
@@ -358,6 +455,65 @@ class CacheItem:
             msg = f"{self.filename} Failed. {type(e)}: {e}"
             return default.error(e, msg=msg)
 
+    def save_gecko_tickers(self, data):
+        """
+        Standardises and filters the tickers cache for the gecko/tickers
+        route once per refresh, so requests only fetch the result.
+        """
+        try:
+            resp = convert.tickers_to_gecko(data, gecko_source=self.gecko_source)
+            memcache.set_gecko_tickers(resp)
+            return resp
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"{type(e)} Error saving gecko tickers: {e}")
+            return None
+
+    def save_responses(self, data, gecko_tickers=None):
+        """
+        Derives the route payloads for this cache item, and caches
+        them pre-serialized if they match the route's response_model.
+        For tickers, pass the result of save_gecko_tickers.
+        """
+        if not TRUSTED_CACHE_RESPONSES:
+            return
+        try:
+            responses = {}
+            if self.name == "markets_summary":
+                # TODO: remove legacy keys when dashboard updates
+                responses["markets_summary"] = [
+                    {
+                        **i,
+                        "trading_pair": i["pair"],
+                        "price_change_percent_24hr": i["price_change_pct_24hr"],
+                    }
+                    for i in data
+                ]
+            if self.name == "pairs_orderbook_extended":
+                responses["stats_xyz_summary"] = [
+                    transform.ticker_to_xyz_summary(i["ALL"])
+                    for i in data["orderbooks"].values()
+                ]
+            if self.name == "tickers" and gecko_tickers is not None:
+                responses["gecko_tickers"] = gecko_tickers
+            for name, resp in responses.items():
+                resp = validate.response_data(resp, RESPONSE_MODELS[name], name)
+                if resp is not None:
+                    memcache.set_response(name, resp)
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"{type(e)} Error saving responses for {self.name}: {e}")
+
+
+def cached_response(name):
+    """
+    Returns a payload validated in CacheItem.save_responses as a raw
+    JSON response, so FastAPI skips the response_model validation.
+    """
+    if TRUSTED_CACHE_RESPONSES:
+        data = memcache.get_response(name)
+        if data is not None:
+            return Response(content=data, media_type="application/json")
+    return None
+
 
 def reset_cache_files():
     if "IS_TESTING" in os.environ:
@@ -410,13 +566,20 @@ def reset_cache_files():
     memcache.set_adex_alltime(
         CacheItem(name="adex_alltime", coins_config=coins_config).data
     )
-    memcache.set_tickers(CacheItem(name="tickers", coins_config=coins_config).data)
+    tickers = CacheItem(name="tickers", coins_config=coins_config)
+    data = tickers.data
+    memcache.set_tickers(data)
+    if data is not None:
+        tickers.save_gecko_tickers(data)
     memcache.set_markets_summary(
         CacheItem(name="markets_summary", coins_config=coins_config).data
     )
     memcache.set_stats_api_summary(
         CacheItem(name="stats_api_summary", coins_config=coins_config).data
     )
+    memcache.set_swap_durations(
+        CacheItem(name="swap_durations", coins_config=coins_config).data
+    )
     memcache.set_cmc_assets_source(
         CacheItem(name="cmc_assets_source", coins_config=coins_config).data
     )
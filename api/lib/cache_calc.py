@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import time
 from decimal import Decimal
-from lib.coins import Coins
+from lib.coins import get_coins
 from lib.cmc import CmcAPI
+from lib.orderbook_schedule import OrderbookSchedule
 from lib.pair import Pair
 from util.cron import cron
 from util.logger import logger, timed
@@ -22,8 +23,10 @@ import util.defaults as default
 import util.memcache as memcache
 from lib.external import gecko_api
 from const import (
+    DURATION_STATS_DAYS,
     ORDERBOOK_FETCH_BATCH_SIZE,
     ORDERBOOK_FETCH_LOOP_SLEEP,
+    ORDERBOOK_REFRESH_CYCLE,
 )
 
 
@@ -60,7 +63,9 @@ class CacheCalc:
     @property
     def coins_obj(self):
         if self._coins_obj is None:
-            return Coins(coins_config=self.coins_config, gecko_source=self.gecko_source)
+            self._coins_obj = get_coins(
+                coins_config=self.coins_config, gecko_source=self.gecko_source
+            )
         return self._coins_obj
 
     @property
@@ -151,7 +156,7 @@ class CacheCalc:
             data = self.pg_query.pair_last_trade(since=since)
             for i in data:
                 data[i] = clean.decimal_dicts(data[i])
-                data[i].update({"priced": i in self.coins_obj.with_price})
+                data[i].update({"priced": self.coins_obj.pair_is_priced(i)})
             resp = {}
             for variant in data:
                 depair = deplatform.pair(variant)
@@ -237,10 +242,17 @@ class CacheCalc:
                     ignore_until=0,
                 )
 
+            if refresh:
+                # Only the variant caches are refreshed, the combined book
+                # is built from them by the next run without `refresh`
+                return self._refresh_orderbooks(eligible_pairs, volumes_map)
+
             total_pairs = len(eligible_pairs)
+            # Books come from the variant caches the schedule keeps warm
             batch_pairs, pointer_idx = self._select_pair_batch(eligible_pairs)
             logger.loop(
-                f"[orderbook-batch-pointer] start_idx={pointer_idx['start']} next_idx={pointer_idx['next']}"
+                f"[orderbook-batch-pointer] start_idx={pointer_idx['start']} "
+                f"next_idx={pointer_idx['next']}"
             )
             logger.loop(f"[orderbook-batch-detail] pairs={batch_pairs}")
             from lib import dex_api  # local import to avoid circular dependency
@@ -274,9 +286,7 @@ class CacheCalc:
                     coins_config=self.coins_config,
                     gecko_source=self.gecko_source,
                     pair_prices_24hr_cache=self.pair_prices_24hr_cache,
-                ).orderbook(
-                    depair, depth=100, traded_pairs=batch_pairs, refresh=refresh
-                )
+                ).orderbook(depair, depth=100, traded_pairs=batch_pairs)
                 data.append(x)
                 processed += 1
                 if ORDERBOOK_FETCH_LOOP_SLEEP > 0:
@@ -306,6 +316,13 @@ class CacheCalc:
                                 {variant: clean.decimal_dicts(book[variant])}
                             )
                 liquidity_usd += Decimal(book["ALL"]["liquidity_usd"])
+            # Single pair routes read these instead of the combined book.
+            # Books of inactive or no longer traded pairs are dropped.
+            inactive = [i for i in batch_pairs if i not in orderbook_data]
+            live = {i for i in eligible_pairs if i not in inactive}
+            failed = memcache.set_pair_orderbooks(orderbook_data, live=live)
+            if len(failed) > 0:
+                logger.warning(f"Failed to cache {len(failed)} pair orderbooks")
 
             vols_24hr = self.pair_volumes_24hr()
             if vols_24hr is not None:
@@ -341,6 +358,58 @@ class CacheCalc:
             time.sleep(5)
             self._release_batch_lock()
 
+    def _refresh_orderbooks(self, eligible_pairs, volumes_map):
+        """
+        Refreshes the variant orderbook caches of the pairs due, with an
+        orderbook RPC thread per variant. Pairs with a failed RPC aren't
+        marked refreshed, so they stay due for the next cycle.
+        """
+        from lib import dex_api  # local import to avoid circular dependency
+
+        # Orderbook RPC calls go to the pairs due, by activity
+        volumes = {i: self._pair_activity_score(i, volumes_map) for i in eligible_pairs}
+        schedule = OrderbookSchedule()
+        batch_pairs = schedule.select(eligible_pairs, volumes)
+        logger.loop(f"[orderbook-refresh-detail] pairs={batch_pairs}")
+        batch_start = time.perf_counter()
+        threads = {}
+        for depair in batch_pairs:
+            threads[depair] = []
+            for variant in derive.pair_variants(depair):
+                base, quote = derive.base_quote(variant)
+                t = dex_api.get_orderbook(
+                    base=base,
+                    quote=quote,
+                    coins_config=self.coins_config,
+                    gecko_source=self.gecko_source,
+                    variant_cache_name=f"orderbook_{variant}",
+                    refresh=True,
+                    pair_prices_24hr_cache=self.pair_prices_24hr_cache,
+                )
+                # Variants rejected before a request return a template
+                if isinstance(t, dex_api.OrderbookRpcThread):
+                    threads[depair].append(t)
+            if ORDERBOOK_FETCH_LOOP_SLEEP > 0:
+                time.sleep(ORDERBOOK_FETCH_LOOP_SLEEP)
+
+        # Requests still running by the deadline count as failed
+        deadline = time.perf_counter() + ORDERBOOK_REFRESH_CYCLE
+        failed = []
+        for depair, pair_threads in threads.items():
+            for t in pair_threads:
+                t.join(max(deadline - time.perf_counter(), 0))
+            if not all(t.refreshed for t in pair_threads):
+                failed.append(depair)
+        if len(failed) > 0:
+            logger.warning(f"Failed to refresh {len(failed)} pair orderbooks: {failed}")
+        schedule.mark_refreshed([i for i in batch_pairs if i not in failed])
+        batch_duration = time.perf_counter() - batch_start
+        msg = (
+            f"pairs_orderbook_extended refreshed {len(batch_pairs) - len(failed)}"
+            f"/{len(batch_pairs)} due pairs in {batch_duration:.2f}s"
+        )
+        return default.result(msg=msg, loglevel="loop", ignore_until=3)
+
     @property
     def pair_volumes_24hr_cache(self):
         if self._pair_volumes_24hr_cache is None:
@@ -442,7 +511,7 @@ class CacheCalc:
 
     def _acquire_batch_lock(self):
         try:
-            return memcache.MEMCACHE.add(
+            return memcache.client().add(
                 ORDERBOOK_BATCH_LOCK_KEY, True, ORDERBOOK_BATCH_LOCK_TTL
             )
         except Exception:
@@ -450,7 +519,7 @@ class CacheCalc:
 
     def _release_batch_lock(self):
         try:
-            memcache.MEMCACHE.delete(ORDERBOOK_BATCH_LOCK_KEY)
+            memcache.client().delete(ORDERBOOK_BATCH_LOCK_KEY)
         except Exception:
             pass
 
@@ -745,6 +814,39 @@ class CacheCalc:
             logger.error(f"{type(e)} Error in [StatsAPI.adex_alltime]: {e}")
             return None
 
+    def swap_durations(self, refresh=False):
+        """
+        Swap duration distributions per coin, pair and gui over the
+        last DURATION_STATS_DAYS, with a network wide total.
+        """
+        try:
+            data = memcache.get_swap_durations()
+            if data is None or refresh:
+                end_time = int(cron.now_utc())
+                start_time = end_time - 86400 * DURATION_STATS_DAYS
+                histograms = self.pg_query.swap_durations(
+                    start_time=start_time, end_time=end_time
+                )
+                # Each swap is in exactly one pair
+                total = template.duration_histogram()
+                for i in histograms["pairs"].values():
+                    total = merge.duration_histograms(total, i)
+                data = {
+                    "days": DURATION_STATS_DAYS,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "all": derive.duration_stats(total),
+                }
+                for group in ["coins", "pairs", "guis"]:
+                    data[group] = {
+                        k: derive.duration_stats(v)
+                        for k, v in sorted(histograms[group].items())
+                    }
+            return data
+        except Exception as e:  # pragma: no cover
+            logger.error(f"{type(e)} Error in [StatsAPI.swap_durations]: {e}")
+            return None
+
     @timed
     def tickers_lite(self, coin=None, depaired=False):
         # TODO: confirm no reverse duplicates
@@ -2,8 +2,9 @@
 import os
 import csv
 import json
-import requests
+from const import CMC_API_URL, CMC_ASSETS_MAX_AGE
 from lib.coins import Coin
+from util.fetch import fetcher
 from util.logger import logger
 import util.memcache as memcache
 
@@ -15,8 +16,9 @@ COINS_CONFIG_URL = "https://raw.githubusercontent.com/KomodoPlatform/coins/maste
 
 
 class CmcAPI:  # pragma: no cover
-    def __init__(self):
-        self.base_url = "https://pro-api.coinmarketcap.com"
+    def __init__(self, fetch_handler=None, base_url=CMC_API_URL):
+        self.base_url = base_url
+        self.fetcher = fetch_handler or fetcher()
 
     @property
     def coins_config(self):
@@ -31,9 +33,8 @@ class CmcAPI:  # pragma: no cover
         logger.calc(endpoint)
         url = f"{self.base_url}/{endpoint}"
         logger.calc(url)
-        r = requests.get(url)
-        data = r.json()["data"]
-        return data
+        # Revalidated at most daily, else served from the response cache
+        return self.fetcher.get_json(url, max_age=CMC_ASSETS_MAX_AGE)["data"]
 
     def get_cmc_by_ticker(self, assets_source, save=False):
         by_ticker = {}
@@ -1,12 +1,44 @@
 #!/usr/bin/env python3
 from typing import Dict
 from dataclasses import dataclass
+from threading import Lock
 from util.logger import logger
 from util.cron import cron
 import util.defaults as default
 import util.memcache as memcache
 from util.transform import derive
 
+# Cache items which a Coins registry is derived from
+REGISTRY_INPUTS = ["coins_config", "gecko_source"]
+
+_REGISTRY = {"version": None, "coins": None, "builds": 0}
+_REGISTRY_LOCK = Lock()
+
+
+def registry_version():
+    """Saved versions of the registry's inputs, which change on refresh"""
+    version = []
+    for i in REGISTRY_INPUTS:
+        record = memcache.get_fingerprint(i)
+        version.append(None if record is None else record["version"])
+    return tuple(version)
+
+
+def get_coins(coins_config=None, gecko_source=None):
+    """
+    Returns the shared Coins registry, which is only rebuilt when
+    the coins_config or gecko_source cache items are refreshed.
+    """
+    version = registry_version()
+    with _REGISTRY_LOCK:
+        if _REGISTRY["coins"] is None or _REGISTRY["version"] != version:
+            _REGISTRY["coins"] = Coins(
+                coins_config=coins_config, gecko_source=gecko_source
+            )
+            _REGISTRY["version"] = version
+            _REGISTRY["builds"] += 1
+        return _REGISTRY["coins"]
+
 
 @dataclass
 class Coins:  # pragma: no cover
@@ -20,6 +52,12 @@ class Coins:  # pragma: no cover
                 for i in self.config
             ]
             self.tickers = sorted([j for j in self.config.keys()])
+            # Membership sets, derived once per registry build
+            self.priced_tickers = set([i.coin for i in self.coins if i.is_priced])
+            self.segwit_tickers = set([i.coin for i in self.coins if i.has_segwit])
+            self.wallet_only_tickers = set(
+                [i.coin for i in self.coins if i.is_wallet_only]
+            )
         except Exception as e:  # pragma: no cover
             logger.error(f"Failed to init Coins: {e}")
 
@@ -46,16 +84,22 @@ class Coins:  # pragma: no cover
 
     @property
     def with_price(self):
-        return [i for i in self.coins if i.is_priced]
+        return [i for i in self.coins if i.coin in self.priced_tickers]
 
     @property
     def with_segwit(self):
-        data = [i for i in self.coins if i.has_segwit]
-        return data
+        return [i for i in self.coins if i.coin in self.segwit_tickers]
 
     @property
     def wallet_only(self):
-        return [i for i in self.coins if i.is_wallet_only]
+        return [i for i in self.coins if i.coin in self.wallet_only_tickers]
+
+    def is_priced(self, coin: str) -> bool:
+        return coin in self.priced_tickers
+
+    def pair_is_priced(self, pair_str: str) -> bool:
+        base, quote = derive.base_quote(pair_str)
+        return base in self.priced_tickers and quote in self.priced_tickers
 
     @property
     def testnet_only(self):
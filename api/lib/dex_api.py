@@ -16,6 +16,7 @@ from const import (
     ORDERBOOK_CACHE_WAIT_INTERVAL,
 )
 from lib.cache_query import cache_query
+from lib.orderbook_schedule import record_book
 from util.cron import cron
 from util.files import Files
 from util.logger import logger, timed
@@ -83,8 +84,11 @@ class DexAPI:
     # tuple, string, string -> list
     # returning orderbook for given trading pair
     @timed
-    def orderbook_rpc(self, base: str, quote: str) -> dict:
-        """Either returns template, or actual result"""
+    def orderbook_rpc(self, base: str, quote: str, strict: bool = False) -> dict:
+        """
+        Either returns template, or actual result. If `strict`, returns
+        None instead of the template when the request fails.
+        """
         try:
             params = {
                 "mmrpc": "2.0",
@@ -93,6 +97,9 @@ class DexAPI:
                 "id": 42,
             }
             resp = self.api(params)
+            if strict and ("error" in resp or "asks" not in resp):
+                logger.warning(f"orderbook rpc failed for {base}_{quote}: {resp}")
+                return None
             if "error" in resp:
                 data = template.orderbook_rpc_resp(base=base, quote=quote)
                 return default.result(
@@ -101,6 +108,9 @@ class DexAPI:
             msg = f"Returning {base}_{quote} orderbook from mm2"
             return default.result(data=resp, msg=msg, loglevel="loop", ignore_until=3)
         except Exception as e:  # pragma: no cover
+            if strict:
+                logger.warning(f"orderbook rpc failed for {base}_{quote}: {e} {type(e)}")
+                return None
             data = template.orderbook_rpc_resp(base=base, quote=quote)
             msg = f"orderbook rpc failed for {base}_{quote}: {e} {type(e)}. Returning template."
             return default.result(
@@ -127,21 +137,33 @@ class OrderbookRpcThread(threading.Thread):
             self.pair_str = f"{self.base}_{self.quote}"
             self.variant_cache_name = variant_cache_name
             self.depth = depth
+            # Set once the variant cache is updated
+            self.refreshed = False
         except Exception as e:  # pragma: no cover
             logger.warning(e)
 
     @timed
     def run(self):
+        data = None
         try:
-            data = DexAPI().orderbook_rpc(self.base, self.quote)
+            # A failed request leaves the cached book as it is
+            data = DexAPI().orderbook_rpc(self.base, self.quote, strict=True)
+            if data is None:
+                return default.result(
+                    msg=f"Threaded orderbook for {self.pair_str} failed",
+                    loglevel="warning",
+                    ignore_until=0,
+                )
             data = orderbook_extras(
                 pair_str=self.pair_str,
                 data=data,
                 gecko_source=self.gecko_source,
                 pair_prices_24hr_cache=self.pair_prices_24hr_cache,
             )
-            data = clean.decimal_dicts(data)
+            data = clean.decimal_dicts(clean.orderbook_data(data))
             memcache.update(self.variant_cache_name, data, 900)
+            record_book(self.pair_str, data)
+            self.refreshed = True
         except Exception as e:  # pragma: no cover
             logger.warning(e)
         return default.result(
@@ -165,7 +187,8 @@ def get_orderbook(
 ):
     try:
         """
-        If `refresh` is true request is threaded and added to cache.
+        If `refresh` is true request is threaded and added to cache, and
+        the started thread is returned.
         If `refresh` is false, resp from cache or standard request.
         """
         if pair_prices_24hr_cache is None:
@@ -194,7 +217,7 @@ def get_orderbook(
                 pair_prices_24hr_cache=pair_prices_24hr_cache,
             )
             t.start()
-            return None
+            return t
 
         # Use variant cache if available
         lock_acquired = False
@@ -233,8 +256,9 @@ def get_orderbook(
                     gecko_source=gecko_source,
                     pair_prices_24hr_cache=pair_prices_24hr_cache,
                 )
-                data = clean.decimal_dicts(data)
+                data = clean.decimal_dicts(clean.orderbook_data(data))
                 memcache.update(variant_cache_name, data, 900)
+                record_book(pair_str, data)
                 msg = f"Updated orderbook cache for {pair_str}"
                 _record_orderbook_cache_result(pair_str, cached=True)
             finally:
@@ -281,7 +305,7 @@ def get_orderbook_fixture(pair_str, gecko_source, pair_prices_24hr_cache):
         data = invert.orderbook_fixture(data)
     data = orderbook_extras(pair_str, data, gecko_source, pair_prices_24hr_cache)
     if len(data["bids"]) > 0 or len(data["asks"]) > 0:
-        data = clean.decimal_dicts(data)
+        data = clean.decimal_dicts(clean.orderbook_data(data))
     return default.result(
         data=data,
         ignore_until=2,
@@ -357,7 +381,20 @@ def orderbook_extras(pair_str, data, gecko_source, pair_prices_24hr_cache):
 def get_liquidity(orderbook, gecko_source):
     """Liquidity for pair from current orderbook & usd price."""
     try:
-        # Prices and volumes
+        # Prices and volumes, one pass per side
+        totals = {}
+        for side in ["asks", "bids"]:
+            base_vol = Decimal(0)
+            quote_vol = Decimal(0)
+            for i in orderbook[side]:
+                base_vol += Decimal(i["volume"])
+                quote_vol += Decimal(i["quote_volume"])
+            totals.update(
+                {
+                    f"total_{side}_base_vol": base_vol,
+                    f"total_{side}_quote_vol": quote_vol,
+                }
+            )
         orderbook.update(
             {
                 "base_price_usd": derive.gecko_price(
@@ -366,18 +403,7 @@ def get_liquidity(orderbook, gecko_source):
                 "quote_price_usd": derive.gecko_price(
                     orderbook["quote"], gecko_source=gecko_source
                 ),
-                "total_asks_base_vol": sum(
-                    [Decimal(i["volume"]) for i in orderbook["asks"]]
-                ),
-                "total_bids_base_vol": sum(
-                    [Decimal(i["volume"]) for i in orderbook["bids"]]
-                ),
-                "total_asks_quote_vol": sum(
-                    [Decimal(i["quote_volume"]) for i in orderbook["asks"]]
-                ),
-                "total_bids_quote_vol": sum(
-                    [Decimal(i["quote_volume"]) for i in orderbook["bids"]]
-                ),
+                **totals,
             }
         )
         # TODO: Some duplication here, could be reduced.
@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 import requests
-import time
-#import backoff
 from typing import List, Dict
-from const import FIXER_API_KEY
+from const import COINGECKO_API_URL, FIXER_API_KEY
+from util.fetch import fetcher
 from util.files import Files
 from util.helper import get_chunks
 from util.logger import logger
@@ -13,18 +12,30 @@ import util.memcache as memcache
 
 
 INVALID_IDS = {"na", "test-coin", ""}
+# Coin ids per simple/price request
+PRICE_CHUNK_SIZE = 200
+
 
 class CoinGeckoAPI:
-    def __init__(self, coins_config=None, file_handler=None, **kwargs):
+    def __init__(
+        self,
+        coins_config=None,
+        file_handler=None,
+        fetch_handler=None,
+        base_url=COINGECKO_API_URL,
+        **kwargs,
+    ):
         self.kwargs = kwargs
         self.options = []
         self.files = file_handler or Files()
+        self.fetcher = fetch_handler or fetcher()
+        self.base_url = base_url
         self._coins_config = coins_config
+        self._coin_ids = None
+        self._template = None
 
         try:
             default.params(self, self.kwargs, self.options)
-            self.coin_ids = self.get_coin_ids()
-            self.template = self.build_template()
         except Exception as e:
             logger.error(f"{type(e)} Failed to init CoinGeckoAPI: {e}")
 
@@ -34,6 +45,27 @@ class CoinGeckoAPI:
             self._coins_config = memcache.get_coins_config()
         return self._coins_config
 
+    # Built on first use, as gecko_api is created when this is imported
+    @property
+    def coin_ids(self):
+        if self._coin_ids is None:
+            try:
+                self._coin_ids = self.get_coin_ids()
+            except Exception as e:
+                logger.error(f"{type(e)} Failed to get CoinGecko coin ids: {e}")
+                return []
+        return self._coin_ids
+
+    @property
+    def template(self):
+        if self._template is None:
+            try:
+                self._template = self.build_template()
+            except Exception as e:
+                logger.error(f"{type(e)} Failed to build CoinGecko template: {e}")
+                return {}
+        return self._template
+
     def get_coin_ids(self) -> List[str]:
         coin_ids = {
             cfg["coingecko_id"]
@@ -63,14 +95,14 @@ class CoinGeckoAPI:
                 gecko_coins[coin_id].append(coin)
         return gecko_coins
 
-    # @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_tries=3)
-    def fetch_price_data(self, coin_id_chunk: List[str]) -> Dict:
+    def price_url(self, coin_id_chunk: List[str]) -> str:
         params = f"ids={','.join(coin_id_chunk)}&vs_currencies=usd&include_market_cap=true"
-        url = f"https://api.coingecko.com/api/v3/simple/price?{params}"
+        return f"{self.base_url}/simple/price?{params}"
+
+    def fetch_price_data(self, coin_id_chunk: List[str]) -> Dict:
+        url = self.price_url(coin_id_chunk)
         try:
-            r = requests.get(url)
-            r.raise_for_status()
-            return r.json()
+            return self.fetcher.get_json(url)
         except Exception as e:
             logger.warning(f"Failed to fetch from URL: {url}, error: {e}")
             return {}
@@ -78,14 +110,19 @@ class CoinGeckoAPI:
     def get_source_data(self, from_file=False):
         if memcache.get("testing") is not None or from_file:
             return self.files.load_jsonfile(self.files.gecko_source)
+        gecko_info = self.fetch_source_data()
+        self.files.save_json(self.files.gecko_source, gecko_info)
+        return gecko_info
 
+    def fetch_source_data(self):
+        """USD prices and market caps for coins in coins_config"""
         gecko_info = self.build_template()
         gecko_coins = self.map_gecko_coins(gecko_info)
-        param_limit = 200
-
-        for chunk in get_chunks(self.coin_ids, param_limit):
-            gecko_source = self.fetch_price_data(chunk)
-
+        urls = [self.price_url(i) for i in get_chunks(self.coin_ids, PRICE_CHUNK_SIZE)]
+        # Chunks are fetched concurrently, unchanged ones are revalidated
+        for gecko_source in self.fetcher.get_many(urls):
+            if gecko_source is None:
+                continue
             for coin_id, values in gecko_source.items():
                 coins = gecko_coins.get(coin_id, [])
                 for coin in coins:
@@ -93,9 +130,6 @@ class CoinGeckoAPI:
                         gecko_info[coin]["usd_price"] = values["usd"]
                     if "usd_market_cap" in values:
                         gecko_info[coin]["usd_market_cap"] = values["usd_market_cap"]
-            time.sleep(0.1)
-
-        self.files.save_json(self.files.gecko_source, gecko_info)
         return gecko_info
 
 
@@ -141,4 +175,4 @@ class BinanceAPI:  # pragma: no cover
         return r.json()
 
 
-gecko_api = CoinGeckoAPI(coins_config=memcache.get_coins_config())
+gecko_api = CoinGeckoAPI()
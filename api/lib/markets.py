@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 from lib.pair import Pair
-from lib.coins import Coins
+from lib.coins import get_coins
 from util.logger import timed, logger
 from util.transform import sortdata, derive, invert, merge
 from util.cron import cron
@@ -15,7 +15,7 @@ class Markets:
             self._coins_config = coins_config
             self._gecko_source = gecko_source
             self.netid = 8762
-            self.coins = Coins()
+            self.coins = get_coins()
             self.segwit_coins = self.coins.with_segwit
         except Exception as e:  # pragma: no cover
             logger.error(f"Failed to init Markets: {e}")
@@ -46,6 +46,7 @@ class Markets:
                 coins_config=self.coins_config,
                 gecko_source=self.gecko_source,
             ).historical_trades(
+                limit=0,
                 start_time=start_time,
                 end_time=end_time,
             )
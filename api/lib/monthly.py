@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import os
+from datetime import datetime, timezone
+from const import DISTINCT_PUBKEYS_EXACT
+from util.cron import cron
+from util.files import Files
+from util.logger import logger, timed
+import db.sqldb as db
+import util.defaults as default
+from util.exceptions import DataStructureError
+import util.memcache as memcache
+
+# Closed months are frozen once this far past their end, to
+# leave time for late imports and reconciles to land.
+MONTH_FREEZE_GRACE = 86400 * 2
+
+
+def month_bounds(year: int, month: int):
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    if month == 12:
+        end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        end = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def month_key(year: int, month: int, pubkey=None, gui=None):
+    key = f"{year}_{month:02d}"
+    if pubkey is not None:
+        key += f"_pubkey_{pubkey}"
+    if gui is not None:
+        key += f"_gui_{gui}"
+    return key
+
+
+def empty_cube():
+    return {"swaps": 0, "pairs": {}, "pubkeys": {}, "guis": {}}
+
+
+@timed
+def get_month(year: int, month: int, pubkey=None, gui=None, refresh=False):
+    """
+    Returns the stats cube for a month. Closed months are built once and
+    kept in memcache (and on disk if unfiltered), while the current month
+    is rebuilt when its short lived memcache entry expires.
+    """
+    try:
+        start_time, end_time = month_bounds(year, month)
+        now = int(cron.now_utc())
+        if start_time > now:
+            return default.result(data=empty_cube(), msg="Future month", loglevel="muted")
+        key = month_key(year, month, pubkey, gui)
+        frozen = end_time + MONTH_FREEZE_GRACE < now
+        fn = None
+        if frozen and pubkey is None and gui is None:
+            fn = f"{Files().monthly_stats}/{key}.json"
+
+        if not refresh:
+            cube = memcache.get_monthly_stats(key)
+            if cube is None and fn is not None and os.path.exists(fn):
+                cube = Files().load_jsonfile(fn)
+                if cube is not None:
+                    memcache.set_monthly_stats(key, cube, 86400 * 7)
+            if cube is not None:
+                return default.result(
+                    data=cube, msg=f"{key} monthly stats cached", loglevel="cached"
+                )
+
+        cube = db.SqlQuery().monthly_stats_cube(
+            start_time=start_time, end_time=end_time, pubkey=pubkey, gui=gui
+        )
+        # A failed query returns an error result, which isn't cached
+        if not isinstance(cube, dict) or set(empty_cube()) - set(cube):
+            raise DataStructureError(f"Failed to build {key} monthly stats: {cube}")
+        if frozen:
+            memcache.set_monthly_stats(key, cube, 86400 * 7)
+            if fn is not None:
+                os.makedirs(os.path.dirname(fn), exist_ok=True)
+                Files().save_json(fn, cube, indent=0)
+        else:
+            memcache.set_monthly_stats(key, cube)
+        msg = f"{key} monthly stats built"
+        return default.result(data=cube, msg=msg, loglevel="calc", ignore_until=3)
+    except Exception as e:  # pragma: no cover
+        logger.warning(f"{type(e)} Error getting monthly stats for {year}-{month}: {e}")
+        return default.result(data=empty_cube(), msg=e, loglevel="warning")
+
+
+def get_year(year: int, pubkey=None, gui=None):
+    """Returns the stats cubes for each month of a year, keyed 1-12"""
+    return {i: get_month(year, i, pubkey=pubkey, gui=gui) for i in range(1, 13)}
+
+
+def month_name(year: int, month: int):
+    return datetime(year, month, 1).strftime("%b").lower()
+
+
+def unique_pubkeys(year: int, exact: bool | None = None):
+    """
+    Returns the unique pubkey count of each month of a year with swaps,
+    keyed by month name. Unless `exact` (defaulting to
+    DISTINCT_PUBKEYS_EXACT) is set, counts are merged from the daily
+    pubkey sketches instead of the monthly stats cubes.
+    """
+    if exact is None:
+        exact = DISTINCT_PUBKEYS_EXACT
+    out = {}
+    if exact:
+        for i, cube in get_year(year).items():
+            if cube["swaps"] > 0:
+                out[month_name(year, i)] = len(cube["pubkeys"])
+        return out
+    query = db.SqlQuery()
+    now = int(cron.now_utc())
+    for i in range(1, 13):
+        start_time, end_time = month_bounds(year, i)
+        if start_time > now:
+            break
+        r = query.distinct_pubkeys(start_time=start_time, end_time=end_time, exact=False)
+        if "unique_pubkeys" not in r:
+            raise DataStructureError(f"Failed to merge {year}-{i} pubkey sketches: {r}")
+        if r["unique_pubkeys"] > 0:
+            out[month_name(year, i)] = r["unique_pubkeys"]
+    return out
+
+
+def monthly_stats_item(month: int, cube):
+    """Formats a month's stats cube for the MonthlyStatsItem model"""
+    top_pairs = [
+        {"pair": k, **v}
+        for k, v in sorted(
+            cube["pairs"].items(), key=lambda x: x[1]["swap_count"], reverse=True
+        )[:5]
+    ]
+    top_pubkeys = [
+        {"pubkey": k, "swap_count": v["swap_count"], "volume": v["volume"]}
+        for k, v in sorted(
+            cube["pubkeys"].items(), key=lambda x: x[1]["swap_count"], reverse=True
+        )[:10]
+    ]
+    gui_stats = [{"gui": k, **v} for k, v in cube["guis"].items()]
+    gui_count_buckets = {1: 0, 2: 0, 3: 0, "3+": 0}
+    for v in cube["pubkeys"].values():
+        n = v["gui_count"]
+        if n in [1, 2, 3]:
+            gui_count_buckets[n] += 1
+        elif n > 3:
+            gui_count_buckets["3+"] += 1
+    return {
+        "month": month,
+        "total_swaps": cube["swaps"],
+        "top_pairs": top_pairs,
+        "unique_pubkeys": len(cube["pubkeys"]),
+        "top_pubkeys": top_pubkeys,
+        "gui_stats": gui_stats,
+        "pubkey_gui_counts": gui_count_buckets,
+    }
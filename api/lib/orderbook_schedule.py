@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import math
+import hashlib
+from threading import Lock
+from const import (
+    ORDERBOOK_ACTIVITY_HALF_LIFE,
+    ORDERBOOK_CHURN_WEIGHT,
+    ORDERBOOK_HOT_REQUESTS_PER_MIN,
+    ORDERBOOK_HOT_VOLUME_USD,
+    ORDERBOOK_REFRESH_CYCLE,
+    ORDERBOOK_REFRESH_MAX,
+    ORDERBOOK_REFRESH_MIN,
+    ORDERBOOK_REFRESH_PAIRS,
+    ORDERBOOK_RPC_BUDGET,
+)
+from util.cron import cron
+from util.logger import logger
+from util.transform import deplatform, derive, invert
+import util.memcache as memcache
+
+
+ORDERBOOK_SCHEDULE_KEY = "orderbook_refresh_schedule"
+ORDERBOOK_SCHEDULE_TTL = 86400
+# Weight of the latest cycle in a pair's churn (fraction of refreshes
+# which changed its book)
+CHURN_SMOOTHING = 0.3
+
+# Counted in process between cycles, then drained into the schedule.
+# With several workers, only requests served by the process running the
+# cache loops are counted.
+_ORDERBOOK_REQUESTS = {}
+_ORDERBOOK_CHANGES = {}
+_ORDERBOOK_HASHES = {}
+_ORDERBOOK_ACTIVITY_LOCK = Lock()
+
+
+def record_request(pair_str: str):
+    """Counts a request for a pair's orderbook, in this process only"""
+    depair = deplatform.pair(pair_str)
+    with _ORDERBOOK_ACTIVITY_LOCK:
+        _ORDERBOOK_REQUESTS[depair] = _ORDERBOOK_REQUESTS.get(depair, 0) + 1
+
+
+def record_book(pair_str: str, data: dict):
+    """Counts whether a refreshed variant book differs from the last"""
+    try:
+        levels = [
+            (i["price"], i["volume"]) for side in ["bids", "asks"] for i in data[side]
+        ]
+    except (KeyError, TypeError):
+        return
+    digest = hashlib.sha1(repr(levels).encode("utf-8")).hexdigest()
+    depair = deplatform.pair(pair_str)
+    with _ORDERBOOK_ACTIVITY_LOCK:
+        previous = _ORDERBOOK_HASHES.get(pair_str)
+        _ORDERBOOK_HASHES[pair_str] = digest
+        if previous is None:
+            return
+        changed, observed = _ORDERBOOK_CHANGES.get(depair, (0, 0))
+        _ORDERBOOK_CHANGES[depair] = (changed + int(previous != digest), observed + 1)
+
+
+def _drain():
+    with _ORDERBOOK_ACTIVITY_LOCK:
+        requests = dict(_ORDERBOOK_REQUESTS)
+        changes = dict(_ORDERBOOK_CHANGES)
+        _ORDERBOOK_REQUESTS.clear()
+        _ORDERBOOK_CHANGES.clear()
+    return requests, changes
+
+
+def rpc_cost(depair: str) -> int:
+    """Orderbook RPC calls made to refresh all variants of a pair"""
+    return max(len(derive.pair_variants(depair)), 1)
+
+
+class OrderbookSchedule:
+    """
+    Assigns each pair an orderbook refresh interval from its 24hr trade
+    volume, request rate and churn, between ORDERBOOK_REFRESH_MIN and
+    ORDERBOOK_REFRESH_MAX seconds. Each cycle refreshes the most overdue
+    pairs, using at most `budget` orderbook RPC calls for at most
+    `max_pairs` pairs. Request rates come from record_request, so they
+    only cover this process.
+    """
+
+    def __init__(
+        self,
+        budget: int = ORDERBOOK_RPC_BUDGET,
+        min_interval: int = ORDERBOOK_REFRESH_MIN,
+        max_interval: int = ORDERBOOK_REFRESH_MAX,
+        state=None,
+        max_pairs: int = ORDERBOOK_REFRESH_PAIRS,
+    ):
+        self.budget = budget
+        self.max_pairs = max_pairs
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        if state is None:
+            state = memcache.get(ORDERBOOK_SCHEDULE_KEY, fallback=False)
+        if not isinstance(state, dict) or "pairs" not in state:
+            state = {"updated": None, "cycle": None, "pairs": {}}
+        self.state = state
+
+    def save(self):
+        memcache.update(ORDERBOOK_SCHEDULE_KEY, self.state, ORDERBOOK_SCHEDULE_TTL)
+
+    def heat(self, volume_usd: float, requests: float, churn: float) -> float:
+        """
+        Activity of a pair, from 0 (idle) to 1 (hot). Trade volume or
+        requests alone can make a pair hot, churn adds to either.
+        """
+        volume = math.log1p(max(volume_usd, 0)) / math.log1p(ORDERBOOK_HOT_VOLUME_USD)
+        demand = max(min(volume, 1), min(requests / ORDERBOOK_HOT_REQUESTS_PER_MIN, 1))
+        return (1 - ORDERBOOK_CHURN_WEIGHT) * demand + ORDERBOOK_CHURN_WEIGHT * min(churn, 1)
+
+    def interval(self, heat: float) -> float:
+        # Geometric, so each step in heat shortens the interval by the
+        # same ratio
+        ratio = self.max_interval / self.min_interval
+        return round(self.min_interval * ratio ** (1 - heat), 1)
+
+    def update(self, pairs, volumes, now):
+        """Folds activity since the last cycle into pair intervals"""
+        requests, changes = _drain()
+        last = self.state["updated"]
+        if last is None:
+            last = now - ORDERBOOK_REFRESH_CYCLE
+        elapsed = max(now - last, 1)
+        decay = 0.5 ** (elapsed / ORDERBOOK_ACTIVITY_HALF_LIFE)
+        previous = self.state["pairs"]
+        # Pairs no longer eligible are dropped
+        self.state["pairs"] = {}
+        for depair in pairs:
+            i = previous.get(depair) or {"refreshed": None, "requests": 0, "churn": 0}
+            count = requests.get(depair, 0) + requests.get(invert.pair(depair), 0)
+            rate = count * 60 / elapsed
+            i["requests"] = decay * i["requests"] + (1 - decay) * rate
+            changed, observed = changes.get(depair, (0, 0))
+            if observed > 0:
+                i["churn"] = (1 - CHURN_SMOOTHING) * i["churn"] + CHURN_SMOOTHING * (
+                    changed / observed
+                )
+            i["volume_usd"] = float(volumes.get(depair, 0))
+            i["heat"] = round(self.heat(i["volume_usd"], i["requests"], i["churn"]), 4)
+            i["interval"] = self.interval(i["heat"])
+            self.state["pairs"][depair] = i
+        self.state["updated"] = now
+
+    def select(self, pairs, volumes=None, cost=rpc_cost, now=None):
+        """
+        Returns the pairs due for a refresh, most overdue first, within
+        the RPC budget. Pairs never refreshed are due, hottest first.
+        Pairs stay due until passed to mark_refreshed.
+        """
+        if now is None:
+            now = int(cron.now_utc())
+        self.update(pairs, volumes or {}, now)
+        due = []
+        for depair, i in self.state["pairs"].items():
+            if i["refreshed"] is None:
+                due.append((math.inf, i["heat"], depair))
+            elif now - i["refreshed"] >= i["interval"]:
+                due.append(((now - i["refreshed"]) / i["interval"], i["heat"], depair))
+        due.sort(reverse=True)
+
+        batch = []
+        spent = 0
+        for _, _, depair in due:
+            calls = cost(depair)
+            # A pair costing more than the budget still gets a cycle
+            if spent + calls > self.budget and len(batch) > 0:
+                continue
+            batch.append(depair)
+            spent += calls
+            if spent >= self.budget or len(batch) >= self.max_pairs:
+                break
+        self.state["cycle"] = {
+            "time": now,
+            "due": len(due),
+            "selected": len(batch),
+            "deferred": len(due) - len(batch),
+            "rpc_calls": spent,
+            "budget": self.budget,
+        }
+        self.save()
+        logger.loop(f"[orderbook-schedule] {self.state['cycle']}")
+        return batch
+
+    def mark_refreshed(self, pairs, now=None):
+        """Records the pairs from select whose books were refreshed"""
+        if now is None:
+            now = int(cron.now_utc())
+        for depair in pairs:
+            if depair in self.state["pairs"]:
+                self.state["pairs"][depair]["refreshed"] = now
+        self.save()
+
+    def staleness(self, now=None):
+        """Seconds since each pair's last refresh, against its interval"""
+        if now is None:
+            now = int(cron.now_utc())
+        pairs = {}
+        ages = []
+        for depair, i in self.state["pairs"].items():
+            age = None if i["refreshed"] is None else now - i["refreshed"]
+            pairs[depair] = {
+                "age": age,
+                "interval": i["interval"],
+                "staleness": None if age is None else round(age / i["interval"], 3),
+                "heat": i["heat"],
+                "volume_usd": i["volume_usd"],
+                "requests_per_min": round(i["requests"], 3),
+                "churn": round(i["churn"], 3),
+            }
+            if age is not None:
+                ages.append(age)
+        ages.sort()
+        return {
+            "pairs_count": len(pairs),
+            "never_refreshed": len(pairs) - len(ages),
+            "due": len([i for i in pairs.values() if i["age"] is None or i["staleness"] >= 1]),
+            "age": {
+                "p50": percentile(ages, 50),
+                "p95": percentile(ages, 95),
+                "max": ages[-1] if ages else None,
+            },
+            "last_cycle": self.state["cycle"],
+            "pairs": dict(sorted(pairs.items(), key=lambda x: x[1]["heat"], reverse=True)),
+        }
+
+
+def percentile(values, rank):
+    """Nearest rank percentile of sorted values"""
+    if len(values) == 0:
+        return None
+    return values[max(math.ceil(rank / 100 * len(values)) - 1, 0)]
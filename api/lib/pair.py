@@ -8,6 +8,7 @@ import lib.dex_api as dex
 import lib.last as last_traded
 import util.defaults as default
 import util.memcache as memcache
+import util.validate as validate
 from util.cron import cron
 from util.logger import timed
 from util.transform import (
@@ -18,7 +19,6 @@ from util.transform import (
     sumdata,
     merge,
     invert,
-    filterdata,
     template,
     derive,
 )
@@ -143,8 +143,13 @@ class Pair:  # pragma: no cover
         limit: int = 100,
         start_time: Optional[int] = 0,
         end_time: Optional[int] = 0,
+        trade_type: str = "all",
     ):
-        """Returns trades for this pair."""
+        """
+        Returns the latest `limit` trades (0 for all) for this pair, for
+        each variant and "ALL". Trade type, ordering and limit are applied
+        in SQL, and the sums are SQL aggregates over the whole timespan.
+        """
         # TODO: Review price / reverse price logic
         try:
             if start_time == 0:
@@ -153,81 +158,115 @@ class Pair:  # pragma: no cover
                 end_time = int(cron.now_utc())
 
             resp = {}
-            swaps_for_pair = self.pg_query.get_swaps(
+            variants = []
+            if not validate.is_bridge_swap_duplicate(self.as_str, self.gecko_source):
+                variants = self.variants
+            else:
+                logger.warning(f"Skipping bridge_swap_duplicate {self.as_str}")
+            db_trade_type = trade_type
+            if self.is_reversed and trade_type != "all":
+                # trade_type is stored for the mcap sorted pair
+                db_trade_type = invert.trade_type(trade_type)
+            pair_trades = self.pg_query.pair_trades(
+                pairs=variants + [invert.pair(i) for i in variants],
                 start_time=start_time,
                 end_time=end_time,
-                pair_str=self.as_str,
+                trade_type=db_trade_type,
+                limit=limit,
             )
-            for variant in swaps_for_pair:
-                trades_info = []
-                for swap in swaps_for_pair[variant]:
-                    trade_info = OrderedDict()
-                    trade_info["trade_id"] = swap["uuid"]
-                    trade_info["timestamp"] = swap["finished_at"]
-                    # Handle reversed pair requested.
-                    # inverts base / quote and trade type
-                    # so calcs after are correctly assigned
-                    if self.is_reversed:
-                        pair_str = invert.pair(swap["pair"])
-                        price = Decimal(swap["reverse_price"])
-                        trade_info["pair"] = pair_str
-                        trade_info["type"] = invert.trade_type(swap["trade_type"])
-                    else:
-                        pair_str = swap["pair"]
-                        price = Decimal(swap["price"])
-                        trade_info["pair"] = pair_str
-                        trade_info["type"] = swap["trade_type"]
-                    base, quote = derive.base_quote(pair_str)
-                    trade_info["price"] = convert.format_10f(price)
-                    trade_info["base_coin"] = base
-                    trade_info["quote_coin"] = quote
-                    trade_info["base_coin_ticker"] = deplatform.coin(base)
-                    trade_info["quote_coin_ticker"] = deplatform.coin(quote)
-                    trade_info["base_coin_platform"] = derive.coin_platform(base)
-                    trade_info["quote_coin_platform"] = derive.coin_platform(quote)
-
-                    if trade_info["type"] == "buy":
-                        trade_info["base_volume"] = convert.format_10f(
-                            swap["maker_amount"]
-                        )
-                        trade_info["quote_volume"] = convert.format_10f(
-                            swap["taker_amount"]
-                        )
-                    else:
-                        trade_info["base_volume"] = convert.format_10f(
-                            swap["taker_amount"]
-                        )
-                        trade_info["quote_volume"] = convert.format_10f(
-                            swap["maker_amount"]
-                        )
 
-                    trades_info.append(trade_info)
+            def get_variant(pair_str):
+                if pair_str in variants:
+                    return pair_str
+                return invert.pair(pair_str)
+
+            trades = {i: [] for i in variants + ["ALL"]}
+            for swap in pair_trades["trades"]:
+                trade_info = OrderedDict()
+                trade_info["trade_id"] = swap["uuid"]
+                trade_info["timestamp"] = swap["finished_at"]
+                # Handle reversed pair requested.
+                # inverts base / quote and trade type
+                # so calcs after are correctly assigned
+                if self.is_reversed:
+                    pair_str = invert.pair(swap["pair"])
+                    price = Decimal(swap["reverse_price"])
+                    trade_info["pair"] = pair_str
+                    trade_info["type"] = invert.trade_type(swap["trade_type"])
+                else:
+                    pair_str = swap["pair"]
+                    price = Decimal(swap["price"])
+                    trade_info["pair"] = pair_str
+                    trade_info["type"] = swap["trade_type"]
+                base, quote = derive.base_quote(pair_str)
+                trade_info["price"] = convert.format_10f(price)
+                trade_info["base_coin"] = base
+                trade_info["quote_coin"] = quote
+                trade_info["base_coin_ticker"] = deplatform.coin(base)
+                trade_info["quote_coin_ticker"] = deplatform.coin(quote)
+                trade_info["base_coin_platform"] = derive.coin_platform(base)
+                trade_info["quote_coin_platform"] = derive.coin_platform(quote)
+
+                if trade_info["type"] == "buy":
+                    trade_info["base_volume"] = convert.format_10f(swap["maker_amount"])
+                    trade_info["quote_volume"] = convert.format_10f(swap["taker_amount"])
+                else:
+                    trade_info["base_volume"] = convert.format_10f(swap["taker_amount"])
+                    trade_info["quote_volume"] = convert.format_10f(swap["maker_amount"])
+
+                trades[get_variant(swap["pair"])].append(trade_info)
+                trades["ALL"].append(trade_info)
 
-                buys = filterdata.dict_lists(trades_info, "type", "buy")
-                sells = filterdata.dict_lists(trades_info, "type", "sell")
-                if len(buys) > 0:
-                    buys = sortdata.dict_lists(buys, "timestamp", reverse=True)
-                if len(sells) > 0:
-                    sells = sortdata.dict_lists(sells, "timestamp", reverse=True)
+            totals = {i: template.pair_trade_totals() for i in variants + ["ALL"]}
+            for i in pair_trades["totals"]:
+                if self.is_reversed:
+                    side = invert.trade_type(i["trade_type"])
+                    price = i["reverse_price"]
+                else:
+                    side = i["trade_type"]
+                    price = i["price"]
+                # Stored values are TradeType members, which don't format
+                # as their value
+                if side == "buy":
+                    sides = "buys"
+                    base_volume, quote_volume = i["maker_amount"], i["taker_amount"]
+                else:
+                    sides = "sells"
+                    base_volume, quote_volume = i["taker_amount"], i["maker_amount"]
+                for variant in [get_variant(i["pair"]), "ALL"]:
+                    totals[variant]["trades_count"] += i["count"]
+                    totals[variant]["price"] += price
+                    totals[variant][f"base_volume_{sides}"] += base_volume
+                    totals[variant][f"quote_volume_{sides}"] += quote_volume
+
+            for variant in variants + ["ALL"]:
+                trades_info = trades[variant]
+                if limit > 0:
+                    # Variants may be stored with either pair orientation
+                    trades_info = trades_info[:limit]
+                buys = [i for i in trades_info if i["type"] == "buy"]
+                sells = [i for i in trades_info if i["type"] == "sell"]
                 if variant == "ALL":
                     pair_str = deplatform.pair(self.as_str)
                 else:
                     pair_str = variant
+                total = totals[variant]
+                average_price = 0
+                if total["trades_count"] > 0:
+                    average_price = total["price"] / total["trades_count"]
                 data = {
                     "ticker_id": pair_str,
                     "start_time": str(start_time),
                     "end_time": str(end_time),
                     "limit": str(limit),
-                    "trades_count": str(len(trades_info)),
-                    "sum_base_volume_buys": sumdata.json_key_10f(buys, "base_volume"),
-                    "sum_base_volume_sells": sumdata.json_key_10f(sells, "base_volume"),
-                    "sum_quote_volume_buys": sumdata.json_key_10f(buys, "quote_volume"),
-                    "sum_quote_volume_sells": sumdata.json_key_10f(
-                        sells, "quote_volume"
-                    ),
-                    "average_price": convert.format_10f(
-                        self.get_average_price(trades_info)
+                    "trades_count": str(total["trades_count"]),
+                    "sum_base_volume_buys": convert.format_10f(total["base_volume_buys"]),
+                    "sum_base_volume_sells": convert.format_10f(total["base_volume_sells"]),
+                    "sum_quote_volume_buys": convert.format_10f(total["quote_volume_buys"]),
+                    "sum_quote_volume_sells": convert.format_10f(
+                        total["quote_volume_sells"]
                     ),
+                    "average_price": convert.format_10f(average_price),
                     "buy": buys,
                     "sell": sells,
                 }
@@ -390,25 +429,25 @@ class Pair:  # pragma: no cover
                         depth=depth,
                         refresh=refresh,
                     )
-                    if variant_orderbook is not None:
+                    # With `refresh`, it's the thread updating the cache
+                    if variant_orderbook is not None and not refresh:
                         combo_orderbook[variant] = variant_orderbook
                         ignore_until = 3
-                        if not refresh:
-                            combo_orderbook[variant]["bids"] = combo_orderbook[variant][
-                                "bids"
-                            ][: int(depth)][::-1]
-                            combo_orderbook[variant]["asks"] = combo_orderbook[variant][
-                                "asks"
-                            ][::-1][: int(depth)]
-                            combo_orderbook["ALL"] = merge.orderbooks(
-                                existing=combo_orderbook["ALL"],
-                                new=combo_orderbook[variant],
-                                gecko_source=self.gecko_source,
-                                trigger=variant_cache_name,
-                            )
-                            combo_orderbook[variant] = clean.orderbook_data(
-                                combo_orderbook[variant]
-                            )
+                        combo_orderbook[variant]["bids"] = combo_orderbook[variant][
+                            "bids"
+                        ][: int(depth)][::-1]
+                        combo_orderbook[variant]["asks"] = combo_orderbook[variant][
+                            "asks"
+                        ][::-1][: int(depth)]
+                        combo_orderbook["ALL"] = merge.orderbooks(
+                            existing=combo_orderbook["ALL"],
+                            new=combo_orderbook[variant],
+                            gecko_source=self.gecko_source,
+                            trigger=variant_cache_name,
+                        )
+                        combo_orderbook[variant] = clean.orderbook_data(
+                            combo_orderbook[variant]
+                        )
             # Apply depth limit after caching so cache is complete
             # TODO: Recalc liquidity if depth is less than data.
             if not refresh:
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import hashlib
+import inspect
+import json
+from enum import Enum
+from functools import wraps
+from threading import Lock
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from const import (
+    ROUTE_CACHE_TTL,
+    ROUTE_CACHE_LOCK_TTL,
+    ROUTE_CACHE_WAIT_ATTEMPTS,
+    ROUTE_CACHE_WAIT_INTERVAL,
+)
+from util.logger import logger
+import util.memcache as memcache
+
+
+_ROUTE_CACHE_STATS = {}
+_ROUTE_CACHE_STATS_LOCK = Lock()
+
+
+def _record(name: str, result: str):
+    with _ROUTE_CACHE_STATS_LOCK:
+        if name not in _ROUTE_CACHE_STATS:
+            _ROUTE_CACHE_STATS[name] = {
+                "hits": 0,
+                "coalesced": 0,
+                "misses": 0,
+                "uncached": 0,
+            }
+        _ROUTE_CACHE_STATS[name][result] += 1
+
+
+def stats():
+    """
+    Per route counts of cache hits, coalesced waits, misses and uncached
+    errors
+    """
+    with _ROUTE_CACHE_STATS_LOCK:
+        data = {k: dict(v) for k, v in _ROUTE_CACHE_STATS.items()}
+    for v in data.values():
+        total = v["hits"] + v["coalesced"] + v["misses"]
+        v["hit_ratio"] = round((v["hits"] + v["coalesced"]) / total, 3) if total else 0
+    return data
+
+
+def route_key(name: str, params: dict):
+    """Memcache key for a route and its (normalised) parameters"""
+    params = {
+        k: v.value if isinstance(v, Enum) else v
+        for k, v in params.items()
+        if not isinstance(v, (Request, Response))
+    }
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{memcache.ROUTE_PREFIX}{name}:{digest}"
+
+
+def _encode(resp):
+    """Returns a cacheable form of a route response, or None for errors"""
+    if resp is None:
+        return None
+    if isinstance(resp, Response):
+        if resp.status_code != 200:
+            return None
+        return {"body": resp.body.decode("utf-8"), "media_type": resp.media_type}
+    return {"data": jsonable_encoder(resp)}
+
+
+def _decode(cached):
+    if "body" in cached:
+        return Response(content=cached["body"], media_type=cached["media_type"])
+    return cached["data"]
+
+
+def cached_route(name: str, ttl: int = ROUTE_CACHE_TTL):
+    """
+    Caches a route's response for `ttl` seconds, keyed by its parameters.
+    Concurrent identical requests are coalesced: one takes a lock and runs
+    the route, while the others wait for its response to be cached.
+    Error responses are not cached.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = route_key(name, bound.arguments)
+
+            cached = memcache.get(key)
+            if cached is not None:
+                _record(name, "hits")
+                return _decode(cached)
+
+            lock_acquired = memcache.acquire_lock(key, ttl=ROUTE_CACHE_LOCK_TTL)
+            if not lock_acquired:
+                cached = memcache.wait_for_value(
+                    key,
+                    attempts=ROUTE_CACHE_WAIT_ATTEMPTS,
+                    interval=ROUTE_CACHE_WAIT_INTERVAL,
+                )
+                if cached is not None:
+                    _record(name, "coalesced")
+                    return _decode(cached)
+                logger.warning(f"Timed out waiting for {key}, running {name} uncoalesced")
+            try:
+                resp = func(*args, **kwargs)
+                cached = _encode(resp)
+                if cached is None:
+                    _record(name, "uncached")
+                else:
+                    _record(name, "misses")
+                    memcache.update(key, cached, ttl)
+                return resp
+            finally:
+                if lock_acquired:
+                    memcache.release_lock(key)
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 from util.cron import cron
 import uvicorn
-from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 """
@@ -31,20 +30,10 @@ from routes import (
     new_db,
     stats_xyz,
 )
-from lib.cache import Cache, CacheItem
+from lib.cache import Cache
 from models.generic import ErrorMessage, HealthCheck
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # start up functions
-    for i in ["coins", "coins_config", "gecko_source"]:
-        cache_item = CacheItem(i)
-        cache_item.save()
-    yield
-    # shut down functions
-
-
 app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
 app.include_router(cache_loop.router)
@@ -1,22 +1,38 @@
 #!/usr/bin/env python3
 import time
-from datetime import datetime, timedelta
+from asyncio import ensure_future
+from datetime import datetime
+from functools import wraps
 from fastapi import APIRouter
 from fastapi_utils.tasks import repeat_every
-from const import NODE_TYPE
+from starlette.concurrency import run_in_threadpool
+from const import NODE_TYPE, ORDERBOOK_REFRESH_CYCLE
 import db.sqldb as db
 import db.sqlitedb_merge as old_db_merge
+import lib.monthly as monthly
+import lib.route_cache as route_cache
 import util.defaults as default
 import util.memcache as memcache
 from lib.cache import Cache, CacheItem, reset_cache_files
 from lib.cache_calc import CacheCalc
 from lib.dex_api import DexAPI
+from lib.orderbook_schedule import OrderbookSchedule
 from util.cron import cron
 from util.logger import logger, timed
 
 router = APIRouter()
 
 
+def in_background(func):
+    """Runs a startup task once, without holding up startup"""
+
+    @wraps(func)
+    async def wrapped():
+        ensure_future(run_in_threadpool(func))
+
+    return wrapped
+
+
 
 
 
@@ -34,11 +50,18 @@ def check_cache():  # pragma: no cover
             default.memcache_stat(
                 msg=f"{k.decode('UTF-8'):<30}: {v}", loglevel="cached"
             )
+        for k, v in route_cache.stats().items():
+            default.memcache_stat(msg=f"{k:<30}: {v}", loglevel="cached")
+        staleness = OrderbookSchedule().staleness()
+        for k in ["pairs_count", "never_refreshed", "due", "age", "last_cycle"]:
+            default.memcache_stat(msg=f"orderbook {k:<21}: {staleness[k]}", loglevel="cached")
     except Exception as e:
         return default.result(msg=e, loglevel="warning")
 
 
+# Until memcache is repopulated, memcache.get serves the persisted files
 @router.on_event("startup")
+@in_background
 @timed
 def init_missing_cache():  # pragma: no cover
     reset_cache_files()
@@ -46,6 +69,21 @@ def init_missing_cache():  # pragma: no cover
     return default.result(msg=msg, loglevel="loop", ignore_until=3)
 
 
+@router.on_event("startup")
+@in_background
+@timed
+def init_db_indexes():  # pragma: no cover
+    if NODE_TYPE != "serve":
+        try:
+            pgdb = db.SqlUpdate(db_type="pgsql")
+            pgdb.create_tables()
+            pgdb.create_indexes()
+        except Exception as e:
+            return default.result(msg=e, loglevel="warning")
+    msg = "init db indexes complete!"
+    return default.result(msg=msg, loglevel="loop", ignore_until=3)
+
+
 # ORDERBOOKS CACHE
 @router.on_event("startup")
 @repeat_every(seconds=300)
@@ -62,7 +100,7 @@ def update_pairs_orderbook_extended():
 
 
 @router.on_event("startup")
-@repeat_every(seconds=360)
+@repeat_every(seconds=ORDERBOOK_REFRESH_CYCLE)
 @timed
 def refresh_pairs_orderbook_extended():
     if memcache.get("testing") is None:
@@ -253,6 +291,19 @@ def stats_api_summary():  # pragma: no cover
         return default.result(msg=msg, loglevel="loop", ignore_until=0)
 
 
+@router.on_event("startup")
+@repeat_every(seconds=900)
+@timed
+def swap_durations():  # pragma: no cover
+    if memcache.get("testing") is None:
+        try:
+            CacheItem("swap_durations").save()
+        except Exception as e:
+            return default.result(msg=e, loglevel="warning")
+        msg = "swap_durations data update loop complete!"
+        return default.result(msg=msg, loglevel="loop", ignore_until=0)
+
+
 @router.on_event("startup")
 @repeat_every(seconds=375)
 @timed
@@ -270,7 +321,8 @@ def cmc_summary():  # pragma: no cover
 @repeat_every(seconds=90)
 @timed
 def cmc_assets_source():  # pragma: no cover
-    if memcache.get("cmc_assets_source") is None:
+    # Only rebuilt once expired from memcache, not if a file persists
+    if memcache.get("cmc_assets_source", fallback=False) is None:
         try:
             CacheItem("cmc_assets_source").save()
         except Exception as e:
@@ -283,7 +335,8 @@ def cmc_assets_source():  # pragma: no cover
 @repeat_every(seconds=75)
 @timed
 def cmc_assets():  # pragma: no cover
-    if memcache.get("cmc_assets") is None:
+    # Only rebuilt once expired from memcache, not if a file persists
+    if memcache.get("cmc_assets", fallback=False) is None:
         try:
             CacheItem("cmc_assets").save()
         except Exception as e:
@@ -305,6 +358,22 @@ def fixer_rates():  # pragma: no cover
         return default.result(msg=msg, loglevel="loop", ignore_until=0)
 
 
+# MONTHLY STATS
+@router.on_event("startup")
+@repeat_every(seconds=600)
+@timed
+def monthly_stats_loop():
+    if memcache.get("testing") is None:
+        try:
+            # Closed months are frozen, only the current month is rebuilt
+            now = datetime.utcfromtimestamp(cron.now_utc())
+            monthly.get_month(now.year, now.month, refresh=True)
+        except Exception as e:
+            return default.result(msg=e, loglevel="warning")
+        msg = "monthly_stats loop complete!"
+        return default.result(msg=msg, loglevel="loop", ignore_until=0)
+
+
 # DATABASE SYNC
 @router.on_event("startup")
 @repeat_every(seconds=310)
@@ -312,10 +381,21 @@ def fixer_rates():  # pragma: no cover
 def populate_pgsqldb_loop():
     try:
         if memcache.get("testing") is None:
-            # updates last 24 hours swaps
+            # imports swaps added since the last run
+            db.SqlSource().populate_pgsqldb_incremental()
+    except Exception as e:
+        return default.result(msg=e, loglevel="warning")
+
+
+@router.on_event("startup")
+@repeat_every(seconds=3600)
+@timed
+def reconcile_pgsqldb_loop():
+    try:
+        if memcache.get("testing") is None:
+            # reconciles today's swaps, including rows updated in place
             today = datetime.today().date()
             db.SqlSource().import_swaps_for_day(today)
-            yesterday = today - timedelta(days=1)
     except Exception as e:
         return default.result(msg=e, loglevel="warning")
 
@@ -5,6 +5,7 @@ from typing import List, Dict
 from lib.cache import Cache
 from lib.cache_calc import CMC
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from models.generic import ErrorMessage
 from models.cmc import CmcAsset, CmcTrades, CmcSummary, CmcOrderbook, CmcTicker
 from util.cron import cron
@@ -78,6 +79,7 @@ def orderbook(
 ):
     try:
         gecko_source = memcache.get_gecko_source()
+        record_request(pair_str)
         is_reversed = pair_str != sortdata.pair_by_market_cap(
             pair_str, gecko_source=gecko_source
         )
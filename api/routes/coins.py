@@ -1,18 +1,20 @@
 #!/usr/bin/env python3
 from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from typing import List, Dict
+from const import TRUSTED_CACHE_RESPONSES
 from util.cron import cron
 from util.logger import logger
 from models.generic import ErrorMessage, ApiIds
 import db.sqldb as db
+from lib.route_cache import cached_route
 from util.files import Files
 import util.memcache as memcache
 from util.transform import derive
 
 router = APIRouter()
 files = Files()
-query = db.SqlQuery()
 
 @router.get(
     "/api_ids/gecko",
@@ -99,6 +101,7 @@ def top_coins():
     response_model=List[db.DefiSwap],
     status_code=200,
 )
+@cached_route("coins/get_swaps_for_coin")
 def get_swaps_for_coin(
     coin_str: str,
     start_time: int = 0,
@@ -116,6 +119,7 @@ def get_swaps_for_coin(
         if end_time == 0:
             end_time = int(cron.now_utc())
 
+        query = db.SqlQuery()
         resp = query.get_swaps_for_coin(
             start_time=start_time,
             end_time=end_time,
@@ -127,6 +131,10 @@ def get_swaps_for_coin(
             pubkey=pubkey,
             all_variants=all_variants,
         )
+        if TRUSTED_CACHE_RESPONSES:
+            # Rows are read from the DefiSwap table, so already match its
+            # model.
+            return JSONResponse(content=jsonable_encoder(resp))
         return resp
     except Exception as e:  # pragma: no cover
         err = {"error": f"{e}"}
@@ -5,8 +5,11 @@ from fastapi.responses import JSONResponse
 from typing import List
 import db.sqldb as db
 import lib.dex_api as dex
+from lib.cache import cached_response
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from lib.cache_calc import CacheCalc
+from lib.route_cache import cached_route
 from models.generic import ErrorMessage
 from models.gecko import (
     GeckoPairsItem,
@@ -15,8 +18,9 @@ from models.gecko import (
     GeckoHistoricalTrades,
 )
 from util.enums import TradeType
+from util.exceptions import CacheItemNotFound
 from util.logger import logger
-from util.transform import convert, deplatform, derive, invert, sortdata
+from util.transform import convert, deplatform, derive, invert
 import util.memcache as memcache
 import util.validate as validate
 
@@ -49,30 +53,19 @@ def gecko_pairs():
 )
 def gecko_tickers():
     try:
-        data = memcache.get_tickers()
-        resp = {
-            "last_update": int(cron.now_utc()),
-            "pairs_count": data["pairs_count"],
-            "swaps_count": data["swaps_count"],
-            "combined_volume_usd": data["combined_volume_usd"],
-            "combined_liquidity_usd": data["combined_liquidity_usd"],
-            "data": [],
-        }
-        gecko_source = memcache.get_gecko_source()
-        for depair in data["data"]:
-            std_pair = sortdata.pair_by_market_cap(depair, gecko_source=gecko_source)
-            if depair == std_pair:
-                resp["data"].append(data["data"][depair])
-            elif invert.pair(depair) in data["data"]:
-                logger.warning(
-                    f"Non standard {depair} exists in memcache.get_tickers(), should be {std_pair}"
-                )                
-            else:
-                logger.warning(
-                    f"{depair} not found in memcache.get_tickers()"
-                )
-                # TODO: This should be threaded to avoid blocking
-                # db_update.fix_swap_pair(depair, pgdb_query)
+        cached = cached_response("gecko_tickers")
+        if cached is not None:
+            return cached
+        # Standardised when the tickers cache is saved
+        resp = memcache.get_gecko_tickers()
+        if resp is None:
+            # Not persisted, so standardised from the tickers file until
+            # the tickers cache is next saved (e.g. after a restart)
+            tickers = memcache.get_tickers()
+            if tickers is None:
+                raise CacheItemNotFound("tickers not yet cached")
+            gecko_source = memcache.get_gecko_source()
+            resp = convert.tickers_to_gecko(tickers, gecko_source=gecko_source)
         return resp
     except Exception as e:  # pragma: no cover
         logger.warning(f"{type(e)} Error in [/api/v3/gecko/tickers]: {e}")
@@ -93,14 +86,14 @@ def gecko_orderbook(
 ):
     # No extras needed, but cache combines variants.
     try:
-        book = memcache.get_pairs_orderbook_extended()
+        record_request(pair_str)
         depair = deplatform.pair(pair_str)
-        if depair in book["orderbooks"]:
-            data = book["orderbooks"][depair]["ALL"]
-            return convert.orderbook_to_gecko(data, depth=depth)
-        elif invert.pair(depair) in book["orderbooks"]:
-            data = book["orderbooks"][invert.pair(depair)]["ALL"]
-            return convert.orderbook_to_gecko(data, depth=depth, reverse=True)
+        book = memcache.get_pair_orderbook(depair)
+        if book is not None:
+            return convert.orderbook_to_gecko(book["ALL"], depth=depth)
+        book = memcache.get_pair_orderbook(invert.pair(depair))
+        if book is not None:
+            return convert.orderbook_to_gecko(book["ALL"], depth=depth, reverse=True)
         # Use direct method if no cache.
         variant_cache_name = f"orderbook_{pair_str}"
         coins_config = memcache.get_coins_config()
@@ -141,6 +134,7 @@ def gecko_orderbook(
     responses={406: {"model": ErrorMessage}},
     status_code=200,
 )
+@cached_route("gecko/historical_trades")
 def gecko_historical_trades(
     response: Response,
     trade_type: TradeType = TradeType.ALL,
@@ -167,6 +161,7 @@ def gecko_historical_trades(
             limit=limit,
             start_time=start_time,
             end_time=end_time,
+            trade_type=trade_type,
         )["ALL"]
         base, target = derive.base_quote(pair_str=pair_str)
         resp = {
@@ -5,6 +5,7 @@ from fastapi.responses import JSONResponse
 from typing import Optional
 import db.sqldb as db
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from models.generic import ErrorMessage
 from util.enums import TradeType
 from util.logger import logger
@@ -63,6 +64,7 @@ def pairs_last_traded(pair_str: str = ""):
 )
 def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     try:
+        record_request(pair_str)
         pair = Pair(pair_str=pair_str)
         return pair.orderbook(pair_str=pair_str, depth=depth)
     except Exception as e:  # pragma: no cover
@@ -102,6 +104,7 @@ def historical_trades(
             limit=limit,
             start_time=start_time,
             end_time=end_time,
+            trade_type=trade_type,
         )
         return data
     except Exception as e:  # pragma: no cover
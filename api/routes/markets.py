@@ -19,8 +19,11 @@ from models.markets import (
     MarketsSummaryForTicker,
     MarketsTickerItem,
 )
+from lib.cache import cached_response
 from lib.cache_calc import CacheCalc
+from lib.route_cache import cached_route
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from lib.markets import Markets
 from routes.metadata import markets_desc
 from util.enums import TradeType
@@ -66,6 +69,7 @@ def fiat_rates():
 )
 def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     try:
+        record_request(pair_str)
         gecko_source = memcache.get_gecko_source()
         is_reversed = pair_str != sortdata.pair_by_market_cap(
             pair_str, gecko_source=gecko_source
@@ -103,6 +107,9 @@ def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
 )
 def summary():
     try:
+        cached = cached_response("markets_summary")
+        if cached is not None:
+            return cached
         data = memcache.get_markets_summary()
         # TODO: remove this when dashboard updates
         for i in data:
@@ -369,6 +376,7 @@ def tickers_summary():
     response_model=List[PairTrades],
     description="Trades for the last 'x' days for a pair in `KMD_LTC` format.",
 )
+@cached_route("markets/trades")
 def trades(pair_str: str = "KMD_LTC", days_in_past: int = 5):
     try:
         for value, name in [(days_in_past, "days_in_past")]:
@@ -407,6 +415,7 @@ def usd_volume_24h():
     "/volumes_ticker/{coin}/{days_in_past}",
     description="Daily coin volume (e.g. `KMD, KMD-BEP20, KMD-ALL`) traded last 'x' days.",
 )
+@cached_route("markets/volumes_ticker")
 def volumes_ticker(coin="KMD", days_in_past=1, trade_type: TradeType = TradeType.ALL):
     try:
         volumes_dict = {}
@@ -260,6 +260,7 @@ def historical_trades(
             limit=limit,
             start_time=start_time,
             end_time=end_time,
+            trade_type=trade_type,
         )
 
         if variant.lower() in data:
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from lib.route_cache import cached_route
+from lib.orderbook_schedule import OrderbookSchedule, record_request
 from models.generic import ErrorMessage
+from util.logger import logger
+from util.transform import deplatform, invert
+import db.sqldb as db
 import util.memcache as memcache
+import util.validate as validate
 
 router = APIRouter()
 
@@ -26,6 +33,39 @@ def orderbook_extended():
     return memcache.get_pairs_orderbook_extended()
 
 
+@router.get(
+    "/orderbook_extended/{pair_str}",
+    description="Returns the cached variant orderbooks for a single pair (e.g. `KMD_LTC`)",
+    responses={406: {"model": ErrorMessage}},
+    status_code=200,
+)
+def pair_orderbook_extended(pair_str: str = "KMD_LTC"):
+    try:
+        record_request(pair_str)
+        depair = deplatform.pair(pair_str)
+        book = memcache.get_pair_orderbook(depair)
+        if book is None:
+            # Books are cached in their standard orientation only
+            book = memcache.get_pair_orderbook(invert.pair(depair))
+        if book is None:
+            raise ValueError(f"No cached orderbook for {pair_str}")
+        return book
+    except Exception as e:  # pragma: no cover
+        err = {"error": f"{e}"}
+        logger.warning(err)
+        return JSONResponse(status_code=400, content=err)
+
+
+@router.get(
+    "/orderbook_staleness",
+    description="Seconds since each pair's orderbook was refreshed, against its refresh interval",
+    responses={406: {"model": ErrorMessage}},
+    status_code=200,
+)
+def orderbook_staleness():
+    return OrderbookSchedule().staleness()
+
+
 @router.get(
     "/prices_24hr",
     description="",
@@ -54,3 +94,27 @@ def volumes_14d():
 )
 def volumes_24hr():
     return memcache.get_pair_volumes_24hr()
+
+
+@router.get(
+    "/candles/{pair_str}",
+    description="OHLCV candles for a pair (e.g. `KMD_LTC`, or a variant like"
+    " `KMD_LTC-segwit`) at a `1m`, `5m`, `1h` or `1d` interval, oldest first."
+    " Only intervals with trades are returned. Defaults to the last 1000 intervals.",
+    responses={406: {"model": ErrorMessage}},
+    status_code=200,
+)
+@cached_route("pairs/candles")
+def candles(
+    pair_str: str = "KMD_LTC", interval: str = "1h", start_time: int = 0, end_time: int = 0
+):
+    try:
+        validate.pair(pair_str)
+        start_time, end_time = validate.candles_request(interval, start_time, end_time)
+        return db.SqlQuery().pair_candles(
+            pair_str=pair_str, interval=interval, start_time=start_time, end_time=end_time
+        )
+    except Exception as e:
+        err = {"error": f"{e}"}
+        logger.warning(err)
+        return JSONResponse(status_code=400, content=err)
@@ -5,6 +5,7 @@ from typing import List
 from lib.cache import Cache
 from lib.cache_calc import CacheCalc
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from models.generic import ErrorMessage
 from models.stats_api import (
     StatsApiAtomicdexIo,
@@ -93,6 +94,21 @@ def atomicdex_all():
         return {"error": msg}
 
 
+@router.get("/swap_durations")
+def swap_durations():
+    """
+    Swap duration percentiles per coin, pair and gui over the last 30 days
+    (DURATION_STATS_DAYS). Failure adjusted percentiles count failed swaps
+    as never settled.
+    """
+    try:
+        return CacheCalc().swap_durations()
+    except Exception as e:  # pragma: no cover
+        msg = f"{type(e)} Error in [/api/v3/stats-api/swap_durations]: {e}"
+        logger.warning(msg)
+        return {"error": msg}
+
+
 # TODO: Cache this
 @router.get(
     "/summary",
@@ -138,6 +154,7 @@ def orderbook(
 ):
     try:
         gecko_source = memcache.get_gecko_source()
+        record_request(pair_str)
         is_reversed = pair_str != sortdata.pair_by_market_cap(
             pair_str, gecko_source=gecko_source
         )
@@ -3,7 +3,9 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from typing import Dict, List
+from lib.cache import cached_response
 from lib.pair import Pair
+from lib.orderbook_schedule import record_request
 from lib.cache_calc import CacheCalc
 from models.generic import ErrorMessage
 from models.stats_xyz import (
@@ -83,6 +85,7 @@ def fiat_rates():
 )
 def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
     try:
+        record_request(pair_str)
         gecko_source = memcache.get_gecko_source()
         # Where a non standard pair is requested
         # we need to invert some values.
@@ -124,6 +127,9 @@ def orderbook(pair_str: str = "KMD_LTC", depth: int = 100):
 )
 def summary():
     try:
+        cached = cached_response("stats_xyz_summary")
+        if cached is not None:
+            return cached
         data = memcache.get_pairs_orderbook_extended()
         resp = []
         for depair in data["orderbooks"]:
@@ -271,6 +277,7 @@ def trades(pair_str: str = "KMD_LTC", days_in_past: int | None = None):
 
         pair = Pair(pair_str=pair_str)
         data = pair.historical_trades(
+            limit=0,
             start_time=start_time,
             end_time=end_time,
         )["ALL"]
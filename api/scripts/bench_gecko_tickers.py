@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import statistics
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+from fastapi.testclient import TestClient
+from lib.cache import CacheItem
+from main import app
+from util.files import Files
+from util.transform import convert
+import util.memcache as memcache
+
+
+def synthetic_tickers(pair_count: int):
+    data = {}
+    for i in range(pair_count):
+        depair = f"AAA{i}_BBB{i}"
+        data[depair] = {
+            "ticker_id": depair,
+            "pool_id": depair,
+            "base_currency": f"AAA{i}",
+            "target_currency": f"BBB{i}",
+            "base_volume": "1.0000000000",
+            "target_volume": "1.0000000000",
+            "bid": "0.9900000000",
+            "ask": "1.0100000000",
+            "high": "1.0200000000",
+            "low": "0.9800000000",
+            "trades_24hr": "7",
+            "last_price": "1.0000000000",
+            "last_trade": "1777777777",
+            "volume_usd_24hr": "1.0000000000",
+            "liquidity_usd": "100.0000000000",
+            "variants": [depair],
+        }
+    return {
+        "last_update": int(time.time()),
+        "pairs_count": pair_count,
+        "swaps_count": pair_count * 7,
+        "combined_volume_usd": pair_count,
+        "combined_liquidity_usd": pair_count * 100,
+        "data": data,
+    }
+
+
+def median_ms(fn, requests: int):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    desc = "Times gecko/tickers requests against synthetic tickers caches of growing size."
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument("--pairs", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    gecko_source = Files().load_jsonfile(f"{API_ROOT_PATH}/tests/fixtures/gecko/source.json")
+    print(f"{'pairs':>8} {'build (ms)':>12} {'request (ms)':>14}")
+    for pair_count in args.pairs:
+        tickers = synthetic_tickers(pair_count)
+        item = CacheItem(name="tickers", gecko_source=gecko_source)
+        # What each request used to do, now done once per cache refresh
+        build = median_ms(
+            lambda: convert.tickers_to_gecko(tickers, gecko_source=gecko_source), 3
+        )
+        memcache.set_tickers(tickers)
+        gecko_tickers = item.save_gecko_tickers(tickers)
+        item.save_responses(tickers, gecko_tickers=gecko_tickers)
+        request = median_ms(lambda: client.get("/api/v3/gecko/tickers"), args.requests)
+        print(f"{pair_count:>8} {build:>12.3f} {request:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import statistics
+
+API_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(API_ROOT_PATH)
+import util.memcache as memcache
+
+
+def synthetic_book(depair: str, depth: int):
+    base, quote = depair.split("_")
+    book = {
+        "pair": depair,
+        "base": base,
+        "quote": quote,
+        "liquidity_usd": 1000.0,
+        "trade_volume_usd": 100.0,
+        "bids": [
+            {"price": f"{1 - i / 1000:.10f}", "volume": "1.0000000000"}
+            for i in range(depth)
+        ],
+        "asks": [
+            {"price": f"{1 + i / 1000:.10f}", "volume": "1.0000000000"}
+            for i in range(depth)
+        ],
+    }
+    return {"ALL": book, depair: book}
+
+
+def populate(pair_count: int, depth: int):
+    orderbooks = {
+        f"BASE{i}_QUOTE": synthetic_book(f"BASE{i}_QUOTE", depth)
+        for i in range(pair_count)
+    }
+    memcache.set_pairs_orderbook_extended({"orderbooks": orderbooks})
+    memcache.set_pair_orderbooks(orderbooks)
+    return list(orderbooks.keys())
+
+
+def time_lookups(fn, depairs, requests: int):
+    timings = []
+    for i in range(requests):
+        depair = depairs[i % len(depairs)]
+        start = time.perf_counter()
+        book = fn(depair)
+        timings.append((time.perf_counter() - start) * 1000)
+        if book is None:
+            raise ValueError(f"{depair} missing from memcache")
+    return statistics.median(timings)
+
+
+def combined_lookup(depair):
+    return memcache.get_pairs_orderbook_extended()["orderbooks"].get(depair)
+
+
+def main():
+    desc = "Compares single pair orderbook lookups from the combined and per pair keys."
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument("--pairs", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--depth", type=int, default=20, help="Orders per side")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>8} {'combined (ms)':>15} {'per pair (ms)':>15}")
+    for pair_count in args.pairs:
+        depairs = populate(pair_count, args.depth)
+        combined = time_lookups(combined_lookup, depairs, args.requests)
+        per_pair = time_lookups(memcache.get_pair_orderbook, depairs, args.requests)
+        print(f"{pair_count:>8} {combined:>15.3f} {per_pair:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
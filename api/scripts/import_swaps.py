@@ -28,11 +28,28 @@ def main():
     parser.add_argument('--start', type=parse_date, help='Start date in YYYY-M-D format', default="2019-9-1")
     parser.add_argument('--end', type=parse_date, help='End date in YYYY-M-D format', default=today)
     parser.add_argument('--reset_table', action='store_true', help='Warning: This will dump the table, then recreate it empty.')
+    parser.add_argument('--build_candles', action='store_true', help='Only rebuild pair candles from swaps already imported.')
+    parser.add_argument('--build_pubkey_sketches', action='store_true', help='Only backfill daily pubkey sketches from swaps already imported.')
     if len(sys.argv)==1:
         parser.print_help(sys.stderr)
         sys.exit(1)
 
     args = parser.parse_args()
+    # Normally created when the cache loops start
+    db.SqlUpdate().create_tables()
+    if args.build_candles:
+        logger.info(f"Building pair candles between {args.start} and {args.end}...")
+        start_time = int(datetime.combine(args.start, datetime.min.time()).timestamp())
+        end_time = int(datetime.combine(args.end, datetime.min.time()).timestamp()) + 86400
+        db.SqlUpdate().build_pair_candles(start_time=start_time, end_time=end_time)
+        return
+    if args.build_pubkey_sketches:
+        logger.info(f"Building pubkey sketches between {args.start} and {args.end}...")
+        start_time = int(datetime.combine(args.start, datetime.min.time()).timestamp())
+        end_time = int(datetime.combine(args.end, datetime.min.time()).timestamp()) + 86400
+        db.SqlUpdate().build_pubkey_sketches(start_time=start_time, end_time=end_time)
+        return
+
     logger.info(f"Importing swaps between {args.start} and {args.end}...")
         
     DB = db.SqlSource()
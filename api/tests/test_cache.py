@@ -1,5 +1,8 @@
 from lib.cache import Cache
+import routes.gecko as gecko
+from util.files import Files
 from util.logger import logger
+import util.memcache as memcache
 
 
 def test_cache():
@@ -16,6 +19,7 @@ def test_cache():
         "pairs_orderbook_extended",
         "markets_summary",
         "stats_api_summary",
+        "swap_durations",
         "adex_24hr",
         "adex_fortnite",
         "adex_weekly",
@@ -28,3 +32,64 @@ def test_cache():
         data = cache_item.save()
         logger.calc(f"Testing {i}")
         assert "error" not in data
+
+
+def test_cache_item_skip_unchanged():
+    cache = Cache()
+    cache_item = cache.get_item("pair_volumes_alltime")
+    assert cache_item.skip_unchanged(None) is False
+    assert cache.get_item("tickers").fingerprint() is None
+    fingerprint = cache_item.fingerprint()
+    assert "count" in fingerprint
+    assert "gecko_source" in fingerprint
+    data = cache_item.save()
+    assert "error" not in data
+    assert cache_item.skip_unchanged(fingerprint)
+    data = cache_item.save()
+    assert data["message"].endswith("skipped rebuild")
+    fingerprint.update({"count": -1})
+    assert cache_item.skip_unchanged(fingerprint) is False
+
+
+def test_save_gecko_tickers():
+    files = Files()
+    gecko_source = files.load_jsonfile(files.gecko_source)
+    tickers = {
+        "last_update": 1777777777,
+        "pairs_count": 2,
+        "swaps_count": 3,
+        "combined_volume_usd": 100,
+        "combined_liquidity_usd": 1000,
+        "data": {
+            "KMD_LTC": {"ticker_id": "KMD_LTC"},
+            "LTC_KMD": {"ticker_id": "LTC_KMD"},
+        },
+    }
+    item = Cache().get_item("tickers")
+    item._gecko_source = gecko_source
+    resp = item.save_gecko_tickers(tickers)
+    # Only the market cap standardised pair is kept
+    assert [i["ticker_id"] for i in resp["data"]] == ["KMD_LTC"]
+    assert memcache.get_gecko_tickers() == resp
+
+
+def test_gecko_tickers_fallback(monkeypatch):
+    files = Files()
+    gecko_source = files.load_jsonfile(files.gecko_source)
+    tickers = {
+        "pairs_count": 2,
+        "swaps_count": 3,
+        "combined_volume_usd": 100,
+        "combined_liquidity_usd": 1000,
+        "data": {
+            "KMD_LTC": {"ticker_id": "KMD_LTC"},
+            "LTC_KMD": {"ticker_id": "LTC_KMD"},
+        },
+    }
+    # Not yet standardised since a restart
+    monkeypatch.setattr(gecko, "cached_response", lambda name: None)
+    monkeypatch.setattr(memcache, "get_gecko_tickers", lambda: None)
+    monkeypatch.setattr(memcache, "get_tickers", lambda: tickers)
+    monkeypatch.setattr(memcache, "get_gecko_source", lambda: gecko_source)
+    resp = gecko.gecko_tickers()
+    assert [i["ticker_id"] for i in resp["data"]] == ["KMD_LTC"]
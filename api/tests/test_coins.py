@@ -10,6 +10,8 @@ from tests.fixtures_coin import (
     setup_coin_atom,
     setup_coin_bad,
 )
+from lib.cache_calc import CacheCalc
+import lib.coins as coins
 import util.helper as helper
 import util.memcache as memcache
 from util.transform import derive
@@ -45,3 +47,23 @@ def test_coin(
     assert setup_coin_ltc.usd_price > 0
     assert setup_coin_kmd.is_priced
     assert not setup_coin_doc.is_priced
+
+
+def test_coins_registry():
+    registry = coins.get_coins()
+    assert coins.get_coins() is registry
+    assert "KMD" in registry.priced_tickers
+    assert "DOC" not in registry.priced_tickers
+    assert "LTC" in registry.segwit_tickers
+    assert "ATOM" in registry.wallet_only_tickers
+    assert registry.pair_is_priced("KMD_LTC")
+    assert not registry.pair_is_priced("DOC_LTC")
+
+    # A gecko_source refresh rebuilds the registry once, for all users
+    builds = coins._REGISTRY["builds"]
+    record = memcache.get_fingerprint("gecko_source") or {"version": 0}
+    memcache.set_fingerprint("gecko_source", {**record, "version": record["version"] + 1})
+    CacheCalc().pairs_last_traded()
+    assert CacheCalc().coins_obj is coins.get_coins()
+    assert coins.get_coins() is not registry
+    assert coins._REGISTRY["builds"] == builds + 1
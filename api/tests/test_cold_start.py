@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import shutil
+import socket
+import subprocess
+import requests
+from const import API_ROOT_PATH, FIXTURES_PATH
+
+# Seconds from launching the server to its first 200, with no services
+COLD_START_TARGET = 5
+# Served from the persisted cache files until memcache is populated
+COLD_START_ROUTE = "/api/v3/markets/summary"
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def offline_env(path):
+    # Nothing listens on these ports
+    closed = str(unused_port())
+    # The cache loops still run, so they save to a copy of the fixtures
+    fixtures = f"{path}/fixtures"
+    shutil.copytree(FIXTURES_PATH, fixtures)
+    env = dict(os.environ)
+    env.update(
+        {
+            "IS_TESTING": "True",
+            "FIXTURES_PATH": fixtures,
+            "FETCH_CACHE_PATH": f"{path}/http",
+            "MEMCACHE_HOST": "127.0.0.1",
+            "MEMCACHE_PORT": closed,
+            "POSTGRES_HOST": "127.0.0.1",
+            "POSTGRES_PORT": closed,
+            "DEXAPI_7777_PORT": closed,
+            "DEXAPI_8762_PORT": closed,
+            "API_PORT": env.get("API_PORT", "7068"),
+        }
+    )
+    return env
+
+
+def test_import_without_services(tmp_path):
+    # Importing the app must not connect to anything
+    code = (
+        "import socket\n"
+        "def refuse(*args, **kwargs):\n"
+        "    raise RuntimeError(f'connection at import: {args}')\n"
+        "socket.socket.connect = refuse\n"
+        "socket.getaddrinfo = refuse\n"
+        "import main\n"
+    )
+    r = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=API_ROOT_PATH,
+        env=offline_env(tmp_path),
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert r.returncode == 0, r.stderr[-2000:]
+
+
+def test_cold_start_without_services(tmp_path):
+    port = unused_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=API_ROOT_PATH,
+        env=offline_env(tmp_path),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        status = None
+        while time.perf_counter() - start < COLD_START_TARGET * 3:
+            try:
+                r = requests.get(f"http://127.0.0.1:{port}{COLD_START_ROUTE}", timeout=5)
+                status = r.status_code
+                if status == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        assert status == 200
+        assert len(r.json()) > 0
+        assert elapsed < COLD_START_TARGET, f"first 200 after {elapsed:.2f}s"
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
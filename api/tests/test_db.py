@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
+import os
+from sqlmodel import Session, update
 from util.cron import cron
+from util.transform import derive
 from decimal import Decimal
-from db.sqldb import SqlSource, SqlQuery
+from datetime import datetime, timezone
+import db.sqldb as sqldb
+import util.defaults as default
+from db.sqldb import SqlSource, SqlQuery, SqlUpdate
+from db.backup_db import export_swaps
 from db.sqlitedb import get_sqlite_db, get_sqlite_db_paths
 from db.sqlitedb_merge import (
     list_sqlite_dbs,
     compare_uuid_fields,
+    get_swap_conflicts,
+    merge_source_dbs,
+    repair_swap_conflicts,
 )
 from tests.fixtures_data import swap_item, swap_item2, cipi_swap, cipi_swap2
 from tests.fixtures_db import (
@@ -13,6 +23,7 @@ from tests.fixtures_db import (
     setup_swaps_db_data,
 )
 import util.helper as helper
+import lib.monthly as monthly
 from util.logger import logger
 
 from const import MM2_DB_PATH_7777, MM2_DB_PATH_8762, MM2_DB_PATH_ALL, DB_MASTER_PATH
@@ -94,6 +105,54 @@ def test_get_swap(setup_swaps_db_data):
     assert "error" in r
 
 
+def test_get_swaps_after_id(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    r = DB.get_swaps_after_id(success_only=False)
+    assert len(r) > len(DB.get_swaps_after_id())
+    ids = [i["id"] for i in r]
+    assert ids == sorted(ids)
+    r = DB.get_swaps_after_id(last_id=ids[3], success_only=False)
+    assert [i["id"] for i in r] == ids[4:]
+    r = DB.get_swaps_after_id(last_id=ids[-1])
+    assert len(r) == 0
+    r = DB.get_swaps_after_id(success_only=False, limit=2)
+    assert [i["id"] for i in r] == ids[:2]
+
+
+def test_incremental_import_keeps_mark_on_failure(monkeypatch):
+    class Source:
+        def __init__(self, **kwargs):
+            pass
+
+        def get_swaps_after_id(self, last_id):
+            return [{"id": last_id + 1}, {"id": last_id + 5}]
+
+    saved = []
+    monkeypatch.setattr(sqldb, "SqlQuery", Source)
+    monkeypatch.setattr(memcache, "get_swap_ingest_hwm", lambda: {"cipi": 10, "mm2": 20})
+    monkeypatch.setattr(memcache, "set_swap_ingest_hwm", lambda data: saved.append(dict(data)))
+    monkeypatch.setattr(
+        SqlSource,
+        "import_cipi_swaps",
+        lambda self, **kwargs: default.error(Exception("pgsql down"), loglevel="warning"),
+    )
+    monkeypatch.setattr(
+        SqlSource, "import_mm2_swaps", lambda self, **kwargs: default.result(msg="ok")
+    )
+    SqlSource(gecko_source={}).populate_pgsqldb_incremental()
+    # Failed cipi swaps stay above the mark, to be retried
+    assert saved == [{"cipi": 10, "mm2": 25}]
+
+
+def test_swap_changed():
+    DB = SqlSource()
+    existing = {"id": 1, "uuid": "x", "price": Decimal("0.1"), "last_updated": 1}
+    new = {"_id": 1, "uuid": "x", "price": Decimal("0.1"), "last_updated": 2}
+    assert not DB.swap_changed(new, existing)
+    new.update({"price": Decimal("0.2")})
+    assert DB.swap_changed(new, existing)
+
+
 def test_is_source_db():
     assert validate.is_source_db("xyz_MM2.db")
     assert not validate.is_source_db("xyz_MM2x.db")
@@ -113,6 +172,87 @@ def test_compare_uuid_fields():
     assert r["finished_at"] == "1700000777"
 
 
+def add_stats_swaps(db_path, swaps):
+    db = get_sqlite_db(db_path=db_path)
+    db.update.create_swap_stats_table()
+    for swap in swaps:
+        cols = [i for i in swap if i not in ["pair", "trade_type", "price", "reverse_price"]]
+        sql = f"INSERT INTO stats_swaps ({','.join(cols)})"
+        sql += f" VALUES ({','.join(['?' for i in cols])});"
+        db.sql_cursor.execute(sql, tuple(swap[i] for i in cols))
+    db.conn.commit()
+    db.close()
+
+
+def test_merge_source_dbs(tmp_path):
+    dest_path = f"{tmp_path}/MM2_all.db"
+    add_stats_swaps(dest_path, [])
+    src_paths = [f"{tmp_path}/{i}_MM2.db" for i in range(3)]
+    add_stats_swaps(src_paths[0], [swap_item])
+    add_stats_swaps(src_paths[1], [swap_item2, {**swap_item, "uuid": "x"}])
+    add_stats_swaps(src_paths[2], [{**swap_item, "uuid": "y", "finished_at": 7}])
+    assert merge_source_dbs(dest_path, src_paths) == 3
+    assert merge_source_dbs(dest_path, src_paths) == 0
+    db = get_sqlite_db(db_path=dest_path)
+    assert len(db.query.get_uuids(success_only=False)) == 3
+    assert db.query.get_swap(swap_item["uuid"])["is_success"] == 1
+    db.close()
+    # Only swaps finished after `since`
+    dest_path = f"{tmp_path}/MM2_8762.db"
+    add_stats_swaps(dest_path, [])
+    assert merge_source_dbs(dest_path, src_paths, since=100) == 2
+
+
+def test_export_swaps(tmp_path):
+    src_path = f"{tmp_path}/MM2.db"
+    dest_path = f"{tmp_path}/backup_MM2.db"
+    add_stats_swaps(src_path, [swap_item, {**swap_item, "uuid": "x", "finished_at": 7}])
+    assert export_swaps(src_path, dest_path) == 2
+    assert export_swaps(src_path, dest_path) == 0
+
+    # New rows, and changed rows within the lookback
+    add_stats_swaps(src_path, [{**swap_item, "uuid": "y"}])
+    db = get_sqlite_db(db_path=src_path)
+    db.update.update_stats_swap_row(swap_item["uuid"], {"taker_coin_usd_price": 51})
+    db.update.update_stats_swap_row("x", {"taker_coin_usd_price": 51})
+    db.close()
+    assert export_swaps(src_path, dest_path) == 2
+    db = get_sqlite_db(db_path=dest_path)
+    assert db.query.get_swap(swap_item["uuid"])["taker_coin_usd_price"] == 51
+    assert db.query.get_swap("x")["taker_coin_usd_price"] == 50
+    db.close()
+
+    # Falls back to a full backup if the source was replaced
+    os.remove(src_path)
+    add_stats_swaps(src_path, [swap_item2])
+    assert export_swaps(src_path, dest_path) == 1
+
+
+def test_swap_conflicts(tmp_path):
+    db_paths = [f"{tmp_path}/MM2_{i}.db" for i in range(3)]
+    rows = [
+        [swap_item],
+        [swap_item2],
+        [{**swap_item2, "uuid": "x", "is_success": "0"}],
+    ]
+    for db_path, swaps in zip(db_paths, rows):
+        add_stats_swaps(db_path, swaps)
+
+    conn = get_swap_conflicts(db_paths)
+    r = conn.execute("SELECT uuid FROM swap_conflicts").fetchall()
+    assert r == [(swap_item["uuid"],)]
+    assert [repair_swap_conflicts(conn, i) for i in db_paths] == [1, 1, 0]
+    assert [repair_swap_conflicts(conn, i) for i in db_paths] == [0, 0, 0]
+    conn.close()
+
+    db = get_sqlite_db(db_path=db_paths[1])
+    r = db.query.get_swap(swap_item["uuid"])
+    assert r["is_success"] == 1
+    assert r["finished_at"] == 1700000777
+    assert r["maker_coin"] == "LTC-segwit"
+    db.close()
+
+
 def test_get_sqlite_db():
     r = get_sqlite_db(netid="7777")
     assert r.db_file == "MM2_7777.db"
@@ -149,6 +289,16 @@ def test_swap_counts(setup_swaps_db_data):
     assert r["swaps_24hr"] == 8
 
 
+def test_swaps_fingerprint(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    r = DB.swaps_fingerprint()
+    assert r["count"] == 14
+    assert r == DB.swaps_fingerprint()
+    r = DB.swaps_fingerprint(start_time=day_ago)
+    assert r["count"] == 8
+    assert r["finished_at"] <= now
+
+
 def test_get_swaps_for_coin(setup_swaps_db_data):
     DB = setup_swaps_db_data
     r = DB.get_swaps_for_coin("KMD")
@@ -204,6 +354,235 @@ def test_coin_trade_vols_usd(setup_swaps_db_data):
     assert vols["ALL"]["trade_volume_usd"] == Decimal(str(1000402.9))
 
 
+def test_monthly_stats_cube(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    cube = DB.monthly_stats_cube(start_time=day_ago, end_time=now + 1)
+    swaps = DB.get_swaps(start_time=day_ago, end_time=now + 1, success_only=False)
+    assert cube["swaps"] == len(swaps)
+    assert cube["swaps"] == sum([i["swap_count"] for i in cube["pairs"].values()])
+    assert cube["guis"]["mpm"]["swap_count"] == 1
+    assert cube["guis"]["mpm"]["pubkey_count"] == 1
+    assert "unknown" not in cube["guis"]
+    item = monthly.monthly_stats_item(1, cube)
+    assert item["total_swaps"] == cube["swaps"]
+    assert len(item["top_pairs"]) <= 5
+    assert item["unique_pubkeys"] == len(cube["pubkeys"])
+
+    cube = DB.monthly_stats_cube(start_time=day_ago, end_time=now + 1, gui="mpm")
+    assert cube["swaps"] == 1
+    cube = DB.monthly_stats_cube(start_time=1, end_time=2)
+    assert cube == monthly.empty_cube()
+
+
+def test_get_month_query_error(monkeypatch):
+    saved = []
+    monkeypatch.setattr(
+        SqlQuery,
+        "monthly_stats_cube",
+        lambda self, **kwargs: default.result(msg="pgsql down", loglevel="warning"),
+    )
+    monkeypatch.setattr(memcache, "set_monthly_stats", lambda *args: saved.append(args))
+    cube = monthly.get_month(2020, 1, refresh=True)
+    assert cube == monthly.empty_cube()
+    assert monthly.monthly_stats_item(1, cube)["total_swaps"] == 0
+    assert saved == []
+
+
+def test_pubkey_trades(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    swaps = DB.get_swaps(start_time=1, success_only=False)
+    with Session(DB.engine) as session:
+        session.exec(update(DB.table).values(maker_pubkey="abc"))
+        session.exec(
+            update(DB.table)
+            .where(DB.table.uuid.in_([i["uuid"] for i in swaps[:3]]))
+            .values(taker_pubkey="abc")
+        )
+        session.exec(
+            update(DB.table)
+            .where(DB.table.uuid == swaps[-1]["uuid"])
+            .values(maker_pubkey="def", taker_pubkey="abc")
+        )
+        session.commit()
+    expected = sorted(swaps, key=lambda i: (i["finished_at"], i["uuid"]), reverse=True)
+    pages = []
+    r = DB.pubkey_trades("abc", limit=4)
+    pages += r["trades"]
+    while r["next_page"] is not None:
+        r = DB.pubkey_trades("abc", limit=4, **r["next_page"])
+        pages += r["trades"]
+    assert [i["uuid"] for i in pages] == [i["uuid"] for i in expected]
+
+    r = DB.pubkey_trades("def")
+    assert [i["uuid"] for i in r["trades"]] == [swaps[-1]["uuid"]]
+    assert r["next_page"] is None
+    r = DB.pubkey_trades("abc", success_only=True, limit=100)
+    assert len(r["trades"]) == len(DB.get_swaps(start_time=1))
+    r = DB.get_swaps(start_time=1, success_only=False, pubkey="def")
+    assert len(r) == 1
+
+
+def test_pubkey_sketches(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.drop("pubkey_sketches_test")
+    pgdb.create_tables()
+    swaps = []
+    for i in range(300):
+        swaps.append(
+            {
+                "is_success": 1,
+                "finished_at": day_ago + i,
+                "pair_std": "KMD_LTC" if i % 2 else "DGB_KMD",
+                "maker_pubkey": f"maker{i % 100}",
+                "maker_gui": "mpm",
+                "taker_pubkey": f"taker{i}",
+                "taker_gui": "unknown",
+            }
+        )
+    swaps.append(dict(swaps[0], is_success=0, maker_pubkey="failed"))
+    pgdb.update_pubkey_sketches(swaps)
+    # Re-importing the same swaps doesn't change counts
+    pgdb.update_pubkey_sketches(swaps[:50])
+    span = {"start_time": day_ago, "end_time": now + 1, "exact": False}
+    r = DB.distinct_pubkeys(**span)
+    assert not r["exact"]
+    assert abs(r["unique_pubkeys"] - 400) <= 400 * r["error"] * 3
+    r = DB.distinct_pubkeys(**span, gui="mpm")
+    assert abs(r["unique_pubkeys"] - 100) <= 100 * r["error"] * 3
+    r = DB.distinct_pubkeys(**span, pair="LTC-segwit_KMD")
+    assert abs(r["unique_pubkeys"] - 200) <= 200 * r["error"] * 3
+    r = DB.distinct_pubkeys(start_time=1, end_time=2, exact=False)
+    assert r["unique_pubkeys"] == 0
+    # pubkeys_by_month merges the sketches of each month
+    month = datetime.fromtimestamp(day_ago, timezone.utc)
+    counts = monthly.unique_pubkeys(month.year, exact=False)
+    assert abs(counts[monthly.month_name(month.year, month.month)] - 400) <= 400 * 0.05
+
+    # Fixture swaps have no pubkeys
+    r = DB.distinct_pubkeys(start_time=day_ago, end_time=now + 1, exact=True)
+    assert r == {"unique_pubkeys": 0, "exact": True, "error": 0}
+
+
+def test_pair_candles(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    pgdb.drop("pair_candles_test")
+    pgdb.create_tables()
+    day = now // 86400 * 86400 - 86400 * 3
+    swaps = [
+        ("AAA_BBB", "buy", 10, 20, 2, day + 60, 1),
+        ("AAA_BBB-segwit", "sell", 15, 5, 3, day + 90, 1),
+        ("AAA_BBB", "buy", 1, 1, 1, day + 3700, 1),
+        ("AAA_BBB", "buy", 1, 50, 50, day + 100, 0),
+    ]
+    swaps = [
+        {
+            "uuid": f"{i:08d}-cand-4000-8000-000000000000",
+            "pair": s[0],
+            "pair_std": "AAA_BBB",
+            "trade_type": s[1],
+            "maker_amount": s[2],
+            "taker_amount": s[3],
+            "price": s[4],
+            "finished_at": s[5],
+            "is_success": s[6],
+            "maker_coin_usd_price": 1,
+            "taker_coin_usd_price": 1,
+        }
+        for i, s in enumerate(swaps)
+    ]
+    with Session(pgdb.engine) as session:
+        session.add_all([pgdb.table(**i) for i in swaps])
+        session.commit()
+    pgdb.update_pair_candles(swaps)
+
+    # Variants are merged for a depair
+    r = DB.pair_candles("AAA_BBB", "1h", start_time=day, end_time=day + 86400)
+    assert [i["start"] for i in r["candles"]] == [day, day + 3600]
+    c = r["candles"][0]
+    assert [c["open"], c["high"], c["low"], c["close"]] == [2, 3, 2, 3]
+    assert [c["base_volume"], c["quote_volume"], c["trades"]] == [15, 35, 2]
+    assert c["volume_usd"] == 15
+    r = DB.pair_candles("AAA_BBB-segwit", "1m", start_time=day, end_time=day + 86400)
+    assert len(r["candles"]) == 1
+    assert r["candles"][0]["start"] == day + 60
+    assert r["candles"][0]["base_volume"] == 5
+    r = DB.pair_candles("BBB_AAA", "1d", start_time=day, end_time=day + 86400)
+    c = r["candles"][0]
+    assert [c["open"], c["high"], c["low"], c["close"]] == [0.5, 1, 1 / 3, 1]
+    assert [c["base_volume"], c["quote_volume"], c["trades"]] == [36, 16, 3]
+
+    # Re-importing doesn't double count, and status changes are applied
+    pgdb.update_pair_candles(swaps[:1])
+    with Session(pgdb.engine) as session:
+        session.exec(
+            update(pgdb.table)
+            .where(pgdb.table.uuid == swaps[1]["uuid"])
+            .values(is_success=0)
+        )
+        session.commit()
+    pgdb.update_pair_candles(swaps[1:2])
+    r = DB.pair_candles("AAA_BBB", "1d", start_time=day, end_time=day + 86400)
+    assert r["candles"][0]["trades"] == 2
+    assert r["candles"][0]["close"] == 1
+    r = DB.pair_candles("AAA_BBB", "1d", start_time=day + 86400, end_time=now)
+    assert r["candles"] == []
+
+
+def test_swap_durations(setup_swaps_db_data):
+    DB = setup_swaps_db_data
+    pgdb = SqlUpdate(db_type="pgsql")
+    start = now - 86400 * 3
+    durations = [(100, 1), (200, 1), (300, 1), (400, 1), (50, 0), (-1, 1)]
+    with Session(pgdb.engine) as session:
+        session.add_all(
+            [
+                pgdb.table(
+                    uuid=f"{i:08d}-dura-4000-8000-000000000000",
+                    pair="DDD_EEE",
+                    pair_std="DDD_EEE",
+                    trade_type="buy",
+                    maker_coin_ticker="DDD",
+                    taker_coin_ticker="EEE",
+                    maker_gui="durations",
+                    taker_gui="durations",
+                    is_success=d[1],
+                    started_at=start + i,
+                    finished_at=start + i + max(d[0], 0),
+                    duration=d[0],
+                )
+                for i, d in enumerate(durations)
+            ]
+        )
+        session.commit()
+    r = DB.swap_durations(start_time=start - 1, end_time=now)
+    for group, key in [
+        ("coins", "DDD"),
+        ("coins", "EEE"),
+        ("pairs", "DDD_EEE"),
+        ("guis", "durations"),
+    ]:
+        assert r[group][key]["successful"] == 4
+        assert r[group][key]["failed"] == 1
+    stats = derive.duration_stats(r["pairs"]["DDD_EEE"])
+    assert [stats["min"], stats["max"], stats["mean"]] == [100, 400, 250]
+    assert stats["success_rate"] == 0.8
+    # Interpolated within the (180, 240] and (300, 420] buckets, capped at
+    # max
+    assert stats["percentiles"]["p50"] == 240
+    assert stats["percentiles"]["p90"] == 360
+    # Failed swaps never settle, so fewer than 90% of swaps settled at all
+    assert stats["failure_adjusted"]["p50"] == 270
+    assert stats["failure_adjusted"]["p90"] is None
+    assert sum(i[1] for i in stats["histogram"]) == 4
+
+
+def test_month_bounds():
+    assert monthly.month_bounds(2023, 12) == (1701388800, 1704067200)
+    assert monthly.month_key(2023, 2, gui="mpm") == "2023_02_gui_mpm"
+
+
 def test_get_uuids(setup_swaps_db_data):
     DB = setup_swaps_db_data
     r = DB.swap_uuids(start_time=1, success_only=True)
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
+import json
 import time
+from decimal import Decimal
 import lib.dex_api as dex
 import util.memcache as memcache
 from util.logger import logger
+from util.transform import clean
 
 coins_config = memcache.get_coins_config()
 gecko_source = memcache.get_gecko_source()
@@ -76,3 +79,44 @@ def test_get_orderbook():
     assert isinstance(r["bids"][0], dict)
     assert "volume" in r["asks"][0]
     assert "price" in r["bids"][0]
+
+
+def test_orderbook_precision():
+    """
+    Values are parsed once and formatted at the cache boundary,
+    so totals are exact to 10dp rather than passing through float.
+    """
+    prices = {"KMD": {"usd_price": 0.3312345678912}, "LTC": {"usd_price": 71.23456789}}
+    vols = [f"{1234567 + i * 7}.123456789012345678" for i in range(6)]
+    book = {
+        "base": "KMD",
+        "rel": "LTC",
+        "bids": [],
+        "asks": [
+            {
+                "price": {"decimal": f"0.00{47 + i}11234567891234"},
+                "base_max_volume": {"decimal": v},
+                "rel_max_volume": {"decimal": str(Decimal(f"0.00{47 + i}1") * Decimal(v))},
+            }
+            for i, v in enumerate(vols)
+        ],
+    }
+    for i in ["total_asks_base_vol", "total_asks_rel_vol"]:
+        book[i] = {"decimal": "0"}
+    for i in ["total_bids_base_vol", "total_bids_rel_vol"]:
+        book[i] = {"decimal": "0"}
+    r = dex.orderbook_extras("KMD_LTC", book, prices, {})
+    r = clean.orderbook_data(json.loads(json.dumps(clean.decimal_dicts(clean.orderbook_data(r)))))
+    # Levels match the previous Decimal based output
+    assert r["asks"][0]["price"] == "0.0047112346"
+    assert r["asks"][0]["volume"] == "1234567.1234567890"
+    assert r["asks"][5]["volume"] == "1234602.1234567890"
+    total = sum(Decimal(i) for i in vols)
+    assert r["total_asks_base_vol"] == f"{total:.10f}" == "7407507.7407407341"
+    usd = total * Decimal(0.3312345678912)
+    assert r["base_liquidity_usd"] == f"{usd:.10f}"
+    assert r["lowest_ask"] == "0.0047112346"
+    # Previously rounded through float, within one unit of the last place
+    assert abs(Decimal(r["total_asks_base_vol"]) - Decimal("7407507.7407407342")) <= Decimal(
+        "1e-10"
+    )
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+import json
+import time
+import hashlib
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import lib.external as external
+from lib.external import CoinGeckoAPI
+from util.fetch import Fetcher, ResponseCache, seconds_until
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        upstream = self.server.upstream
+        route = upstream.routes.get(urlsplit(self.path).path)
+        with upstream.lock:
+            upstream.hits[self.path] = upstream.hits.get(self.path, 0) + 1
+            hit = upstream.hits[self.path]
+        if route is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        time.sleep(route["delay"])
+        if hit <= route["failures"]:
+            self.send_response(route["status"])
+            for k, v in route["error_headers"].items():
+                self.send_header(k, v)
+            self.end_headers()
+            return
+
+        body = route["body"]
+        if callable(body):
+            body = body(parse_qs(urlsplit(self.path).query))
+        body = json.dumps(body).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        with upstream.lock:
+            upstream.downloads[self.path] = upstream.downloads.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        for k, v in route["headers"].items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Upstream:
+    """Local stand in for upstream JSON APIs, counting requests per URL"""
+
+    def __init__(self):
+        self.routes = {}
+        self.hits = {}
+        self.downloads = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamHandler)
+        self.server.daemon_threads = True
+        self.server.upstream = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def route(
+        self,
+        path,
+        body,
+        delay=0,
+        failures=0,
+        status=429,
+        headers=None,
+        error_headers=None,
+    ):
+        self.routes[path] = {
+            "body": body,
+            "delay": delay,
+            "failures": failures,
+            "status": status,
+            "headers": headers or {},
+            "error_headers": error_headers or {},
+        }
+        return f"{self.url}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def fetch(tmp_path):
+    yield Fetcher(cache=ResponseCache(str(tmp_path)), backoff=0.01)
+
+
+def test_conditional_requests(upstream, fetch, tmp_path):
+    url = upstream.route("/data", {"a": 1})
+    assert fetch.get_json(url) == {"a": 1}
+    assert fetch.get_json(url) == {"a": 1}
+    assert upstream.hits["/data"] == 2
+    assert upstream.downloads["/data"] == 1
+
+    # Validators persist on disk for the next process
+    restarted = Fetcher(cache=ResponseCache(str(tmp_path)))
+    assert restarted.get_json(url) == {"a": 1}
+    assert upstream.hits["/data"] == 3
+    assert upstream.downloads["/data"] == 1
+
+    upstream.route("/data", {"a": 2})
+    assert fetch.get_json(url) == {"a": 2}
+    assert upstream.downloads["/data"] == 2
+
+
+def test_fresh_responses_skip_requests(upstream, fetch):
+    url = upstream.route("/fresh", [1, 2], headers={"Cache-Control": "max-age=60"})
+    for _ in range(3):
+        assert fetch.get_json(url) == [1, 2]
+    assert upstream.hits["/fresh"] == 1
+
+    url = upstream.route("/stored", [3], headers={"Cache-Control": "no-store, max-age=60"})
+    for _ in range(3):
+        assert fetch.get_json(url, max_age=60) == [3]
+    assert upstream.hits["/stored"] == 1
+
+    url = upstream.route("/uncached", [4])
+    for _ in range(3):
+        assert fetch.get_json(url) == [4]
+    assert upstream.hits["/uncached"] == 3
+
+
+def test_retry_after(upstream, fetch):
+    url = upstream.route("/limited", {"ok": True}, failures=2, error_headers={"Retry-After": "0"})
+    start = time.perf_counter()
+    assert fetch.get_json(url) == {"ok": True}
+    assert upstream.hits["/limited"] == 3
+    assert time.perf_counter() - start < 1
+
+    # Delays are capped by the attempt count
+    url = upstream.route("/down", {"ok": True}, failures=10, status=503)
+    with pytest.raises(Exception):
+        fetch.get_json(url)
+    assert upstream.hits["/down"] == fetch.retries + 1
+
+    url = upstream.route("/missing", {"ok": True}, failures=10, status=404)
+    with pytest.raises(Exception):
+        fetch.get_json(url)
+    assert upstream.hits["/missing"] == 1
+
+
+def test_stale_on_error(upstream, fetch):
+    url = upstream.route("/stale", {"a": 1})
+    assert fetch.get_json(url) == {"a": 1}
+    upstream.route("/stale", {"a": 2}, failures=100, status=500)
+    assert fetch.get_json(url) == {"a": 1}
+    assert upstream.hits["/stale"] == 1 + fetch.retries + 1
+
+
+def test_rate_limit_holds_host(upstream, fetch):
+    url = upstream.route(
+        "/quota",
+        {"a": 1},
+        headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0.3"},
+    )
+    fetch.get_json(url)
+    start = time.perf_counter()
+    fetch.get_json(url)
+    assert time.perf_counter() - start >= 0.25
+
+
+def test_get_many_concurrency(upstream, tmp_path):
+    delay = 0.2
+    urls = [upstream.route(f"/slow/{i}", {"i": i}, delay=delay) for i in range(8)]
+    urls.append(upstream.route("/broken", {}, failures=10, status=404))
+    fetch = Fetcher(cache=ResponseCache(str(tmp_path)), max_workers=4)
+    start = time.perf_counter()
+    data = fetch.get_many(urls)
+    elapsed = time.perf_counter() - start
+    assert data[:8] == [{"i": i} for i in range(8)]
+    assert data[8] is None
+    assert all(upstream.hits[f"/slow/{i}"] == 1 for i in range(8))
+    # Two rounds of four, rather than eight in sequence
+    assert elapsed < delay * 4
+
+
+def test_seconds_until():
+    assert seconds_until(None) is None
+    assert seconds_until("nonsense") is None
+    assert seconds_until("2.5") == 2.5
+    assert 9 < seconds_until(str(time.time() + 10)) <= 10
+    assert seconds_until("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_gecko_fetch_source_data(upstream, fetch, monkeypatch):
+    def prices(query):
+        ids = query["ids"][0].split(",")
+        return {i: {"usd": 2.5, "usd_market_cap": 1000} for i in ids}
+
+    upstream.route("/simple/price", prices)
+    monkeypatch.setattr(external, "PRICE_CHUNK_SIZE", 5)
+    gecko = CoinGeckoAPI(fetch_handler=fetch, base_url=upstream.url)
+    chunks = len(gecko.coin_ids) // 5 + (len(gecko.coin_ids) % 5 > 0)
+
+    data = gecko.fetch_source_data()
+    assert data["KMD"]["usd_price"] == 2.5
+    assert data["KMD"]["usd_market_cap"] == 1000
+    assert len(upstream.hits) == chunks
+    assert sum(upstream.downloads.values()) == chunks
+
+    # Unchanged prices are only revalidated
+    assert gecko.fetch_source_data() == data
+    assert sum(upstream.hits.values()) == chunks * 2
+    assert sum(upstream.downloads.values()) == chunks
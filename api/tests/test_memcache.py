@@ -1 +1,45 @@
+import inspect
+from types import SimpleNamespace
+import routes.cache_loop as cache_loop
 import util.memcache as memcache
+
+
+def test_pair_orderbooks():
+    books = {
+        "KMD_LTC": {"ALL": {"pair": "KMD_LTC", "bids": [], "asks": []}},
+        "DGB_KMD": {"ALL": {"pair": "DGB_KMD", "bids": [], "asks": []}},
+    }
+    assert memcache.set_pair_orderbooks(books) == []
+    assert memcache.get_pair_orderbook("KMD_LTC") == books["KMD_LTC"]
+    assert memcache.get_pair_orderbook("DGB_KMD")["ALL"]["pair"] == "DGB_KMD"
+    assert memcache.get_pair_orderbook("LTC_DGB") is None
+    assert memcache.set_pair_orderbooks({}) == []
+
+
+def test_pair_orderbooks_dropped():
+    book = {"ALL": {"pair": "KMD_LTC", "bids": [], "asks": []}}
+    memcache.set_pair_orderbooks({"KMD_LTC": book, "DGB_KMD": book}, live={"KMD_LTC", "DGB_KMD"})
+    # A later batch only stores some of the live pairs
+    memcache.set_pair_orderbooks({}, live={"KMD_LTC", "DGB_KMD"})
+    assert memcache.get_pair_orderbook("DGB_KMD") == book
+    memcache.set_pair_orderbooks({"KMD_LTC": book}, live={"KMD_LTC"})
+    assert memcache.get_pair_orderbook("KMD_LTC") == book
+    assert memcache.get_pair_orderbook("DGB_KMD") is None
+
+
+def test_persisted_fallback_does_not_block_rebuilds(monkeypatch):
+    saved = []
+    monkeypatch.setattr(memcache, "persisted", lambda name: {"from": "file"})
+    monkeypatch.setattr(
+        cache_loop,
+        "CacheItem",
+        lambda name: SimpleNamespace(save=lambda: saved.append(name)),
+    )
+    for name in ["cmc_assets_source", "cmc_assets"]:
+        memcache.client().delete(f"{name}-testing")
+        # Served from the file after a restart...
+        assert memcache.get(name) == {"from": "file"}
+        assert memcache.get(name, fallback=False) is None
+        # ...but still rebuilt, as memcache missed
+        inspect.unwrap(getattr(cache_loop, name))()
+    assert saved == ["cmc_assets_source", "cmc_assets"]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import copy
+import pytest
+import lib.cache_calc as cache_calc
+import lib.orderbook_schedule as schedule
+import util.memcache as memcache
+from benchmarks.fakes import MockMm2
+from const import MM2_RPC_HOSTS, MM2_RPC_PORTS, ORDERBOOK_REFRESH_MAX, ORDERBOOK_REFRESH_MIN
+from lib.dex_api import DexAPI
+from lib.orderbook_schedule import OrderbookSchedule, record_book, record_request
+from util.transform import convert, derive
+
+CYCLE = 15
+HOUR = 3600
+BUDGET = 6
+
+HOT = ["KMD_LTC", "KMD_BTC", "DGB_KMD"]
+REQUESTED = ["DOGE_KMD", "KMD_MATIC"]
+CHURN = "CHURN_KMD"
+IDLE = [f"IDLE{i}_KMD" for i in range(30)]
+PAIRS = HOT + REQUESTED + [CHURN] + IDLE
+VOLUMES = {i: 500000 for i in HOT}
+
+
+@pytest.fixture
+def mock_mm2(monkeypatch):
+    mm2 = MockMm2().start()
+    for i in list(MM2_RPC_HOSTS):
+        monkeypatch.setitem(MM2_RPC_HOSTS, i, mm2.host)
+        monkeypatch.setitem(MM2_RPC_PORTS, i, mm2.port)
+    schedule._drain()
+    yield mm2
+    mm2.stop()
+
+
+def simulate(mm2, select, mark=None, duration=HOUR):
+    """
+    Runs refresh cycles against the mock mm2, returning when each pair
+    was refreshed and the RPC calls made in each cycle.
+    """
+    refreshed = {i: [] for i in PAIRS}
+    calls = []
+    for now in range(0, duration, CYCLE):
+        for i in REQUESTED:
+            # 12 requests a minute
+            for _ in range(3):
+                record_request(i)
+        book = copy.deepcopy(mm2.template)
+        book["asks"][0]["price"]["decimal"] = str(30 + now)
+        mm2.books[CHURN] = book
+        before = mm2.requests
+        batch = select(now)
+        for depair in batch:
+            base, quote = derive.base_quote(depair)
+            data = DexAPI().orderbook_rpc(base, quote)
+            record_book(depair, convert.label_bids_asks(data))
+            refreshed[depair].append(now)
+        if mark is not None:
+            mark(batch, now)
+        calls.append(mm2.requests - before)
+    return refreshed, calls
+
+
+def mean_age(times, duration=HOUR, start=HOUR // 4):
+    """Mean seconds since the last refresh, each cycle after warm up"""
+    ages = []
+    for now in range(start, duration, CYCLE):
+        last = [i for i in times if i <= now]
+        ages.append(now - last[-1] if last else duration)
+    return sum(ages) / len(ages)
+
+
+def test_heat_and_interval():
+    sched = OrderbookSchedule(state={})
+    assert sched.interval(sched.heat(0, 0, 0)) == ORDERBOOK_REFRESH_MAX
+    assert sched.interval(sched.heat(10**7, 0, 1)) == ORDERBOOK_REFRESH_MIN
+    idle = sched.heat(0, 0, 0)
+    assert sched.heat(0, 0, 1) > idle
+    assert sched.heat(50, 0, 0) > idle
+    # Requests alone make a pair as hot as volume does
+    assert sched.heat(0, 100, 0) == sched.heat(10**7, 0, 0)
+
+
+def test_select_within_budget():
+    sched = OrderbookSchedule(budget=10, state={})
+    pairs = [f"COIN{i}_KMD" for i in range(30)]
+    volumes = {"COIN7_KMD": 10**6, "COIN3_KMD": 1000}
+    batch = sched.select(pairs, volumes, cost=lambda x: 2, now=1000)
+    assert len(batch) == 5
+    # Never refreshed, so hottest first
+    assert batch[:2] == ["COIN7_KMD", "COIN3_KMD"]
+    assert sched.state["cycle"]["rpc_calls"] == 10
+    assert sched.state["cycle"]["deferred"] == 25
+    # Only pairs whose refresh succeeded are marked
+    sched.mark_refreshed(batch[:4], now=1000)
+    failed = batch[4]
+
+    # Larger pairs are skipped, rather than exceeding the budget
+    batch = sched.select(pairs, volumes, cost=lambda x: 6 if x == "COIN0_KMD" else 3, now=1001)
+    assert "COIN0_KMD" not in batch
+    assert len(batch) == 3
+    # A failed refresh stays due
+    assert failed in batch
+    sched.mark_refreshed(batch, now=1001)
+    # Not due again until their interval has passed
+    assert "COIN7_KMD" not in sched.select(pairs, volumes, cost=lambda x: 1, now=1002)
+
+    # Capped at the pairs which fit in a cycle
+    sched = OrderbookSchedule(budget=10, state={}, max_pairs=3)
+    assert len(sched.select(pairs, volumes, cost=lambda x: 1, now=1000)) == 3
+    assert sched.state["cycle"]["deferred"] == 27
+
+
+def test_refresh_marks_only_fetched(mock_mm2, monkeypatch):
+    respond = mock_mm2.respond
+    monkeypatch.setattr(
+        mock_mm2,
+        "respond",
+        lambda params: {"error": "offline"}
+        if params.get("params", {}).get("base") == "DGB"
+        else respond(params),
+    )
+    # Requests go to the mock mm2, rather than the orderbook fixtures
+    get = memcache.get
+    monkeypatch.setattr(
+        memcache,
+        "get",
+        lambda key, fallback=True: None if key == "testing" else get(key, fallback),
+    )
+    monkeypatch.setattr(cache_calc, "ORDERBOOK_FETCH_LOOP_SLEEP", 0)
+    memcache.client().delete(f"{schedule.ORDERBOOK_SCHEDULE_KEY}-testing")
+    resp = cache_calc.CacheCalc()._refresh_orderbooks(["KMD_LTC", "DGB_KMD"], {})
+    assert "refreshed 1/2 due pairs" in resp["message"]
+    pairs = OrderbookSchedule().state["pairs"]
+    assert pairs["KMD_LTC"]["refreshed"] is not None
+    # A failed RPC leaves the pair due
+    assert pairs["DGB_KMD"]["refreshed"] is None
+
+
+def test_record_book_churn():
+    sched = OrderbookSchedule(state={})
+    schedule._drain()
+    book = {"bids": [{"price": 1, "volume": 2}], "asks": []}
+    changed = {"bids": [{"price": 1, "volume": 3}], "asks": []}
+    for data in [book, book, changed, book]:
+        record_book("FLAP_KMD-segwit", data)
+        record_book("STILL_KMD", book)
+    sched.select(["FLAP_KMD", "STILL_KMD"], cost=lambda x: 1, now=100)
+    assert sched.state["pairs"]["FLAP_KMD"]["churn"] > 0
+    assert sched.state["pairs"]["STILL_KMD"]["churn"] == 0
+    assert sched.state["pairs"]["FLAP_KMD"]["interval"] < ORDERBOOK_REFRESH_MAX
+
+
+def test_adaptive_refresh_simulation(mock_mm2):
+    sched = OrderbookSchedule(budget=BUDGET, state={})
+
+    def adaptive(now):
+        return sched.select(PAIRS, VOLUMES, cost=lambda x: 1, now=now)
+
+    refreshed, calls = simulate(mock_mm2, adaptive, sched.mark_refreshed)
+    assert max(calls) <= BUDGET
+
+    # Hot pairs stay seconds fresh, idle pairs back off to minutes
+    for i in HOT + REQUESTED:
+        assert mean_age(refreshed[i]) < 30, i
+    for i in IDLE:
+        gaps = [b - a for a, b in zip(refreshed[i], refreshed[i][1:])]
+        assert min(gaps) >= ORDERBOOK_REFRESH_MAX / 2, i
+    assert len(refreshed[CHURN]) > len(refreshed[IDLE[0]])
+
+    # The same budget, spent round robin
+    mock_mm2.requests = 0
+    schedule._drain()
+    pointer = {"idx": 0}
+
+    def round_robin(now):
+        batch = [PAIRS[(pointer["idx"] + i) % len(PAIRS)] for i in range(BUDGET)]
+        pointer["idx"] = (pointer["idx"] + BUDGET) % len(PAIRS)
+        return batch
+
+    baseline, calls = simulate(mock_mm2, round_robin)
+    for i in HOT:
+        assert mean_age(refreshed[i]) * 2 < mean_age(baseline[i]), i
+
+    stats = sched.staleness(now=HOUR)
+    assert stats["pairs_count"] == len(PAIRS)
+    assert stats["never_refreshed"] == 0
+    assert list(stats["pairs"])[0] in HOT
+    assert stats["pairs"][IDLE[0]]["interval"] == ORDERBOOK_REFRESH_MAX
+    assert stats["last_cycle"]["budget"] == BUDGET
+    assert stats["age"]["max"] <= ORDERBOOK_REFRESH_MAX * 2
+
+    # Reloaded from memcache by the next cycle
+    assert OrderbookSchedule().state["pairs"].keys() == sched.state["pairs"].keys()
@@ -91,6 +91,29 @@ def test_historical_trades(
     )
 
 
+def test_historical_trades_limit(setup_kmd_ltc_pair, setup_ltc_kmd_pair):
+    pair = setup_kmd_ltc_pair
+    r_all = pair.historical_trades()["ALL"]
+    r = pair.historical_trades(limit=1)["ALL"]
+    assert len(r["buy"]) + len(r["sell"]) == 1
+    assert r["trades_count"] == r_all["trades_count"] == "3"
+    assert r["sum_base_volume_buys"] == r_all["sum_base_volume_buys"]
+    assert r["average_price"] == r_all["average_price"]
+    newest = max(r_all["buy"] + r_all["sell"], key=lambda i: i["timestamp"])
+    assert (r["buy"] + r["sell"])[0]["trade_id"] == newest["trade_id"]
+
+    r = pair.historical_trades(trade_type="buy")["ALL"]
+    assert len(r["buy"]) == 2
+    assert len(r["sell"]) == 0
+    assert r["trades_count"] == "2"
+    assert r["sum_base_volume_sells"] == convert.format_10f(0)
+
+    pair = setup_ltc_kmd_pair
+    r = pair.historical_trades(trade_type="sell")["ALL"]
+    assert len(r["buy"]) == 0
+    assert len(r["sell"]) == 2
+
+
 def test_get_average_price(setup_kmd_ltc_pair, setup_not_existing_pair):
     pair = setup_not_existing_pair
     r = pair.get_average_price(sampledata.historical_trades)
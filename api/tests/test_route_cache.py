@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.responses import JSONResponse
+from lib.route_cache import cached_route, route_key, stats
+from util.enums import TradeType
+
+
+def test_route_key():
+    a = route_key("test", {"pair_str": "KMD_LTC", "limit": 10})
+    b = route_key("test", {"limit": 10, "pair_str": "KMD_LTC"})
+    assert a == b
+    assert a != route_key("test", {"pair_str": "KMD_LTC", "limit": 11})
+    assert route_key("test", {"t": TradeType.BUY}) == route_key("test", {"t": "buy"})
+
+
+def test_cached_route_coalesces():
+    name = f"test/{uuid.uuid4()}"
+    calls = []
+
+    @cached_route(name)
+    def route(pair_str: str = "KMD_LTC", limit: int = 10):
+        calls.append(pair_str)
+        time.sleep(0.5)
+        return {"pair": pair_str, "limit": limit}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: route("KMD_LTC", limit=10), range(8)))
+    assert len(calls) == 1
+    assert all(i == {"pair": "KMD_LTC", "limit": 10} for i in results)
+    assert route(pair_str="KMD_LTC") == results[0]
+    assert len(calls) == 1
+    route("DGB_LTC")
+    assert len(calls) == 2
+    r = stats()[name]
+    assert r["misses"] == 2
+    assert r["hits"] + r["coalesced"] == 8
+    assert r["hit_ratio"] == 0.8
+
+
+def test_cached_route_errors():
+    name = f"test/{uuid.uuid4()}"
+    calls = []
+
+    @cached_route(name)
+    def route(pair_str: str = "KMD_LTC"):
+        calls.append(pair_str)
+        if pair_str == "bad":
+            return JSONResponse(status_code=400, content={"error": "bad"})
+        return JSONResponse(content={"pair": pair_str})
+
+    assert route("bad").status_code == 400
+    assert route("bad").status_code == 400
+    assert len(calls) == 2
+    assert stats()[name]["uncached"] == 2
+    assert route("KMD_LTC").body == route("KMD_LTC").body
+    assert len(calls) == 3
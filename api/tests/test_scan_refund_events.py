@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import pytest
+
+PROJECT_ROOT_PATH = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+sys.path.append(PROJECT_ROOT_PATH)
+import scan_refund_events as scanner
+
+
+def swap(maker_coin, taker_coin, refunded=True):
+    event = "MakerPaymentRefunded" if refunded else "MakerPaymentSent"
+    return {
+        "uuid": f"{maker_coin}-{taker_coin}",
+        "maker_coin": maker_coin,
+        "taker_coin": taker_coin,
+        "events": [{"timestamp": int(time.time()), "event": {"type": event}}],
+    }
+
+
+@pytest.fixture
+def swaps_dir(tmp_path):
+    root = tmp_path / "swaps"
+    root.mkdir()
+    for name, data in {
+        "kmd_ltc.json": swap("KMD", "LTC"),
+        "dgb_btc.json": swap("DGB", "BTC"),
+        "kmd_btc.json": swap("KMD", "BTC", refunded=False),
+    }.items():
+        (root / name).write_text(json.dumps(data))
+    return root
+
+
+def test_scan_index_skips_unchanged(swaps_dir, tmp_path, capsys):
+    index = tmp_path / "index.json"
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 2
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 0
+
+    # Only the modified file is scanned again
+    path = swaps_dir / "dgb_btc.json"
+    path.write_text(json.dumps(swap("DGB", "BTC")) + " ")
+    os.utime(path, ns=(0, 10**18))
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 1
+
+
+def test_scan_index_keyed_on_filters(swaps_dir, tmp_path, capsys):
+    index = tmp_path / "index.json"
+    assert scanner.scan(swaps_dir, "LTC", None, index_path=index) == 1
+    # Files filtered out for LTC are still scanned for other filters
+    assert scanner.scan(swaps_dir, "BTC", None, index_path=index) == 1
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 2
+    assert scanner.scan(swaps_dir, "ltc", None, index_path=index) == 0
+    assert scanner.scan(swaps_dir, None, 7, index_path=index) == 2
+    assert len(scanner.load_index(index)) == 4
+
+
+def test_scan_index_skips_failed_files(swaps_dir, tmp_path, capsys):
+    index = tmp_path / "index.json"
+    path = swaps_dir / "broken.json"
+    path.write_text('{"events": ["Refund"')
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 2
+    scanned = scanner.load_index(index)[scanner.index_key(None, None)]
+    assert str(path) not in scanned
+    assert len(scanned) == 3
+
+    # Scanned again once it can be loaded, without being touched
+    path.write_text(json.dumps(swap("DOGE", "KMD")))
+    assert scanner.scan(swaps_dir, None, None, index_path=index) == 1
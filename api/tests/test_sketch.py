@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import pytest
+from util.sketch import HyperLogLog
+
+
+def test_hyperloglog_count():
+    hll = HyperLogLog()
+    assert hll.count() == 0
+    for n in [10, 1000, 20000]:
+        hll = HyperLogLog()
+        for i in range(n):
+            hll.add(f"pubkey{i}")
+            hll.add(f"pubkey{i}")
+        assert abs(hll.count() - n) <= n * hll.error * 3
+
+
+def test_hyperloglog_merge():
+    a = HyperLogLog()
+    b = HyperLogLog()
+    for i in range(5000):
+        a.add(f"pubkey{i}")
+        b.add(f"pubkey{i + 2500}")
+    assert abs(a.merge(b).count() - 7500) <= 7500 * a.error * 3
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(p=10))
+
+
+def test_hyperloglog_serialize():
+    hll = HyperLogLog()
+    for i in range(100):
+        hll.add(f"pubkey{i}")
+    data = hll.serialize()
+    assert len(data) < 1000
+    assert HyperLogLog.deserialize(data).registers == hll.registers
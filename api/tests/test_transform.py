@@ -11,7 +11,9 @@ from util.transform import (
     sumdata,
     invert,
     filterdata,
+    merge,
     derive,
+    template,
 )
 import util.memcache as memcache
 
@@ -51,7 +53,27 @@ def test_clean_decimal_dicts():
 
 
 def test_clean_orderbook_data():
-    pass
+    data = template.orderbook_extended("KMD_LTC")
+    data["bids"] = [
+        {
+            "price": Decimal("0.00451987659876543"),
+            "volume": Decimal("98765.187654321098765432"),
+            "quote_volume": Decimal("446.4064549645972975474846017"),
+        }
+    ]
+    data["total_bids_base_vol"] = Decimal("98765.187654321098765432")
+    r = clean.orderbook_data(data)
+    assert r["bids"][0]["price"] == "0.0045198766"
+    assert r["bids"][0]["volume"] == "98765.1876543211"
+    assert r["bids"][0]["quote_volume"] == "446.4064549646"
+    assert r["total_bids_base_vol"] == "98765.1876543211"
+    assert r["liquidity_usd"] == "0.0000000000"
+    # Formatting is idempotent
+    assert clean.orderbook_data(r)["bids"][0]["price"] == "0.0045198766"
+    # Small amounts are fixed point, not "1E-8"
+    tiny = Decimal("1E-8")
+    data["asks"] = [{"price": Decimal("1"), "volume": tiny, "quote_volume": tiny}]
+    assert clean.orderbook_data(data)["asks"][0]["quote_volume"] == "0.0000000100"
 
 
 def test_sumdata_ints():
@@ -87,6 +109,15 @@ def test_sumdata_dict_lists():
     assert len(r) == 4
 
 
+def test_merge_orderbook_levels():
+    a = [{"price": "9.0000000000", "volume": "1"}, {"price": "10.0000000000", "volume": "2"}]
+    b = [{"price": Decimal("9.5"), "volume": "3"}, {"price": "0.5000000000", "volume": "4"}]
+    c = [{"price": "9.0000000000", "volume": "5"}]
+    r = merge.orderbook_levels(a, b, c)
+    assert [i["volume"] for i in r] == ["4", "1", "5", "3", "2"]
+    assert merge.orderbook_levels(a, []) == a
+
+
 def test_sumdata_numeric_str():
     assert sumdata.numeric_str("12", "4") == "16.0000000000"
     assert sumdata.numeric_str(12, "4") == "16.0000000000"
@@ -97,6 +128,9 @@ def test_format_10f():
     assert convert.format_10f(1.234567890123456789) == "1.2345678901"
     assert convert.format_10f(1) == "1.0000000000"
     assert convert.format_10f("1.23") == "1.2300000000"
+    assert convert.format_10f("-1.2345678901") == "-1.2345678901"
+    assert convert.format_10f("1.23456789012") == "1.2345678901"
+    assert convert.format_10f(Decimal("7407507.740740734074")) == "7407507.7407407341"
 
 
 def test_historical_trades_to_gecko():
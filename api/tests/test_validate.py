@@ -5,7 +5,9 @@ from tests.fixtures_data import sampledata
 from tests.fixtures_validate import setup_invert_pair_kmd_ltc
 import util.validate as validate
 import util.memcache as memcache
-from lib.cache import CacheItem
+from lib.cache import CacheItem, RESPONSE_MODELS
+from typing import List
+from models.stats_xyz import StatsXyzSummary
 
 
 gecko_source = memcache.get_gecko_source()
@@ -47,6 +49,18 @@ def test_validate_positive_numeric():
         validate.positive_numeric("foo", "var")
 
 
+def test_validate_candles_request():
+    assert validate.candles_request("1h", 3600, 7200) == (3600, 7200)
+    start_time, end_time = validate.candles_request("1m")
+    assert end_time - start_time == 60000
+    with pytest.raises(ValueError):
+        validate.candles_request("2h")
+    with pytest.raises(ValueError):
+        validate.candles_request("1h", 7200, 3600)
+    with pytest.raises(ValueError):
+        validate.candles_request("1m", 1, 86400 * 30)
+
+
 def test_validate_loop_data():
     cache_item = CacheItem("test")
     data = {"error": "foo"}
@@ -58,6 +72,37 @@ def test_validate_loop_data():
     assert not validate.loop_data(None, cache_item)
 
 
+def test_validate_response_data():
+    data = [
+        {
+            "trading_pair": "KMD_LTC",
+            "trades_24h": "5",
+            "base_currency": "KMD",
+            "quote_currency": "LTC",
+            "base_volume": "1.5000000000",
+            "quote_volume": Decimal("0.25"),
+            "lowest_ask": "0.1",
+            "highest_bid": "0.09",
+            "lowest_price_24h": "0.08",
+            "highest_price_24h": "0.11",
+            "price_change_percent_24h": "0.02",
+            "last_price": "0.1",
+            "last_swap_timestamp": 1777777777,
+            "extra_field": "dropped",
+        }
+    ]
+    r = validate.response_data(data, List[StatsXyzSummary], "stats_xyz_summary")
+    # Matches what FastAPI would serialize for the response_model
+    assert r[0]["trades_24h"] == 5
+    assert r[0]["base_volume"] == 1.5
+    assert r[0]["quote_volume"] == 0.25
+    assert "extra_field" not in r[0]
+    del data[0]["trading_pair"]
+    data[0]["trades_24h"] = "five"
+    assert validate.response_data(data, List[StatsXyzSummary]) is None
+    assert RESPONSE_MODELS["stats_xyz_summary"] == List[StatsXyzSummary]
+
+
 def test_validate_json():
     data = "string"
     assert not validate.json_obj(data)
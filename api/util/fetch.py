@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from const import (
+    FETCH_BACKOFF,
+    FETCH_CACHE_PATH,
+    FETCH_MAX_WAIT,
+    FETCH_MAX_WORKERS,
+    FETCH_RETRIES,
+    FETCH_TIMEOUT,
+)
+from util.logger import logger
+
+# Retried after a backoff, or the server's Retry-After if sent
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ResponseCache:
+    """
+    Upstream JSON responses on disk, with the validators needed to
+    revalidate them. Parsed bodies are also kept in memory, so an
+    unchanged response is neither downloaded nor parsed again.
+    """
+
+    def __init__(self, folder=FETCH_CACHE_PATH):
+        self.folder = folder
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def path(self, url):
+        return f"{self.folder}/{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+    def load(self, url):
+        with self.lock:
+            if url in self.memo:
+                return self.memo[url]
+        try:
+            with open(self.path(url), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.memo[url] = entry
+        return entry
+
+    def save(self, url, entry):
+        self.remember(url, entry)
+        fn = self.path(url)
+        tmp = f"{fn}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, fn)
+        except OSError as e:  # pragma: no cover
+            logger.warning(f"Failed to cache response from {url}: {e}")
+
+    def remember(self, url, entry):
+        # Revalidations only move the expiry, the file is left as is
+        with self.lock:
+            self.memo[url] = entry
+
+
+class Fetcher:
+    """
+    Fetches upstream JSON with bounded concurrency, retries with
+    exponential backoff and conditional requests against a
+    ResponseCache. Honours Cache-Control max-age, Retry-After and
+    X-RateLimit-Remaining / X-RateLimit-Reset.
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        max_workers=FETCH_MAX_WORKERS,
+        retries=FETCH_RETRIES,
+        backoff=FETCH_BACKOFF,
+        timeout=FETCH_TIMEOUT,
+    ):
+        self.cache = cache or ResponseCache()
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        # Host: time to hold requests until, after a rate limit
+        self.holds = {}
+        self.lock = threading.Lock()
+
+    @property
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def get_json(self, url, max_age=0):
+        """
+        Returns the JSON body of url. A cached response younger than
+        max_age (or the server's max-age) is returned without a request,
+        an older one is revalidated. If every attempt fails, a cached
+        response is returned stale rather than raising.
+        """
+        entry = self.cache.load(url)
+        if entry is not None and time.time() < entry["expires_at"]:
+            return entry["data"]
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        error = None
+        for attempt in range(self.retries + 1):
+            r = None
+            self.wait_for_host(url)
+            try:
+                r = self.session.get(url, headers=headers, timeout=self.timeout)
+                self.hold_host(url, r)
+                if r.status_code == 304 and entry is not None:
+                    entry = dict(entry, expires_at=self.expires_at(r, max_age))
+                    self.cache.remember(url, entry)
+                    return entry["data"]
+                if r.status_code not in RETRY_STATUSES:
+                    r.raise_for_status()
+                    data = r.json()
+                    self.cache.save(
+                        url,
+                        {
+                            "url": url,
+                            "etag": r.headers.get("ETag"),
+                            "last_modified": r.headers.get("Last-Modified"),
+                            "expires_at": self.expires_at(r, max_age),
+                            "data": data,
+                        },
+                    )
+                    return data
+                error = requests.HTTPError(f"{r.status_code} from {url}", response=r)
+            except requests.HTTPError as e:
+                # Not worth retrying, e.g. 404
+                error = e
+                break
+            except (requests.RequestException, ValueError) as e:
+                error = e
+            if attempt < self.retries:
+                time.sleep(self.retry_delay(r, attempt))
+
+        if entry is not None:
+            logger.warning(f"Serving stale response from {url}: {error}")
+            return entry["data"]
+        raise error
+
+    def get_many(self, urls, max_age=0):
+        """
+        Returns the JSON body of each url, fetched at most max_workers
+        at a time, with None for those which failed.
+        """
+
+        def fetch(url):
+            try:
+                return self.get_json(url, max_age=max_age)
+            except Exception as e:
+                logger.warning(f"Failed to fetch from URL: {url}, error: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(fetch, urls))
+
+    def expires_at(self, r, max_age=0):
+        cache_control = r.headers.get("Cache-Control", "").lower()
+        if "no-store" not in cache_control and "no-cache" not in cache_control:
+            for i in cache_control.split(","):
+                key, _, value = i.strip().partition("=")
+                if key == "max-age" and value.isdigit():
+                    max_age = max(max_age, int(value))
+        return time.time() + max_age
+
+    def retry_delay(self, r, attempt):
+        delay = self.backoff * 2**attempt
+        if r is not None:
+            retry_after = seconds_until(r.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = retry_after
+        return min(delay, FETCH_MAX_WAIT)
+
+    def hold_host(self, url, r):
+        """Holds requests to a host until its rate limit resets"""
+        wait = None
+        if r.status_code == 429:
+            wait = seconds_until(r.headers.get("Retry-After"))
+        if r.headers.get("X-RateLimit-Remaining") == "0":
+            wait = seconds_until(r.headers.get("X-RateLimit-Reset"))
+        if wait:
+            with self.lock:
+                self.holds[urlsplit(url).netloc] = time.time() + min(wait, FETCH_MAX_WAIT)
+
+    def wait_for_host(self, url):
+        with self.lock:
+            hold = self.holds.get(urlsplit(url).netloc, 0)
+        wait = hold - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def seconds_until(value):
+    """
+    Seconds from a Retry-After / X-RateLimit-Reset header, which may be
+    a delay, an epoch timestamp or an HTTP date. None if not parsable.
+    """
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+        # Epoch timestamps rather than a delay
+        if seconds > 1e9:
+            seconds -= time.time()
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(seconds, 0)
+
+
+_FETCHER = None
+_FETCHER_LOCK = threading.Lock()
+
+
+def fetcher():
+    """The shared Fetcher, created on first use"""
+    global _FETCHER
+    if _FETCHER is None:
+        with _FETCHER_LOCK:
+            if _FETCHER is None:
+                _FETCHER = Fetcher()
+    return _FETCHER
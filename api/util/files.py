@@ -1,8 +1,8 @@
 import os
 import time
 import json
-import requests
-from const import API_ROOT_PATH
+from const import API_ROOT_PATH, FIXTURES_PATH
+from util.fetch import fetcher
 from util.logger import timed, logger
 import util.defaults as default
 import util.validate as validate
@@ -11,7 +11,7 @@ import util.validate as validate
 class Files:
     def __init__(self):
         if os.getenv("IS_TESTING") == "True" == "True":
-            folder = f"{API_ROOT_PATH}/tests/fixtures"
+            folder = FIXTURES_PATH
             self.foo = f"{folder}/foo.json"
             self.bar = f"{folder}/bar.json"
         else:  # pragma: no cover
@@ -43,6 +43,9 @@ class Files:
         self.pair_volumes_14d = f"{folder}/pairs/volumes_14d.json"
         self.pair_volumes_alltime = f"{folder}/pairs/volumes_alltime.json"
 
+        # Frozen monthly stats, one file per closed month
+        self.monthly_stats = f"{folder}/monthly"
+
         # REVIEW
         # self.generic_summary = f"{folder}/generic/summary.json"
         # self.generic_tickers = f"{folder}/generic/tickers.json"
@@ -54,6 +57,7 @@ class Files:
 
         self.markets_summary = f"{folder}/markets/summary.json"
         self.stats_api_summary = f"{folder}/stats_api/summary.json"
+        self.swap_durations = f"{folder}/stats_api/swap_durations.json"
         self.tickers = f"{folder}/generic/tickers.json"
         self.gecko_pairs = f"{folder}/gecko/pairs.json"
 
@@ -121,8 +125,8 @@ class Files:
 
     def download_json(self, url):
         try:
-            data = requests.get(url).json()
-            return data
+            # Conditional, so unchanged files are not downloaded again
+            return fetcher().get_json(url)
         except Exception as e:  # pragma: no cover
             return default.result(msg=e, loglevel="warning")
 
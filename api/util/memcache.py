@@ -2,9 +2,10 @@
 import os
 import time
 import json
+from threading import Lock
 from pymemcache.client.base import PooledClient
 from util.logger import logger, timed
-from const import MEMCACHE_LIMIT
+from const import MEMCACHE_HOST, MEMCACHE_LIMIT, MEMCACHE_PORT
 import util.defaults as default
 from dotenv import load_dotenv
 
@@ -25,57 +26,117 @@ class JsonSerde(object):  # pragma: no cover
         raise Exception("Unknown serialization format")
 
 
-try:  # pragma: no cover
-    MEMCACHE = PooledClient(
-        ("memcached", 11211),
-        serde=JsonSerde(),
-        timeout=10,
-        max_pool_size=50,
-        ignore_exc=True,
-    )
-    MEMCACHE.set("foo", "bar", 60)
-    if os.getenv("IS_TESTING") == "True":
-        MEMCACHE.set("testing", True, 3600)
-    logger.info("Connected to memcached docker container")
+# Created on first use, so importing doesn't need memcached running
+MEMCACHE = None
+_CLIENT_LOCK = Lock()
 
-except Exception as e:  # pragma: no cover
-    logger.muted(e)
-    MEMCACHE = PooledClient(
-        ("localhost", 11211),
+
+def connect():  # pragma: no cover
+    """Returns a memcached client, trying the docker container first"""
+    if MEMCACHE_HOST is None:
+        try:
+            conn = PooledClient(
+                ("memcached", MEMCACHE_PORT),
+                serde=JsonSerde(),
+                timeout=10,
+                max_pool_size=50,
+                ignore_exc=True,
+            )
+            conn.set("foo", "bar", 60)
+            if os.getenv("IS_TESTING") == "True":
+                conn.set("testing", True, 3600)
+            logger.info("Connected to memcached docker container")
+            conn.cache_memlimit = MEMCACHE_LIMIT
+            return conn
+        except Exception as e:
+            logger.muted(e)
+    host = MEMCACHE_HOST or "localhost"
+    conn = PooledClient(
+        (host, MEMCACHE_PORT),
         serde=JsonSerde(),
         timeout=15,
         max_pool_size=200,
         ignore_exc=True,
     )
-    logger.info("Connected to memcached on localhost")
+    logger.info(f"Connected to memcached on {host}")
     if os.getenv("IS_TESTING") == "True":
-        MEMCACHE.set("testing", True, 3600)
+        try:
+            conn.set("testing", True, 3600)
+        except Exception as e:
+            # e.g. offline benchmarks, which swap in a fake client
+            logger.warning(f"Failed to connect to memcached: {e}")
+    conn.cache_memlimit = MEMCACHE_LIMIT
+    return conn
+
+
+def client():
+    global MEMCACHE
+    if MEMCACHE is None:
+        with _CLIENT_LOCK:
+            if MEMCACHE is None:
+                MEMCACHE = connect()
+    return MEMCACHE
+
+
+def persisted(name):
+    """
+    Returns the last saved file of a cache item, so it can be served
+    before the cache loops have (re)populated memcache.
+    """
+    # Imported here, util.files imports this module indirectly
+    from util.files import Files
+
+    files = Files()
+    fn = files.get_cache_fn(name)
+    if fn is None or not fn.endswith(".json") or not os.path.isfile(fn):
+        return None
+    data = files.load_jsonfile(fn)
+    if isinstance(data, dict) and "data" in data:
+        return data["data"]
+    return data
 
-MEMCACHE.cache_memlimit = MEMCACHE_LIMIT
 
 LOCK_PREFIX = "lock:"
+RESPONSE_PREFIX = "response:"
+FINGERPRINT_PREFIX = "fingerprint:"
+ROUTE_PREFIX = "route:"
+PAIR_ORDERBOOK_PREFIX = "orderbook:pair:"
+# Depairs with a stored book, so books of dropped pairs can be deleted
+PAIR_ORDERBOOK_INDEX = "orderbook:pairs"
 
 def stats():  # pragma: no cover
-    return MEMCACHE.stats()
+    return client().stats()
 
 
-def get(key):  # pragma: no cover
+def get(key, fallback=True):  # pragma: no cover
+    """
+    Returns a value from memcache. On a miss, cache items fall
+    back to their persisted file unless fallback is False.
+    """
     i = 0
+    name = key
     if os.getenv("IS_TESTING") == "True" and key != "testing":
         key = f"{key}-testing"
     while i < 7:
         cached = None
         try:
-            cached = MEMCACHE.get(key)
+            cached = client().get(key)
         except OSError:
             time.sleep(0.1)
         if cached is not None:
             return cached
         i += 1
+    if fallback and ":" not in name:
+        cached = persisted(name)
+        if cached is not None:
+            return cached
     if (
         "orderbook" not in key
         and "ticker_info" not in key
         and "prices" not in key
+        and "monthly_stats" not in key
+        and not key.startswith(ROUTE_PREFIX)
+        and not key.startswith(FINGERPRINT_PREFIX)
         and key not in ["testing"]
     ):
         logger.warning(f"Failed to get '{key}' from memcache")
@@ -88,7 +149,7 @@ def update(key, value, expiry):
         if os.getenv("IS_TESTING") == "True" and key != "testing":
             key = f"{key}-testing"
         if value is not None:
-            MEMCACHE.set(key, value, expiry)
+            client().set(key, value, expiry)
             msg = f"{key} added to memcache"
             return default.result(data=key, msg=msg, loglevel="cached", ignore_until=5)
         msg = f"{key} memcache not updated, data is empty"
@@ -99,10 +160,21 @@ def update(key, value, expiry):
     return default.result(data=key, msg=msg, loglevel="warning", ignore_until=0)
 
 
+def touch(key, expiry) -> bool:
+    """Extends the expiry of an unchanged value without resending it"""
+    if os.getenv("IS_TESTING") == "True" and key != "testing":
+        key = f"{key}-testing"
+    try:
+        return client().touch(key, expiry, noreply=False)
+    except Exception:
+        return False
+
+
 def acquire_lock(key: str, ttl: int = 30) -> bool:
     lock_key = f"{LOCK_PREFIX}{key}"
     try:
-        return MEMCACHE.add(lock_key, True, ttl)
+        # noreply=False, or add() always reports success
+        return client().add(lock_key, True, ttl, noreply=False)
     except Exception:
         return False
 
@@ -110,7 +182,7 @@ def acquire_lock(key: str, ttl: int = 30) -> bool:
 def release_lock(key: str):
     lock_key = f"{LOCK_PREFIX}{key}"
     try:
-        MEMCACHE.delete(lock_key)
+        client().delete(lock_key)
     except Exception:
         pass
 
@@ -190,6 +262,49 @@ def get_pairs_orderbook_extended():  # pragma: no cover
     return get("pairs_orderbook_extended")
 
 
+def pair_orderbook_key(depair: str):
+    key = f"{PAIR_ORDERBOOK_PREFIX}{depair}"
+    if os.getenv("IS_TESTING") == "True":
+        key = f"{key}-testing"
+    return key
+
+
+def set_pair_orderbooks(orderbooks: dict, live=None, expiry: int = 3600):
+    """
+    Stores each depair's variant books from pairs_orderbook_extended
+    under its own key, so single pair lookups don't load the full book.
+    If `live` (the depairs which still have a book) is given, the books
+    stored for any other depair are deleted. Returns the depairs which
+    failed to store.
+    """
+    failed = []
+    if len(orderbooks) > 0:
+        items = {pair_orderbook_key(i): book for i, book in orderbooks.items()}
+        depairs = {pair_orderbook_key(i): i for i in orderbooks}
+        try:
+            failed = [depairs[i] for i in client().set_many(items, expiry, noreply=False)]
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"Failed to cache pair orderbooks! {e}")
+            failed = list(orderbooks.keys())
+    if live is not None:
+        stored = get(PAIR_ORDERBOOK_INDEX) or []
+        dropped = [i for i in stored if i not in live]
+        try:
+            if len(dropped) > 0:
+                client().delete_many([pair_orderbook_key(i) for i in dropped], noreply=False)
+        except Exception as e:  # pragma: no cover
+            logger.warning(f"Failed to delete dropped pair orderbooks! {e}")
+        else:
+            stored = [i for i in stored if i in live]
+        stored += [i for i in orderbooks if i not in stored and i not in failed]
+        update(PAIR_ORDERBOOK_INDEX, stored, 86400)
+    return failed
+
+
+def get_pair_orderbook(depair: str):
+    return get(f"{PAIR_ORDERBOOK_PREFIX}{depair}")
+
+
 def set_coin_volumes_24hr(data):  # pragma: no cover
     update("coin_volumes_24hr", data, 3600)
 
@@ -254,6 +369,14 @@ def get_tickers():  # pragma: no cover
     return get("tickers")
 
 
+def set_gecko_tickers(data):  # pragma: no cover
+    update("gecko_tickers", data, 3600)
+
+
+def get_gecko_tickers():  # pragma: no cover
+    return get("gecko_tickers")
+
+
 def set_gecko_pairs(data):  # pragma: no cover
     update("gecko_pairs", data, 3600)
 
@@ -279,6 +402,47 @@ def get_markets_summary():  # pragma: no cover
     return get("markets_summary")
 
 
+# PRE-VALIDATED ROUTE RESPONSES
+def set_response(name, data):  # pragma: no cover
+    """
+    Stores the serialized JSON body for a route, validated in
+    CacheItem.save
+    """
+    update(f"{RESPONSE_PREFIX}{name}", json.dumps(data), 3600)
+
+
+def get_response(name):  # pragma: no cover
+    return get(f"{RESPONSE_PREFIX}{name}")
+
+
+# MONTHLY STATS
+def set_monthly_stats(key, data, expiry=1800):  # pragma: no cover
+    update(f"monthly_stats_{key}", data, expiry)
+
+
+def get_monthly_stats(key):  # pragma: no cover
+    return get(f"monthly_stats_{key}")
+
+
+# CACHE ITEM FINGERPRINTS
+def set_fingerprint(name, data):  # pragma: no cover
+    update(f"{FINGERPRINT_PREFIX}{name}", data, 86400)
+
+
+def get_fingerprint(name):  # pragma: no cover
+    return get(f"{FINGERPRINT_PREFIX}{name}")
+
+
+# DATABASE SYNC
+def set_swap_ingest_hwm(data):  # pragma: no cover
+    """Highest source row id imported into pgsql, keyed by source"""
+    update("swap_ingest_hwm", data, 86400 * 7)
+
+
+def get_swap_ingest_hwm():  # pragma: no cover
+    return get("swap_ingest_hwm")
+
+
 def set_adex_24hr(data):  # pragma: no cover
     update("adex_24hr", data, 3600)
 
@@ -309,6 +473,14 @@ def get_adex_alltime():  # pragma: no cover
     return get("adex_alltime")
 
 
+def set_swap_durations(data):  # pragma: no cover
+    update("swap_durations", data, 3600)
+
+
+def get_swap_durations():  # pragma: no cover
+    return get("swap_durations")
+
+
 # REVIEW CACHE (TOO LARGE)
 # def set_summary(data):  # pragma: no cover
 # update("generic_summary", data, 3600)
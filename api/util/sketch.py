@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import base64
+import hashlib
+import math
+import zlib
+
+# Sketches have 2**HLL_PRECISION one byte registers. The relative
+# standard error of a count is 1.04 / sqrt(2**p), so about 1.6% at
+# p=12, with ~99% of counts within three times that (4.9%).
+HLL_PRECISION = 12
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct count sketch. Sketches with the same precision
+    can be merged, so daily sketches can answer any range of days.
+    """
+
+    def __init__(self, p: int = HLL_PRECISION, registers=None):
+        self.p = p
+        self.m = 1 << p
+        if registers is None:
+            registers = bytearray(self.m)
+        self.registers = bytearray(registers)
+
+    @property
+    def error(self) -> float:
+        """Relative standard error of `count()`"""
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value: str):
+        x = int.from_bytes(
+            hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        idx = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError(f"Can't merge sketches with precision {self.p} and {other.p}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m**2 / sum([2.0**-i for i in self.registers])
+        zeros = self.registers.count(0)
+        if zeros > 0:
+            # Linear counting is more accurate than the raw estimate,
+            # which is biased high, until the sketch has ~3m distinct
+            # values.
+            linear = self.m * math.log(self.m / zeros)
+            if linear <= 3 * self.m:
+                estimate = linear
+        return int(round(estimate))
+
+    def serialize(self) -> str:
+        """Compressed registers as text. Sparse sketches are tiny."""
+        data = zlib.compress(bytes([self.p]) + bytes(self.registers))
+        return base64.b64encode(data).decode("ascii")
+
+    @classmethod
+    def deserialize(cls, data: str) -> "HyperLogLog":
+        data = zlib.decompress(base64.b64decode(data))
+        return cls(p=data[0], registers=data[1:])
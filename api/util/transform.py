@@ -1,6 +1,8 @@
+import heapq
 from decimal import Decimal, InvalidOperation
 from typing import Any, List, Dict
 
+from const import DURATION_BUCKETS, DURATION_PERCENTILES
 from util.logger import logger, timed
 from util.cron import cron
 import util.defaults as default
@@ -11,6 +13,10 @@ import util.memcache as memcache
 # TODO: Create Subclasses for transform / strip / aggregate / cast
 
 
+def price_key(level):
+    return Decimal(level["price"])
+
+
 class Clean:
     def __init__(self):
         pass
@@ -60,7 +66,9 @@ class Clean:
             for i in ["bids", "asks"]:
                 for j in data[i]:
                     for k in ["price", "volume"]:
-                        j[k] = convert.format_10f(Decimal(j[k]))
+                        j[k] = convert.format_10f(j[k])
+                    if isinstance(j.get("quote_volume"), Decimal):
+                        j["quote_volume"] = convert.format_10f(j["quote_volume"])
             for i in [
                 "total_asks_base_vol",
                 "total_bids_base_vol",
@@ -77,7 +85,7 @@ class Clean:
                 "lowest_ask",
             ]:
                 if i in data:
-                    data[i] = convert.format_10f(Decimal(data[i]))
+                    data[i] = convert.format_10f(data[i])
                 else:  # pragma: no cover
                     logger.warning(f"{i} not in data!")
             return data
@@ -99,8 +107,11 @@ class Convert:
     def format_10f(self, number: float | Decimal) -> str:
         """
         Format a float to 10 decimal places.
+        Strings already in this format are returned as is.
         """
         if isinstance(number, str):
+            if number[-11:-10] == "." and number.replace(".", "", 1).lstrip("-").isdigit():
+                return number
             number = Decimal(number)
         return f"{number:.10f}"
 
@@ -205,6 +216,29 @@ class Convert:
             "variants": derive.pair_variants(book["pair"]),
         }
 
+    def tickers_to_gecko(self, data, gecko_source):
+        resp = {
+            "last_update": int(cron.now_utc()),
+            "pairs_count": data["pairs_count"],
+            "swaps_count": data["swaps_count"],
+            "combined_volume_usd": data["combined_volume_usd"],
+            "combined_liquidity_usd": data["combined_liquidity_usd"],
+            "data": [],
+        }
+        for depair in data["data"]:
+            std_pair = sortdata.pair_by_market_cap(depair, gecko_source=gecko_source)
+            if depair == std_pair:
+                resp["data"].append(data["data"][depair])
+            elif invert.pair(depair) in data["data"]:
+                logger.warning(
+                    f"Non standard {depair} exists in memcache.get_tickers(), should be {std_pair}"
+                )
+            else:
+                logger.warning(f"{depair} not found in memcache.get_tickers()")
+                # TODO: This should be threaded to avoid blocking
+                # db_update.fix_swap_pair(depair, pgdb_query)
+        return resp
+
     def ticker_to_gecko_pair(self, pair_data):
         return {
             "ticker_id": pair_data["ticker_id"],
@@ -275,13 +309,13 @@ class Convert:
             for i in ["asks", "bids"]:
                 if len(orderbook_data[i]) > 0:
                     if "quote_volume" not in orderbook_data[i][0]:
+                        # Parsed once here, formatted by
+                        # clean.orderbook_data
                         orderbook_data[i] = [
                             {
-                                "price": convert.format_10f(
-                                    Decimal(j["price"]["decimal"])
-                                ),
-                                "volume": j["base_max_volume"]["decimal"],
-                                "quote_volume": j["rel_max_volume"]["decimal"],
+                                "price": Decimal(j["price"]["decimal"]),
+                                "volume": Decimal(j["base_max_volume"]["decimal"]),
+                                "quote_volume": Decimal(j["rel_max_volume"]["decimal"]),
                             }
                             for j in orderbook_data[i]
                         ]
@@ -664,6 +698,88 @@ class Derive:
             ) for i in data
         ]
 
+    def swap_candle(self, swap, interval: str, seconds: int):
+        """A one swap OHLCV candle, oriented as the swap's pair"""
+        if swap["trade_type"] == "buy":
+            base_vol, quote_vol = swap["maker_amount"], swap["taker_amount"]
+            base_usd, quote_usd = swap["maker_coin_usd_price"], swap["taker_coin_usd_price"]
+        else:
+            base_vol, quote_vol = swap["taker_amount"], swap["maker_amount"]
+            base_usd, quote_usd = swap["taker_coin_usd_price"], swap["maker_coin_usd_price"]
+        volume_usd = Decimal(base_vol) * Decimal(base_usd or 0)
+        if volume_usd == 0:
+            volume_usd = Decimal(quote_vol) * Decimal(quote_usd or 0)
+        price = Decimal(swap["price"])
+        finished_at = int(swap["finished_at"])
+        return {
+            "pair": swap["pair"],
+            "pair_std": swap["pair_std"],
+            "interval": interval,
+            "start": finished_at // seconds * seconds,
+            "open": price,
+            "high": price,
+            "low": price,
+            "close": price,
+            "open_time": finished_at,
+            "close_time": finished_at,
+            "base_volume": Decimal(base_vol),
+            "quote_volume": Decimal(quote_vol),
+            "volume_usd": volume_usd,
+            "trades": 1,
+        }
+
+    def duration_stats(self, histogram):
+        """
+        Summarises a swap duration histogram from SqlQuery.swap_durations.
+        Failure adjusted percentiles treat failed swaps as never settled,
+        so are None where fewer than that share of all swaps settled.
+        """
+        successful = histogram["successful"]
+        total = successful + histogram["failed"]
+        stats = {
+            "swaps": total,
+            "successful": successful,
+            "failed": histogram["failed"],
+            "success_rate": round(successful / total, 4) if total else None,
+            "min": histogram["min"],
+            "max": histogram["max"],
+            "mean": round(histogram["total_duration"] / successful, 1) if successful else None,
+            "percentiles": {},
+            "failure_adjusted": {},
+            # [bucket upper edge (None for the overflow), swaps]
+            "histogram": [
+                [edge, count]
+                for edge, count in zip(DURATION_BUCKETS + [None], histogram["buckets"])
+            ],
+        }
+        for i in DURATION_PERCENTILES:
+            stats["percentiles"][f"p{i}"] = self.duration_percentile(
+                histogram, successful * i / 100
+            )
+            stats["failure_adjusted"][f"p{i}"] = self.duration_percentile(
+                histogram, total * i / 100
+            )
+        return stats
+
+    def duration_percentile(self, histogram, rank):
+        """
+        Returns the duration of the swap at a rank of the successful swaps
+        in a duration histogram, interpolated within its bucket.
+        """
+        if histogram["successful"] == 0 or rank > histogram["successful"]:
+            return None
+        seen = 0
+        for idx, count in enumerate(histogram["buckets"]):
+            if count == 0 or seen + count < rank:
+                seen += count
+                continue
+            lower = DURATION_BUCKETS[idx - 1] if idx > 0 else 0
+            upper = DURATION_BUCKETS[idx] if idx < len(DURATION_BUCKETS) else histogram["max"]
+            lower = max(lower, histogram["min"])
+            upper = min(upper, histogram["max"])
+            return round(lower + (upper - lower) * (rank - seen) / count, 1)
+        return histogram["max"]  # pragma: no cover
+
     @timed
     def price_at_finish(self, swap, is_reverse=False):
         try:
@@ -905,6 +1021,24 @@ class Invert:
         base, quote = derive.base_quote(pair_str, reverse=True, reduce=reduce)
         return f"{base}_{quote}"
 
+    def candle(self, candle):
+        """Inverts a candle's prices and volumes"""
+        inverse = {}
+        for i in ["open", "high", "low", "close"]:
+            price = Decimal(candle[i])
+            inverse[i] = 1 / price if price != 0 else Decimal(0)
+        candle.update(
+            {
+                "open": inverse["open"],
+                "high": inverse["low"],
+                "low": inverse["high"],
+                "close": inverse["close"],
+                "base_volume": candle["quote_volume"],
+                "quote_volume": candle["base_volume"],
+            }
+        )
+        return candle
+
     def trade_type(self, trade_type):
         if trade_type == "buy":
             return "sell"
@@ -1057,6 +1191,40 @@ class Merge:
     def __init__(self):
         pass
 
+    def candles(self, existing, new):
+        """Merges two candles for the same interval and start"""
+        if new["open_time"] < existing["open_time"]:
+            existing.update({"open": new["open"], "open_time": new["open_time"]})
+        if new["close_time"] >= existing["close_time"]:
+            existing.update({"close": new["close"], "close_time": new["close_time"]})
+        existing.update(
+            {
+                "high": max(existing["high"], new["high"]),
+                "low": min(existing["low"], new["low"]),
+                "base_volume": existing["base_volume"] + new["base_volume"],
+                "quote_volume": existing["quote_volume"] + new["quote_volume"],
+                "volume_usd": existing["volume_usd"] + new["volume_usd"],
+                "trades": existing["trades"] + new["trades"],
+            }
+        )
+        return existing
+
+    def duration_histograms(self, existing, new):
+        """Merges two swap duration histograms, from swap_durations"""
+        for i in ["min", "max"]:
+            values = [j[i] for j in [existing, new] if j[i] is not None]
+            if len(values) > 0:
+                existing[i] = min(values) if i == "min" else max(values)
+        existing.update(
+            {
+                "successful": existing["successful"] + new["successful"],
+                "failed": existing["failed"] + new["failed"],
+                "total_duration": existing["total_duration"] + new["total_duration"],
+                "buckets": [i + j for i, j in zip(existing["buckets"], new["buckets"])],
+            }
+        )
+        return existing
+
     def swaps(self, variants, swaps):
         resp = []
         for i in variants:
@@ -1066,10 +1234,7 @@ class Merge:
     def orderbooks(self, existing, new, gecko_source, trigger):
         try:
             existing.update(
-                {
-                    i: sumdata.dict_lists(existing[i], new[i], sort_key="price")
-                    for i in ["asks", "bids"]
-                }
+                {i: self.orderbook_levels(existing[i], new[i]) for i in ["asks", "bids"]}
             )
 
             numerics = [
@@ -1129,6 +1294,19 @@ class Merge:
             logger.warning(err)
         return existing
 
+    def orderbook_levels(self, *sides):
+        """
+        k-way merge of orderbook levels by ascending price. Sides are
+        normally sorted already (e.g. the merged `ALL` side), so sorting
+        them first is linear and the merge avoids a full re-sort.
+        """
+        return list(
+            heapq.merge(
+                *[sorted(i, key=price_key) for i in sides],
+                key=price_key,
+            )
+        )
+
     def first_last_traded(self, all, variant, is_reversed=False):
         if variant["last_swap_time"] > all["last_swap_time"]:
             all["last_swap_time"] = variant["last_swap_time"]
@@ -1537,6 +1715,16 @@ class Templates:  # pragma: no cover
             "trade_volume_usd": 0,
         }
 
+    def pair_trade_totals(self):
+        return {
+            "trades_count": 0,
+            "price": 0,
+            "base_volume_buys": 0,
+            "base_volume_sells": 0,
+            "quote_volume_buys": 0,
+            "quote_volume_sells": 0,
+        }
+
     def ticker_info(self, suffix, base, quote):
         return {
             "ticker_id": f"{base}_{quote}",
@@ -1595,6 +1783,16 @@ class Templates:  # pragma: no cover
             "priced": None,
         }
 
+    def duration_histogram(self):
+        return {
+            "successful": 0,
+            "failed": 0,
+            "total_duration": 0,
+            "min": None,
+            "max": None,
+            "buckets": [0] * (len(DURATION_BUCKETS) + 1),
+        }
+
     def pair_volume_item(self, suffix="24hr"):
         return {
             "base_volume": 0,
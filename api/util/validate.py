@@ -1,4 +1,8 @@
 from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError, parse_obj_as
+from const import CANDLE_INTERVALS, CANDLES_MAX_COUNT
+from util.cron import cron
 from util.logger import logger, timed
 from util.exceptions import DataStructureError, BadPairFormatError
 from util.transform import deplatform
@@ -70,6 +74,19 @@ def loop_data(data, cache_item):
         return False
 
 
+def response_data(data, model, name=""):
+    """
+    Validates data against a route's response_model, returning
+    it in the serialized form FastAPI would have sent, or None
+    if it does not match the model.
+    """
+    try:
+        return jsonable_encoder(parse_obj_as(model, data))
+    except ValidationError as e:
+        logger.warning(f"{name} response failed validation: {e}")
+        return None
+
+
 def is_bridge_swap(pair_str):
     root_pairing = deplatform.pair(pair_str)
     if len(set(root_pairing.split("_"))) == 1:
@@ -119,6 +136,28 @@ def pair(pair_str):
     return True
 
 
+def candles_request(interval: str, start_time: int = 0, end_time: int = 0):
+    """
+    Checks a candle range request, returning its start and end times.
+    Defaults to the 1000 intervals before `end_time` (or now).
+    """
+    if interval not in CANDLE_INTERVALS:
+        raise ValueError(f"interval must be one of {list(CANDLE_INTERVALS.keys())}!")
+    seconds = CANDLE_INTERVALS[interval]
+    if end_time == 0:
+        end_time = int(cron.now_utc())
+    if start_time == 0:
+        start_time = end_time - 1000 * seconds
+    if start_time >= end_time:
+        raise ValueError("start_time must be before end_time!")
+    if (end_time - start_time) / seconds > CANDLES_MAX_COUNT:
+        raise ValueError(
+            f"More than {CANDLES_MAX_COUNT} {interval} candles requested,"
+            " use a shorter range or a longer interval!"
+        )
+    return start_time, end_time
+
+
 def is_source_db(db_file) -> bool:
     if db_file.endswith("MM2.db"):
         return True
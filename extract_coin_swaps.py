@@ -6,8 +6,11 @@ import os
 import sys
 import json
 import csv
+import argparse
 from datetime import datetime, timezone
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 # Add the API root to the path to import the existing modules
 API_ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api')
@@ -71,250 +74,232 @@ except ImportError as e:
     print("and that all dependencies are installed.")
     sys.exit(1)
 
-def get_coin_swaps(coin_ticker):
+# Start of the extracted history (January 1, 2020)
+HISTORY_START = 1577836800
+
+CSV_FIELDNAMES = [
+    'uuid', 'pair', 'started_at', 'finished_at', 'duration',
+    'maker_coin', 'maker_coin_ticker', 'maker_amount', 'maker_coin_usd_price',
+    'taker_coin', 'taker_coin_ticker', 'taker_amount', 'taker_coin_usd_price',
+    'price', 'reverse_price', 'is_success', 'maker_gui', 'taker_gui',
+    'maker_version', 'taker_version', 'maker_pubkey', 'taker_pubkey'
+]
+
+
+def iter_chunks(start_time, end_time, chunk="month"):
     """
-    Get all swaps that include the specified coin (either as maker or taker)
+    Split a timespan into calendar month or year chunks of (start, end)
     """
-    try:
-        # Initialize database connection using the existing infrastructure
-        query = db.SqlQuery()
-        
-        print(f"Querying {coin_ticker} swaps...")
-        
-        # Get all swaps for the coin (this will include all variants)
-        # Using a very wide time range to get all historical data
-        start_time = 1577836800  # January 1, 2020
-        end_time = int(datetime.now().timestamp())  # Current time
-        
-        result = query.get_swaps_for_coin(
-            coin=coin_ticker,
-            start_time=start_time,
-            end_time=end_time,
-            success_only=False,  # Include both successful and failed swaps
-            all_variants=True    # Include all coin variants
-        )
-        
-        if isinstance(result, dict) and "error" in result:
-            print(f"Error querying database: {result['error']}")
-            return []
-            
-        print(f"Found {len(result)} {coin_ticker} swaps")
-        return result
-        
-    except Exception as e:
-        print(f"Error retrieving {coin_ticker} swaps: {e}")
-        print("This could be due to:")
-        print("1. Database connection issues")
-        print("2. Missing environment variables")
-        print("3. Database not running")
-        return []
+    dt = datetime.fromtimestamp(start_time, tz=timezone.utc)
+    dt = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if chunk == "year":
+        dt = dt.replace(month=1)
+    while int(dt.timestamp()) < end_time:
+        if chunk == "year":
+            next_dt = dt.replace(year=dt.year + 1)
+        elif dt.month == 12:
+            next_dt = dt.replace(year=dt.year + 1, month=1)
+        else:
+            next_dt = dt.replace(month=dt.month + 1)
+        yield max(int(dt.timestamp()), start_time), min(int(next_dt.timestamp()), end_time)
+        dt = next_dt
 
-def group_swaps_by_year(swaps):
+
+def get_coin_swaps(coin_ticker, start_time, end_time):
     """
-    Group swaps by year based on the finished_at timestamp
+    Get swaps in a timespan that include the specified coin (either as
+    maker or taker). The coin filter is applied in SQL, so only the
+    coin's swaps are returned.
     """
-    swaps_by_year = defaultdict(list)
-    
-    for swap in swaps:
-        # Use finished_at timestamp, fall back to started_at if not available
-        timestamp = swap.get('finished_at', swap.get('started_at', 0))
-        
-        if timestamp:
-            # Convert timestamp to datetime
-            dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-            year = dt.year
-            swaps_by_year[year].append(swap)
-    
-    return dict(swaps_by_year)
+    query = db.SqlQuery()
+    result = query.get_swaps_for_coin(
+        coin=coin_ticker,
+        start_time=start_time,
+        end_time=end_time,
+        success_only=False,  # Include both successful and failed swaps
+        all_variants=True    # Include all coin variants
+    )
+    if isinstance(result, dict) and "error" in result:
+        raise Exception(f"Error querying database: {result['error']}")
+    return result
+
 
-def analyze_year_summary(year_swaps, year, target_coin):
+def iter_coin_swaps(coin_ticker, chunk="month", workers=4):
     """
-    Create detailed analysis summary for a year of swaps for a specific coin
+    Yield all swaps for a coin in time order. Chunks are queried
+    concurrently, but at most `workers` chunks are held in memory at
+    once.
     """
-    if not year_swaps:
-        return {}
-    
-    # Get date range
-    timestamps = []
-    for swap in year_swaps:
+    end_time = int(datetime.now().timestamp())
+    chunks = iter_chunks(HISTORY_START, end_time, chunk)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, end in islice(chunks, workers):
+            pending.append(executor.submit(get_coin_swaps, coin_ticker, start, end))
+        while pending:
+            swaps = pending.popleft().result()
+            for start, end in islice(chunks, 1):
+                pending.append(executor.submit(get_coin_swaps, coin_ticker, start, end))
+            yield from swaps
+
+
+def swap_year(swap):
+    """
+    Year of a swap's finished_at timestamp (falling back to started_at)
+    """
+    timestamp = swap.get('finished_at', swap.get('started_at', 0))
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).year
+
+
+def with_readable_timestamps(swap):
+    """
+    Copy of a swap without SQLAlchemy artifacts, with readable
+    timestamps
+    """
+    row = {k: v for k, v in swap.items() if not k.startswith('_sa_')}
+    for timestamp_field in ['started_at', 'finished_at']:
+        if timestamp_field in row and row[timestamp_field]:
+            dt = datetime.fromtimestamp(row[timestamp_field], tz=timezone.utc)
+            row[f'{timestamp_field}_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S UTC')
+    return row
+
+
+class YearSummary:
+    """
+    Running analysis of a year of swaps for a specific coin
+    """
+
+    def __init__(self, target_coin):
+        self.target_coin = target_coin
+        self.swaps_count = 0
+        self.start_timestamp = None
+        self.end_timestamp = None
+        self.pairs = defaultdict(lambda: {
+            'maker_volumes': defaultdict(float),
+            'taker_volumes': defaultdict(float),
+            'swap_count': 0
+        })
+
+    def add(self, swap):
+        self.swaps_count += 1
         timestamp = swap.get('finished_at', swap.get('started_at', 0))
         if timestamp:
-            timestamps.append(timestamp)
-    
-    if not timestamps:
-        return {}
-    
-    start_timestamp = min(timestamps)
-    end_timestamp = max(timestamps)
-    start_date = datetime.fromtimestamp(start_timestamp, tz=timezone.utc).strftime("%d/%m/%y")
-    end_date = datetime.fromtimestamp(end_timestamp, tz=timezone.utc).strftime("%d/%m/%y")
-    
-    # Analyze pairs and volumes
-    pairs_analysis = defaultdict(lambda: {
-        'maker_volumes': defaultdict(float),
-        'taker_volumes': defaultdict(float), 
-        'prices': [],
-        'swap_count': 0
-    })
-    
-    for swap in year_swaps:
+            if self.start_timestamp is None or timestamp < self.start_timestamp:
+                self.start_timestamp = timestamp
+            if self.end_timestamp is None or timestamp > self.end_timestamp:
+                self.end_timestamp = timestamp
+
         pair_std = swap.get('pair_std', '')
         if not pair_std:
-            continue
-            
+            return
         maker_coin = swap.get('maker_coin_ticker', '')
         taker_coin = swap.get('taker_coin_ticker', '')
-        maker_amount = float(swap.get('maker_amount', 0))
-        taker_amount = float(swap.get('taker_amount', 0))
-        price = float(swap.get('price', 0))
-        
-        pairs_analysis[pair_std]['maker_volumes'][maker_coin] += maker_amount
-        pairs_analysis[pair_std]['taker_volumes'][taker_coin] += taker_amount
-        if price > 0:
-            pairs_analysis[pair_std]['prices'].append(price)
-        pairs_analysis[pair_std]['swap_count'] += 1
-    
-    # Format pairs summary
-    pairs_summary = {}
-    for pair, data in pairs_analysis.items():
-        # Calculate total volumes and average price
-        total_maker_volume = sum(data['maker_volumes'].values())
-        total_taker_volume = sum(data['taker_volumes'].values())
-        avg_price = sum(data['prices']) / len(data['prices']) if data['prices'] else 0
-        
-        # Determine which coin is the target coin to calculate price per target coin
-        target_volume = 0
-        other_coin = ''
-        other_volume = 0
-        
-        if target_coin in data['maker_volumes']:
-            target_volume = data['maker_volumes'][target_coin]
-            # Find the other coin
-            for coin, vol in data['taker_volumes'].items():
-                if coin != target_coin:
-                    other_coin = coin
-                    other_volume = vol
-                    break
-        elif target_coin in data['taker_volumes']:
-            target_volume = data['taker_volumes'][target_coin]
+        self.pairs[pair_std]['maker_volumes'][maker_coin] += float(swap.get('maker_amount', 0))
+        self.pairs[pair_std]['taker_volumes'][taker_coin] += float(swap.get('taker_amount', 0))
+        self.pairs[pair_std]['swap_count'] += 1
+
+    def summary(self):
+        """
+        Summary of the year, without the swaps themselves
+        """
+        if self.start_timestamp is None:
+            return {}
+        target_coin = self.target_coin
+        pairs_summary = {}
+        for pair, data in self.pairs.items():
+            # Determine which coin is the target coin, to calculate the
+            # price per target coin
+            target_volume = 0
+            other_coin = ''
+            other_volume = 0
+            if target_coin in data['maker_volumes']:
+                target_volume = data['maker_volumes'][target_coin]
+                others = data['taker_volumes']
+            elif target_coin in data['taker_volumes']:
+                target_volume = data['taker_volumes'][target_coin]
+                others = data['maker_volumes']
+            else:
+                others = {}
             # Find the other coin
-            for coin, vol in data['maker_volumes'].items():
+            for coin, vol in others.items():
                 if coin != target_coin:
                     other_coin = coin
                     other_volume = vol
                     break
-        
-        # Calculate average price per target coin
-        price_per_target = other_volume / target_volume if target_volume > 0 else 0
-        
-        pairs_summary[pair] = {
-            target_coin: round(target_volume, 8),
-            other_coin: round(other_volume, 8),
-            f'average_price_per_{target_coin}': round(price_per_target, 8),
-            'swap_count': data['swap_count']
+
+            # Calculate average price per target coin
+            price_per_target = other_volume / target_volume if target_volume > 0 else 0
+
+            pairs_summary[pair] = {
+                target_coin: round(target_volume, 8),
+                other_coin: round(other_volume, 8),
+                f'average_price_per_{target_coin}': round(price_per_target, 8),
+                'swap_count': data['swap_count']
+            }
+
+        return {
+            'swaps_count': self.swaps_count,
+            'start_date': datetime.fromtimestamp(
+                self.start_timestamp, tz=timezone.utc).strftime("%d/%m/%y"),
+            'end_date': datetime.fromtimestamp(
+                self.end_timestamp, tz=timezone.utc).strftime("%d/%m/%y"),
+            'pairs': pairs_summary,
         }
-    
-    return {
-        'swaps_count': len(year_swaps),
-        'start_date': start_date,
-        'end_date': end_date,
-        'pairs': pairs_summary,
-        'results': year_swaps
-    }
 
-def export_swaps_to_csv(swaps, filename):
-    """
-    Export swaps to CSV format
-    """
-    if not swaps:
-        print(f"No swaps to export for {filename}")
-        return
-    
-    fieldnames = [
-        'uuid', 'pair', 'started_at', 'finished_at', 'duration',
-        'maker_coin', 'maker_coin_ticker', 'maker_amount', 'maker_coin_usd_price',
-        'taker_coin', 'taker_coin_ticker', 'taker_amount', 'taker_coin_usd_price',
-        'price', 'reverse_price', 'is_success', 'maker_gui', 'taker_gui',
-        'maker_version', 'taker_version', 'maker_pubkey', 'taker_pubkey'
-    ]
-    
-    # Create exports directory if it doesn't exist
-    os.makedirs('exports', exist_ok=True)
-    filepath = os.path.join('exports', filename)
-    
-    with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
-        writer.writeheader()
-        
-        for swap in swaps:
-            # Convert timestamps to readable format for CSV
-            row = swap.copy()
-            for timestamp_field in ['started_at', 'finished_at']:
-                if timestamp_field in row and row[timestamp_field]:
-                    dt = datetime.fromtimestamp(row[timestamp_field], tz=timezone.utc)
-                    row[f'{timestamp_field}_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S UTC')
-            
-            writer.writerow(row)
-    
-    print(f"Exported {len(swaps)} swaps to {filepath}")
 
-def export_swaps_to_json(swaps, filename):
+class SwapsWriter:
     """
-    Export swaps to JSON format
+    Streams swaps to a CSV and a JSON array file, and keeps a running
+    summary
     """
-    if not swaps:
-        print(f"No swaps to export for {filename}")
-        return
-    
-    # Create exports directory if it doesn't exist
-    os.makedirs('exports', exist_ok=True)
-    filepath = os.path.join('exports', filename)
-    
-    # Add readable timestamps for JSON export
-    swaps_with_readable_dates = []
-    for swap in swaps:
-        swap_copy = swap.copy()
-        for timestamp_field in ['started_at', 'finished_at']:
-            if timestamp_field in swap_copy and swap_copy[timestamp_field]:
-                dt = datetime.fromtimestamp(swap_copy[timestamp_field], tz=timezone.utc)
-                swap_copy[f'{timestamp_field}_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S UTC')
-        swaps_with_readable_dates.append(swap_copy)
-    
-    with open(filepath, 'w', encoding='utf-8') as jsonfile:
-        json.dump(swaps_with_readable_dates, jsonfile, indent=2, default=str)
-    
-    print(f"Exported {len(swaps)} swaps to {filepath}")
 
-def export_summary_to_json(summary, filename):
-    """
-    Export enhanced summary to JSON format
-    """
-    if not summary:
-        print(f"No summary to export for {filename}")
-        return
-    
-    # Create exports directory if it doesn't exist
-    os.makedirs('exports', exist_ok=True)
-    filepath = os.path.join('exports', filename)
-    
-    # Clean up the results data for export (remove SQLAlchemy artifacts)
-    clean_summary = summary.copy()
-    if 'results' in clean_summary:
-        clean_results = []
-        for swap in clean_summary['results']:
-            clean_swap = {k: v for k, v in swap.items() if not k.startswith('_sa_')}
-            # Add readable timestamps
-            for timestamp_field in ['started_at', 'finished_at']:
-                if timestamp_field in clean_swap and clean_swap[timestamp_field]:
-                    dt = datetime.fromtimestamp(clean_swap[timestamp_field], tz=timezone.utc)
-                    clean_swap[f'{timestamp_field}_readable'] = dt.strftime('%Y-%m-%d %H:%M:%S UTC')
-            clean_results.append(clean_swap)
-        clean_summary['results'] = clean_results
-    
-    with open(filepath, 'w', encoding='utf-8') as jsonfile:
-        json.dump(clean_summary, jsonfile, indent=2, default=str)
-    
-    print(f"Exported summary with {summary.get('swaps_count', 0)} swaps to {filepath}")
+    def __init__(self, coin_ticker, label):
+        os.makedirs('exports', exist_ok=True)
+        self.label = label
+        prefix = os.path.join('exports', coin_ticker.lower())
+        self.csv_path = f"{prefix}_swaps_{label}.csv"
+        self.json_path = f"{prefix}_swaps_{label}.json"
+        self.summary_path = f"{prefix}_summary_{label}.json"
+        self.csv_file = open(self.csv_path, 'w', newline='', encoding='utf-8')
+        self.csv_writer = csv.DictWriter(
+            self.csv_file, fieldnames=CSV_FIELDNAMES, extrasaction='ignore'
+        )
+        self.csv_writer.writeheader()
+        self.json_file = open(self.json_path, 'w', encoding='utf-8')
+        self.json_file.write('[')
+        self.year_summary = YearSummary(coin_ticker)
+
+    def write(self, swap):
+        row = with_readable_timestamps(swap)
+        self.csv_writer.writerow(row)
+        if self.year_summary.swaps_count > 0:
+            self.json_file.write(',')
+        item = json.dumps(row, indent=2, default=str).replace('\n', '\n  ')
+        self.json_file.write(f'\n  {item}')
+        self.year_summary.add(swap)
+
+    def close(self):
+        """
+        Close the swaps files and write the summary. The summary's results
+        are copied from the swaps JSON file rather than held in memory.
+        """
+        self.csv_file.close()
+        self.json_file.write('\n]')
+        self.json_file.close()
+        summary = self.year_summary.summary()
+        with open(self.summary_path, 'w', encoding='utf-8') as jsonfile:
+            jsonfile.write(json.dumps(summary, indent=2, default=str)[:-2])
+            jsonfile.write(',\n  "results": ')
+            with open(self.json_path, 'r', encoding='utf-8') as swaps_file:
+                for line in swaps_file:
+                    jsonfile.write(line.replace('\n', '\n  '))
+            jsonfile.write('\n}')
+        count = self.year_summary.swaps_count
+        print(f"Exported {count} swaps to {self.csv_path} and {self.json_path}")
+        print(f"Exported summary with {count} swaps to {self.summary_path}")
+        return summary
 
 def print_summary(coin_ticker, summaries_by_year):
     """
@@ -356,80 +341,73 @@ def print_summary(coin_ticker, summaries_by_year):
     
     print("="*60)
 
-def process_coin(coin_ticker):
+
+def process_coin(coin_ticker, chunk="month", workers=4):
     """
-    Process swaps for a specific coin and export results
+    Stream swaps for a specific coin to per-year and combined export files
     """
     print(f"\n{'='*50}")
     print(f"Processing {coin_ticker} swaps...")
     print('='*50)
-    
-    # Get all swaps for this coin
-    swaps = get_coin_swaps(coin_ticker)
-    
-    if not swaps:
+
+    writers = {}
+    failed = False
+    try:
+        for swap in iter_coin_swaps(coin_ticker, chunk=chunk, workers=workers):
+            year = swap_year(swap)
+            if year is None:
+                continue
+            for label in [year, "all"]:
+                if label not in writers:
+                    writers[label] = SwapsWriter(coin_ticker, label)
+                writers[label].write(swap)
+    except Exception as e:
+        print(f"Error retrieving {coin_ticker} swaps: {e}")
+        print("This could be due to:")
+        print("1. Database connection issues")
+        print("2. Missing environment variables")
+        print("3. Database not running")
+        failed = True
+    finally:
+        summaries = {label: writer.close() for label, writer in writers.items()}
+
+    if failed or not summaries:
         print(f"No {coin_ticker} swaps found or error occurred.")
         return
-    
-    # Group swaps by year
-    swaps_by_year = group_swaps_by_year(swaps)
-    
-    # Create enhanced summaries for each year
-    summaries_by_year = {}
-    for year, year_swaps in swaps_by_year.items():
-        summaries_by_year[year] = analyze_year_summary(year_swaps, year, coin_ticker)
-    
-    # Print enhanced summary
+
+    summaries_by_year = {k: v for k, v in summaries.items() if k != "all"}
     print_summary(coin_ticker, summaries_by_year)
-    
-    # Export data for each year
-    for year, summary in summaries_by_year.items():
-        year_swaps = summary['results']
-        
-        # Export to CSV (traditional format)
-        csv_filename = f"{coin_ticker.lower()}_swaps_{year}.csv"
-        export_swaps_to_csv(year_swaps, csv_filename)
-        
-        # Export to JSON (traditional format)
-        json_filename = f"{coin_ticker.lower()}_swaps_{year}.json"
-        export_swaps_to_json(year_swaps, json_filename)
-        
-        # Export enhanced summary (new format with analysis)
-        summary_filename = f"{coin_ticker.lower()}_summary_{year}.json"
-        export_summary_to_json(summary, summary_filename)
-    
-    # Also export all swaps combined
-    all_swaps = []
-    for summary in summaries_by_year.values():
-        all_swaps.extend(summary['results'])
-    
-    if all_swaps:
-        export_swaps_to_csv(all_swaps, f"{coin_ticker.lower()}_swaps_all.csv")
-        export_swaps_to_json(all_swaps, f"{coin_ticker.lower()}_swaps_all.json")
-        
-        # Create and export combined summary
-        all_summary = analyze_year_summary(all_swaps, "all_years", coin_ticker)
-        export_summary_to_json(all_summary, f"{coin_ticker.lower()}_summary_all.json")
-    
+
     print(f"\n✅ {coin_ticker} files created:")
     for year in sorted(summaries_by_year.keys()):
         print(f"  📊 {year} Analysis:")
         print(f"    - {coin_ticker.lower()}_swaps_{year}.csv (raw data)")
         print(f"    - {coin_ticker.lower()}_swaps_{year}.json (raw data)")
         print(f"    - {coin_ticker.lower()}_summary_{year}.json (enhanced analysis)")
-    if all_swaps:
-        print(f"  📈 Combined:")
-        print(f"    - {coin_ticker.lower()}_swaps_all.csv")
-        print(f"    - {coin_ticker.lower()}_swaps_all.json") 
-        print(f"    - {coin_ticker.lower()}_summary_all.json (comprehensive analysis)")
+    print("  📈 Combined:")
+    print(f"    - {coin_ticker.lower()}_swaps_all.csv")
+    print(f"    - {coin_ticker.lower()}_swaps_all.json")
+    print(f"    - {coin_ticker.lower()}_summary_all.json (comprehensive analysis)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract swaps for coins and export them by year")
+    parser.add_argument("coins", nargs="*", default=['SMTF', 'SFUSD'],
+                        help="Coin tickers to extract (default: SMTF SFUSD)")
+    parser.add_argument("--chunk", choices=["month", "year"], default="month",
+                        help="Size of the time chunks queried at once")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Chunks queried concurrently (and held in memory)")
+    return parser.parse_args()
 
 def main():
     """
-    Main function to extract and export SMTF and SFUSD swaps
+    Main function to extract and export swaps for each coin
     """
+    args = parse_args()
     print("Multi-Coin Swap Extraction Tool")
     print("================================")
-    print("Extracting swaps for: SMTF, SFUSD")
+    print(f"Extracting swaps for: {', '.join(args.coins)}")
     
     # Check environment setup
     if not check_environment():
@@ -441,13 +419,10 @@ def main():
     
     print("Connecting to database...")
     
-    # List of coins to process
-    coins = ['SMTF', 'SFUSD']
-    
     # Process each coin separately
-    for coin in coins:
+    for coin in args.coins:
         try:
-            process_coin(coin)
+            process_coin(coin, chunk=args.chunk, workers=args.workers)
         except Exception as e:
             print(f"\n❌ Error processing {coin}: {e}")
             continue
@@ -10,7 +10,7 @@ Examples:
       ./extract_pubkey_trades.py --pubkey <PUBKEY> --start 1704067200 --end 1706745600 \
         --coin KMD --out csv --output exports/kmd_pubkey_trades.csv
 
-  - Filtered by pair (any variant or std):
+  - Filtered by pair, in either order (variants match their std pair):
       ./extract_pubkey_trades.py --pubkey <PUBKEY> --pair KMD_LTC --out json \
         --output exports/kmd_ltc_pubkey_trades.json
 """
@@ -39,71 +39,37 @@ _load_env()
 os.environ.setdefault("IS_TESTING", "False")
 
 try:
-    from sqlmodel import Session, select, or_
-    from db.sqldb import SqlDB
-    from db.schema import DefiSwap
+    from db.sqldb import SqlQuery
 except Exception as e:
     print(f"Error importing API modules: {e}")
     print("Run this from the repo root and ensure dependencies are installed.")
     sys.exit(1)
 
-
-def _build_query(session: Session, pubkey: str, start_ts: int, end_ts: int,
-                 coin: str | None, pair: str | None):
-    q = select(DefiSwap)
-
-    # Time range (finished_at)
-    q = q.where(DefiSwap.finished_at > start_ts, DefiSwap.finished_at < end_ts)
-
-    # Pubkey on either side
-    q = q.where(or_(DefiSwap.maker_pubkey == pubkey, DefiSwap.taker_pubkey == pubkey))
-
-    # Optional coin filter: match by variant or ticker on either side
-    if coin:
-        coin_in = coin.strip()
-        coin_ticker = coin_in.upper()
-        q = q.where(
-            or_(
-                DefiSwap.maker_coin == coin_in,
-                DefiSwap.taker_coin == coin_in,
-                DefiSwap.maker_coin_ticker == coin_ticker,
-                DefiSwap.taker_coin_ticker == coin_ticker,
-            )
+# Trades fetched per page
+PAGE_SIZE = 1000
+
+
+def _fetch_trades(pubkey: str, start_ts: int, end_ts: int,
+                  coin: str | None, pair: str | None):
+    """Page through the pubkey's trades, newest first"""
+    query = SqlQuery(db_type="pgsql")
+    rows = []
+    next_page = {}
+    while next_page is not None:
+        r = query.pubkey_trades(
+            pubkey=pubkey,
+            start_time=start_ts,
+            end_time=end_ts,
+            coin=coin.strip() if coin else None,
+            pair=pair.strip().upper() if pair else None,
+            limit=PAGE_SIZE,
+            **next_page,
         )
-
-    # Optional pair filter: accept std (BASE_QUOTE) or variant (BASE-PROTO_QUOTE-PROTO)
-    if pair:
-        pair_in = pair.strip().upper()
-        q = q.where(
-            or_(
-                DefiSwap.pair == pair_in,
-                DefiSwap.pair_reverse == pair_in,
-                DefiSwap.pair_std == pair_in,
-                DefiSwap.pair_std_reverse == pair_in,
-            )
-        )
-
-    # Order newest first
-    q = q.order_by(DefiSwap.finished_at.desc())
-    return q
-
-
-def _rows_to_dicts(rows):
-    data = []
-    for r in rows:
-        # SQLModel instances; convert to dict and drop SA internals
-        try:
-            d = dict(r)
-        except Exception:
-            d = getattr(r, "__dict__", {}).copy()
-        if not isinstance(d, dict):
-            d = {}
-        # Remove SQLAlchemy internals
-        for k in list(d.keys()):
-            if k.startswith("_sa_"):
-                d.pop(k, None)
-        data.append(d)
-    return data
+        if r is None:
+            raise Exception(f"Failed to query trades for {pubkey}")
+        rows += r["trades"]
+        next_page = r["next_page"]
+    return rows
 
 
 def export_json(rows: list[dict], output_path: str | None):
@@ -161,8 +127,8 @@ def main():
     parser.add_argument("--pubkey", required=True, help="Maker or taker pubkey")
     parser.add_argument("--start", type=int, default=0, help="Start UNIX timestamp (inclusive)")
     parser.add_argument("--end", type=int, default=0, help="End UNIX timestamp (exclusive)")
-    parser.add_argument("--coin", type=str, default=None, help="Filter by coin ticker or variant")
-    parser.add_argument("--pair", type=str, default=None, help="Filter by pair (std or variant)")
+    parser.add_argument("--coin", type=str, default=None, help="Filter by coin (any variant)")
+    parser.add_argument("--pair", type=str, default=None, help="Filter by pair (either order)")
     parser.add_argument("--out", choices=["json", "csv"], default="json", help="Output format")
     parser.add_argument("--output", type=str, default=None, help="Output path (default: stdout for JSON)")
 
@@ -173,21 +139,13 @@ def main():
     start_ts = args.start if args.start and args.start > 0 else 1
     end_ts = args.end if args.end and args.end > 0 else now_ts
 
-    # Connect to Postgres (default) via existing engine
-    db = SqlDB(db_type="pgsql")
-
-    with Session(db.engine) as session:
-        q = _build_query(
-            session=session,
-            pubkey=args.pubkey,
-            start_ts=start_ts,
-            end_ts=end_ts,
-            coin=args.coin,
-            pair=args.pair,
-        )
-        rows = session.exec(q).all()
-
-    data = _rows_to_dicts(rows)
+    data = _fetch_trades(
+        pubkey=args.pubkey,
+        start_ts=start_ts,
+        end_ts=end_ts,
+        coin=args.coin,
+        pair=args.pair,
+    )
 
     if args.out == "json":
         export_json(data, args.output)
@@ -5,10 +5,13 @@ from __future__ import annotations
 
 import argparse
 import json
+import multiprocessing
+import os
 import sys
 from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 
 REFUND_EVENTS = {
@@ -19,23 +22,58 @@ REFUND_EVENTS = {
     "TakerPaymentRefunded",
     "TakerPaymentRefundFailed",
 }
+# Every refund event name contains this, so files without it can be
+# skipped without parsing.
+REFUND_MARKER = b"Refund"
+# Paths sent to each worker at a time.
+CHUNK_SIZE = 256
 
 
-def iter_json_files(root: Path) -> Iterable[Path]:
-    """Yield all JSON files under root."""
-    for path in root.rglob("*.json"):
-        if path.is_file():
-            yield path
+def stream_json_files(root: Path) -> Iterator[tuple[str, int]]:
+    """Yield (path, mtime_ns) for JSON files under root, unsorted."""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".json") and entry.is_file():
+                        yield entry.path, entry.stat().st_mtime_ns
+        except OSError as exc:
+            print(f"Failed to list directory: {exc}", file=sys.stderr)
 
 
-def load_json(path: Path) -> dict | None:
-    """Load JSON file, returning None on failure."""
+def index_key(ticker: str | None, max_age_days: int | None) -> str:
+    """Key of the files scanned with these filters in the index."""
+    return json.dumps(
+        {"ticker": ticker.upper() if ticker else None, "days": max_age_days}
+    )
+
+
+def load_index(path: Path | None) -> dict[str, dict[str, int]]:
+    """
+    Load the index of files already scanned, as {path: mtime_ns} for
+    each index_key.
+    """
+    if path is None or not path.exists():
+        return {}
     try:
         with path.open("r", encoding="utf-8") as handle:
-            return json.load(handle)
-    except Exception as exc:  # noqa: BLE001 - want to report all failures
-        print(f"Failed to load {path}: {exc}", file=sys.stderr)
-        return None
+            index = json.load(handle)
+    except Exception as exc:  # noqa: BLE001 - a bad index means a full rescan
+        print(f"Failed to load index {path}: {exc}", file=sys.stderr)
+        return {}
+    if not isinstance(index, dict):
+        return {}
+    return {k: v for k, v in index.items() if isinstance(v, dict)}
+
+
+def save_index(path: Path, index: dict[str, dict[str, int]]) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        json.dump(index, handle)
+    tmp_path.replace(path)
 
 
 def ticker_matches(payload: dict, ticker: str | None) -> bool:
@@ -83,34 +121,114 @@ def find_refund_events(payload: dict, cutoff_ms: int | None) -> list[dict]:
     return matching
 
 
-def scan(root: Path, ticker: str | None, max_age_days: int | None) -> int:
-    """Scan for refund events; return count of files with matches."""
+def scan_file(
+    path: str, ticker: str | None, cutoff_ms: int | None
+) -> tuple[str, bool, dict | None]:
+    """
+    Return (path, scanned, result) for one swap file. `scanned` is False
+    if the file could not be loaded, and `result` holds its refund
+    events, or is None if it has none. The raw bytes are searched for
+    REFUND_MARKER before parsing, as most swap files have no refunds.
+    """
+    try:
+        with open(path, "rb") as handle:
+            raw = handle.read()
+        if REFUND_MARKER not in raw:
+            return path, True, None
+        payload = json.loads(raw)
+    except Exception as exc:  # noqa: BLE001 - want to report all failures
+        print(f"Failed to load {path}: {exc}", file=sys.stderr)
+        return path, False, None
+    if not isinstance(payload, dict) or not ticker_matches(payload, ticker):
+        return path, True, None
+
+    matches = find_refund_events(payload, cutoff_ms)
+    if not matches:
+        return path, True, None
+    return path, True, {
+        "path": path,
+        "uuid": payload.get("uuid"),
+        "maker_coin": payload.get("maker_coin", "UNKNOWN"),
+        "taker_coin": payload.get("taker_coin", "UNKNOWN"),
+        "events": matches,
+    }
+
+
+def print_result(result: dict, ndjson: bool) -> None:
+    if ndjson:
+        print(json.dumps(result, default=str), flush=True)
+        return
+    print(f"{result['path']} [{result['maker_coin']}/{result['taker_coin']}]:")
+    for match in result["events"]:
+        print(f"  - {match.get('timestamp')}: {match.get('type')}")
+    print()
+
+
+def scan(
+    root: Path,
+    ticker: str | None,
+    max_age_days: int | None,
+    workers: int = 1,
+    ndjson: bool = False,
+    index_path: Path | None = None,
+    sort: bool = False,
+) -> int:
+    """
+    Scan for refund events; return count of files with matches.
+
+    Paths are streamed to a pool of `workers` processes as they are
+    found. With an `index_path`, files whose mtime is unchanged since
+    the last scan with the same filters are skipped, so only new or
+    modified files are reported. Files which failed to load are left
+    out of the index, to be scanned again next time.
+    """
     cutoff_ms = None
     if max_age_days is not None:
         cutoff = datetime.now(tz=timezone.utc) - timedelta(days=max_age_days)
         cutoff_ms = int(cutoff.timestamp() * 1000)
 
+    index = load_index(index_path)
+    key = index_key(ticker, max_age_days)
+    scanned = index.get(key, {})
+    seen: dict[str, int] = {}
+    failed: set[str] = set()
+
+    def pending() -> Iterator[str]:
+        for path, mtime_ns in stream_json_files(root):
+            seen[path] = mtime_ns
+            if scanned.get(path) != mtime_ns:
+                yield path
+
+    paths: Iterable[str] = pending()
+    if sort:
+        paths = sorted(paths)
+    worker = partial(scan_file, ticker=ticker, cutoff_ms=cutoff_ms)
+
     matched_files = 0
-    for json_path in sorted(iter_json_files(root)):
-        payload = load_json(json_path)
-        if not payload or not ticker_matches(payload, ticker):
-            continue
-
-        matches = find_refund_events(payload, cutoff_ms)
-        if not matches:
-            continue
-
-        matched_files += 1
-        maker_coin = payload.get("maker_coin", "UNKNOWN")
-        taker_coin = payload.get("taker_coin", "UNKNOWN")
-        print(f"{json_path} [{maker_coin}/{taker_coin}]:")
-        for match in matches:
-            timestamp = match.get("timestamp")
-            event_type = match.get("type")
-            print(f"  - {timestamp}: {event_type}")
-        print()
-
-    if matched_files == 0:
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(worker, paths, chunksize=CHUNK_SIZE)
+    else:
+        results = map(worker, paths)
+    try:
+        for path, ok, result in results:
+            if not ok:
+                failed.add(path)
+            if result is None:
+                continue
+            matched_files += 1
+            print_result(result, ndjson)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if index_path is not None:
+        index[key] = {k: v for k, v in seen.items() if k not in failed}
+        save_index(index_path, index)
+
+    if matched_files == 0 and not ndjson:
         print("No matching events found.")
 
     return matched_files
@@ -135,6 +253,28 @@ def parse_args() -> argparse.Namespace:
         dest="max_age_days",
         help="Only consider events that occurred within the last N days.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes parsing files (default: CPU count).",
+    )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Print one JSON object per matching file.",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="mtime index file; files unchanged since the last scan with the"
+        " same --ticker and --days are skipped.",
+    )
+    parser.add_argument(
+        "--sort",
+        action="store_true",
+        help="Collect and sort all paths before scanning (slower to start).",
+    )
     return parser.parse_args()
 
 
@@ -145,7 +285,15 @@ def main() -> None:
         print(f"Directory not found: {root}", file=sys.stderr)
         raise SystemExit(1)
 
-    scan(root, args.ticker, args.max_age_days)
+    scan(
+        root,
+        args.ticker,
+        args.max_age_days,
+        workers=args.workers,
+        ndjson=args.ndjson,
+        index_path=args.index,
+        sort=args.sort,
+    )
 
 
 if __name__ == "__main__":